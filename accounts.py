@@ -0,0 +1,270 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import inbox_history
+from inbox_history import diff_inbox_stream, classify_disappeared_tasks
+from storage import SQLiteStore
+from sync_metrics import MetricsRecorder, phase, count
+
+# --------------------------
+# Konfiguration
+# --------------------------
+# Beispiel accounts.json:
+# {
+#     "max_workers": 4,
+#     "accounts": [
+#         {"name": "anna", "token_env": "TODOIST_TOKEN_ANNA", "db_path": "anna.db", "interval": 300},
+#         {"name": "team", "token_file": "~/.todoist_team_token", "db_path": "team.db", "interval": 900}
+#     ]
+# }
+ACCOUNTS_FILE = "accounts.json"
+DEFAULT_TOKEN_ENV = "TODOIST_API_TOKEN"
+DEFAULT_ACCOUNT = "default"  # Konto für Widget und inbox_history, sonst das erste konfigurierte
+OFFLINE_TOKEN = "offline"  # Platzhalter für Läufe gegen Attrappen (siehe offline_token)
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_INTERVAL = 300  # Sekunden, wie UPDATE_INTERVAL im Widget
+
+# --------------------------
+# Konten
+# --------------------------
+class Account:
+    """
+    Ein Todoist-Konto mit eigener Token-Quelle, eigener Datenbank und eigenem Sync-Intervall.
+    Das Rate-Limit-Budget hängt an der Datenbank und ist damit ebenfalls pro Konto getrennt.
+    """
+
+    def __init__(self, name, db_path, interval=DEFAULT_INTERVAL,
+                 token=None, token_env=None, token_file=None):
+        self.name = name
+        self.db_path = db_path
+        self.interval = interval
+        self.token_value = token
+        self.token_env = token_env
+        self.token_file = token_file
+        self.metrics = None
+        self.store = SQLiteStore(db_path)
+
+    def token(self):
+        """
+        Liest den API-Token bei jedem Aufruf neu, damit rotierte Tokens ohne Neustart greifen.
+        """
+        if self.token_env:
+            value = os.environ.get(self.token_env)
+            if value:
+                return value.strip()
+        if self.token_file:
+            with open(os.path.expanduser(self.token_file), encoding="utf-8") as f:
+                return f.read().strip()
+        if self.token_value:
+            return self.token_value
+        hint = f" (z.B. über die Umgebungsvariable {self.token_env})" if self.token_env else ""
+        raise ValueError(f"Kein API-Token für Konto '{self.name}' konfiguriert{hint}")
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self.token()}"}
+
+    def __repr__(self):
+        return f"Account({self.name!r}, db_path={self.db_path!r}, interval={self.interval})"
+
+def load_accounts(path=ACCOUNTS_FILE):
+    """
+    Lädt die Konten aus der Konfigurationsdatei.
+    Ohne Datei gibt es genau ein Standardkonto mit der Datenbank aus inbox_history
+    und dem Token aus TODOIST_API_TOKEN.
+    Gibt (Konten, max_workers) zurück.
+    """
+    if not os.path.exists(path):
+        account = Account(DEFAULT_ACCOUNT, inbox_history.DB_PATH, token_env=DEFAULT_TOKEN_ENV)
+        return [account], 1
+
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+
+    accounts = []
+    names = set()
+    for entry in config.get('accounts', []):
+        name = entry.get('name')
+        if not name:
+            raise ValueError("Jedes Konto braucht einen Namen (name)")
+        if name in names:
+            raise ValueError(f"Konto '{name}' ist mehrfach konfiguriert")
+        names.add(name)
+        accounts.append(Account(
+            name,
+            entry.get('db_path', f"tasks_history_{name}.db"),
+            interval=entry.get('interval', DEFAULT_INTERVAL),
+            token=entry.get('token'),
+            token_env=entry.get('token_env'),
+            token_file=entry.get('token_file'),
+        ))
+
+    if not accounts:
+        raise ValueError(f"Keine Konten in {path} konfiguriert")
+
+    # Zwei Konten in derselben Datenbank würden sich gegenseitig Tasks löschen
+    db_paths = [os.path.abspath(account.db_path) for account in accounts]
+    if len(set(db_paths)) != len(db_paths):
+        raise ValueError("Jedes Konto braucht eine eigene Datenbank (db_path)")
+
+    return accounts, config.get('max_workers', DEFAULT_MAX_WORKERS)
+
+def default_account(path=None):
+    """
+    Das Konto, mit dem Widget und inbox_history arbeiten: 'default' aus der
+    Konfiguration, sonst das erste konfigurierte bzw. ohne Datei das Standardkonto.
+    Ohne path gilt ACCOUNTS_FILE zum Zeitpunkt des Aufrufs.
+    """
+    accounts, _ = load_accounts(path or ACCOUNTS_FILE)
+    for account in accounts:
+        if account.name == DEFAULT_ACCOUNT:
+            return account
+    return accounts[0]
+
+@contextmanager
+def offline_token():
+    """
+    Setzt TODOIST_API_TOKEN für Läufe gegen Attrappen (Benchmark, Replay, Tests),
+    falls kein Token gesetzt ist, und entfernt ihn danach wieder.
+    """
+    if os.environ.get(DEFAULT_TOKEN_ENV):
+        yield
+        return
+    os.environ[DEFAULT_TOKEN_ENV] = OFFLINE_TOKEN
+    try:
+        yield
+    finally:
+        os.environ.pop(DEFAULT_TOKEN_ENV, None)
+
+# --------------------------
+# Sync
+# --------------------------
+def sync_account(account):
+    """
+    Synchronisiert ein Konto mit seiner Datenbank.
+    Gibt eine einzeilige Zusammenfassung zurück, da mehrere Konten parallel laufen.
+    """
+    cycle = account.metrics.start(f"account:{account.name}")
+    error = None
+    try:
+        headers = account.headers()
+        with phase('diff'):
+            db_names = account.store.load_names()
+        # Abgleich beim Einlesen - bei vielen parallelen Konten liegt keine Task-Liste im Speicher
+        result = diff_inbox_stream(db_names, headers=headers, db_path=account.db_path)
+        if result is None:
+            return f"[{account.name}] Sync übersprungen: Tasks konnten nicht geladen werden"
+        new_tasks, renamed_tasks, deleted, todoist_count = result
+
+        outcomes = classify_disappeared_tasks(deleted, account.store.disappeared_since(deleted),
+                                              headers=headers, db_path=account.db_path)
+        with phase('write'):
+            account.store.apply_diff(new_tasks, renamed_tasks, list(deleted), outcomes=outcomes)
+        count('tasks_added', len(new_tasks))
+        count('tasks_renamed', len(renamed_tasks))
+        count('tasks_deleted', len(deleted))
+
+        return (f"[{account.name}] {todoist_count} Tasks - neu: {len(new_tasks)}, "
+                f"geändert: {len(renamed_tasks)}, entfernt: {len(deleted)}")
+    except Exception as e:
+        error = e
+        return f"[{account.name}] Fehler: {e}"
+    finally:
+        account.metrics.finish(cycle, error)
+
+class AccountScheduler:
+    """
+    Synchronisiert alle Konten nach ihrem eigenen Intervall mit einem begrenzten Thread-Pool.
+    Ein Konto wird nie doppelt gleichzeitig synchronisiert.
+    """
+
+    def __init__(self, accounts, max_workers=DEFAULT_MAX_WORKERS):
+        self.accounts = accounts
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sync")
+        self.running = set()
+        self.lock = threading.Lock()
+        self.shutdown_flag = threading.Event()
+        self.next_due = {account.name: 0.0 for account in accounts}
+
+    def prepare(self):
+        """
+        Legt die Datenbanken an und startet die Zeitmessung je Konto.
+        """
+        for account in self.accounts:
+            account.store.init()
+            account.metrics = MetricsRecorder(account.db_path if inbox_history.PERSIST_SYNC_METRICS else None)
+
+    def run_job(self, account):
+        try:
+            print(sync_account(account))
+        finally:
+            with self.lock:
+                self.running.discard(account.name)
+
+    def submit_due(self, now):
+        """
+        Startet alle fälligen Konten, die gerade nicht laufen.
+        """
+        for account in self.accounts:
+            with self.lock:
+                if account.name in self.running or now < self.next_due[account.name]:
+                    continue
+                self.running.add(account.name)
+            self.next_due[account.name] = now + account.interval
+            self.executor.submit(self.run_job, account)
+
+    def run_once(self):
+        """
+        Synchronisiert alle Konten genau einmal (z.B. für cron) und wartet auf das Ende.
+        """
+        self.prepare()
+        futures = [self.executor.submit(sync_account, account) for account in self.accounts]
+        for future in futures:
+            print(future.result())
+        self.executor.shutdown()
+
+    def run_forever(self):
+        self.prepare()
+        try:
+            while not self.shutdown_flag.is_set():
+                now = time.time()
+                self.submit_due(now)
+                wait = max(0.5, min(self.next_due.values()) - time.time())
+                self.shutdown_flag.wait(wait)
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def stop(self):
+        self.shutdown_flag.set()
+
+# --------------------------
+# Hauptprogramm
+# --------------------------
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mehrere Todoist-Konten parallel synchronisieren")
+    parser.add_argument("--config", default=ACCOUNTS_FILE, help="Pfad zur Konten-Konfiguration")
+    parser.add_argument("--once", action="store_true", help="Alle Konten einmal synchronisieren und beenden")
+    parser.add_argument("--list", action="store_true", help="Konfigurierte Konten anzeigen")
+    args = parser.parse_args()
+
+    accounts, max_workers = load_accounts(args.config)
+
+    if args.list:
+        for account in accounts:
+            print(f"{account.name:<16} {account.db_path:<30} alle {account.interval}s")
+    else:
+        scheduler = AccountScheduler(accounts, max_workers)
+        print(f"{len(accounts)} Konto/Konten, bis zu {max_workers} parallel")
+        if args.once:
+            scheduler.run_once()
+        else:
+            try:
+                scheduler.run_forever()
+            except KeyboardInterrupt:
+                print("\nBeendet.")
+                scheduler.stop()
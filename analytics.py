@@ -0,0 +1,329 @@
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import clock
+from inbox_history import AGE_BUCKETS
+from inbox_snapshots import DAY, RESOLUTIONS, TOTAL_BUCKET, age_bucket_sql, query_trend
+from duplicates import SIMILARITY_THRESHOLD, init_duplicate_schema, refresh_duplicate_index, find_duplicate_clusters
+
+# --------------------------
+# Konfiguration
+# --------------------------
+DB_PATH = "tasks_history.db"
+FETCH_SIZE = 1000  # Zeilen pro fetchmany - die Ausgabe wird gestreamt
+PERIOD_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-W%W',
+    'month': '%Y-%m',
+}
+PERCENTILES = (50, 90, 99)
+REQUIRED_TABLES = ('task_state', 'task_events', 'task_lifetimes')  # Schema nach inbox_history.init_database
+
+# --------------------------
+# Ausgabe
+# --------------------------
+def iter_rows(cursor):
+    """
+    Liefert die Zeilen eines Cursors blockweise, ohne alles in den Speicher zu laden.
+    """
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+def write_table(columns, rows, out):
+    """
+    Gibt die Zeilen als Text-Tabelle aus. Die Spaltenbreiten werden aus dem
+    ersten Block bestimmt, danach wird Zeile für Zeile geschrieben.
+    """
+    rows = iter(rows)
+    first_block = []
+    for row in rows:
+        first_block.append(row)
+        if len(first_block) >= FETCH_SIZE:
+            break
+
+    widths = [len(column) for column in columns]
+    for row in first_block:
+        widths = [max(width, len(format_value(value))) for width, value in zip(widths, row)]
+
+    out.write("  ".join(column.ljust(width) for column, width in zip(columns, widths)) + "\n")
+    out.write("  ".join("-" * width for width in widths) + "\n")
+
+    count = 0
+    for block in (first_block, rows):
+        for row in block:
+            out.write("  ".join(format_value(value).ljust(width) for value, width in zip(row, widths)) + "\n")
+            count += 1
+
+    if count == 0:
+        out.write("(keine Daten)\n")
+
+def write_csv(columns, rows, out):
+    import csv
+
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+
+def write_json(columns, rows, out):
+    """
+    Schreibt ein JSON-Array Zeile für Zeile, ohne es vorher im Speicher aufzubauen.
+    """
+    import json
+
+    out.write("[")
+    for i, row in enumerate(rows):
+        out.write(",\n " if i else "\n ")
+        out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+    out.write("\n]\n")
+
+WRITERS = {
+    'table': write_table,
+    'csv': write_csv,
+    'json': write_json,
+}
+
+def format_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.1f}"
+    return str(value)
+
+# --------------------------
+# Abfragen
+# --------------------------
+def query_age(conn, args):
+    """
+    Altersverteilung des aktuellen Posteingangs nach Tagen seit first_seen oder last_changed.
+    """
+    column = 'first_seen_at' if args.by == 'created' else 'last_changed_at'
+    cursor = conn.execute(f'''
+        SELECT {age_bucket_sql('age', AGE_BUCKETS)} AS bucket, COUNT(*) AS tasks, MIN(age) AS min_days, MAX(age) AS max_days
+        FROM (SELECT (? - {column}) / {DAY} AS age FROM task_state)
+        GROUP BY bucket
+        ORDER BY MIN(age)
+    ''', (int(clock.timestamp()),))
+    return ['bucket', 'tasks', 'min_days', 'max_days'], iter_rows(cursor)
+
+def query_churn(conn, args):
+    """
+    Neue, umbenannte und entfernte Tasks pro Tag, Woche oder Monat.
+    """
+    cursor = conn.execute(f'''
+        SELECT strftime(?, event_date) AS period,
+               SUM(event = 'added') AS added,
+               SUM(event = 'renamed') AS renamed,
+               SUM(event = 'deleted') AS deleted
+        FROM task_events
+        WHERE event_date >= ?
+        GROUP BY period
+        ORDER BY period
+    ''', (PERIOD_FORMATS[args.period], args.since))
+    return ['period', 'added', 'renamed', 'deleted'], iter_rows(cursor)
+
+def query_renames(conn, args):
+    """
+    Tasks mit den meisten Umbenennungen. Der Name stammt aus der letzten Umbenennung
+    (SQLite liefert bei MAX() die übrigen Spalten aus derselben Zeile).
+    """
+    cursor = conn.execute('''
+        SELECT task_id, COUNT(*) AS renames, MAX(id) AS last_event_id, task_name, event_date
+        FROM task_events
+        WHERE event = 'renamed' AND event_date >= ?
+        GROUP BY task_id
+        HAVING COUNT(*) >= ?
+        ORDER BY renames DESC, task_id
+        LIMIT ?
+    ''', (args.since, args.min_renames, args.limit))
+    rows = ((task_id, renames, name, last_date)
+            for task_id, renames, _, name, last_date in iter_rows(cursor))
+    return ['task_id', 'renames', 'latest_name', 'last_renamed'], rows
+
+def query_lifetimes(conn, args):
+    """
+    Zeit im Posteingang bis zum Verschwinden je Grund (completed, moved, deleted, unknown)
+    aus task_lifetimes. Durchschnitt und Perzentile laufen über den Index (outcome, lifetime_days).
+    Mit --histogram die Verteilung auf die Altersgruppen (auch als Befehl completion).
+    """
+    if args.histogram:
+        where = "ended >= ?"
+        params = [args.since]
+        if args.outcome:
+            where += " AND outcome = ?"
+            params.append(args.outcome)
+        cursor = conn.execute(f'''
+            SELECT {age_bucket_sql('lifetime_days', AGE_BUCKETS)} AS bucket, COUNT(*) AS tasks,
+                   AVG(lifetime_days) AS avg_days
+            FROM task_lifetimes
+            WHERE {where}
+            GROUP BY bucket
+            ORDER BY MIN(lifetime_days)
+        ''', params)
+        return ['bucket', 'tasks', 'avg_days'], iter_rows(cursor)
+
+    where = "outcome = ? AND ended >= ?"
+    outcomes = [args.outcome] if args.outcome else [
+        row[0] for row in conn.execute('SELECT DISTINCT outcome FROM task_lifetimes ORDER BY outcome')
+    ]
+
+    def rows():
+        for outcome in outcomes:
+            total, average, maximum = conn.execute(f'''
+                SELECT COUNT(*), AVG(lifetime_days), MAX(lifetime_days) FROM task_lifetimes WHERE {where}
+            ''', (outcome, args.since)).fetchone()
+            percentiles = []
+            for percentile in PERCENTILES:
+                value = None
+                if total:
+                    offset = min(total - 1, (total * percentile) // 100)
+                    value = conn.execute(f'''
+                        SELECT lifetime_days FROM task_lifetimes WHERE {where}
+                        ORDER BY lifetime_days LIMIT 1 OFFSET ?
+                    ''', (outcome, args.since, offset)).fetchone()[0]
+                percentiles.append(value)
+            yield (outcome, total, average, *percentiles, maximum)
+
+    return ['outcome', 'tasks', 'avg_days'] + [f"p{percentile}_days" for percentile in PERCENTILES] + ['max_days'], rows()
+
+def query_trend_rows(conn, args):
+    """
+    Verlauf der Posteingangsgröße aus den Snapshots (eine Zeile pro Zeitraum).
+    """
+    since_ts = int(datetime.strptime(args.since, '%Y-%m-%d').timestamp()) if args.since else 0
+    cursor = query_trend(conn.cursor(), RESOLUTIONS[args.resolution], since_ts, args.bucket)
+    rows = ((datetime.fromtimestamp(period_start).strftime('%Y-%m-%d %H:%M'), avg_count, min_count, max_count, samples)
+            for period_start, avg_count, min_count, max_count, samples in iter_rows(cursor))
+    return ['period_start', 'avg', 'min', 'max', 'samples'], rows
+
+def query_search(conn, args):
+    """
+    Sucht Tasks nach Namen (ersetzt die feste 'Aldi'-Suche aus find_changes.py).
+    """
+    where = "task_name LIKE ?"
+    if args.changed_only:
+        where += " AND first_seen_at != last_changed_at"
+    cursor = conn.execute(f'''
+        SELECT task_id, task_name,
+               datetime(first_seen_at, 'unixepoch', 'localtime'), datetime(last_changed_at, 'unixepoch', 'localtime')
+        FROM task_state
+        WHERE {where}
+        ORDER BY last_changed_at DESC
+        LIMIT ?
+    ''', (f"%{args.text}%", args.limit))
+    return ['task_id', 'task_name', 'first_seen', 'last_changed'], iter_rows(cursor)
+
+def query_duplicates(conn, args):
+    """
+    Gruppen fast gleicher Tasks aus dem LSH-Index (siehe duplicates.py).
+    Noch nicht indizierte Tasks werden vorher nachgetragen (einziger Befehl mit Schreibzugriff).
+    """
+    init_duplicate_schema(conn.cursor())
+    indexed = refresh_duplicate_index(conn.cursor())
+    conn.commit()
+    if indexed:
+        print(f"{indexed} Tasks neu indiziert", file=sys.stderr)
+
+    clusters = [cluster for cluster in find_duplicate_clusters(conn, args.threshold)
+                if len(cluster) >= args.min_size][:args.limit]
+    rows = ((number, len(cluster), task_id, task_name, similarity)
+            for number, cluster in enumerate(clusters, 1)
+            for task_id, task_name, similarity in cluster)
+    return ['cluster', 'size', 'task_id', 'task_name', 'similarity'], rows
+
+# --------------------------
+# Hauptprogramm
+# --------------------------
+def build_parser():
+    parser = argparse.ArgumentParser(description="Auswertungen der Task-Historie")
+    parser.add_argument("--db", default=DB_PATH, help="Pfad zur Datenbank")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="table", help="Ausgabeformat")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    age = subparsers.add_parser("age", help="Altersverteilung des Posteingangs")
+    age.add_argument("--by", choices=["changed", "created"], default="changed",
+                     help="Alter seit letzter Änderung oder seit Erstellung")
+    age.set_defaults(query=query_age)
+
+    churn = subparsers.add_parser("churn", help="Änderungen pro Zeitraum")
+    churn.add_argument("--period", choices=sorted(PERIOD_FORMATS), default="week")
+    churn.add_argument("--since", default="0000-00-00", help="Nur Ereignisse ab diesem Datum (YYYY-MM-DD)")
+    churn.set_defaults(query=query_churn)
+
+    renames = subparsers.add_parser("renames", help="Am häufigsten umbenannte Tasks")
+    renames.add_argument("--since", default="0000-00-00", help="Nur Umbenennungen ab diesem Datum")
+    renames.add_argument("--min-renames", type=int, default=1)
+    renames.add_argument("--limit", type=int, default=20)
+    renames.set_defaults(query=query_renames)
+
+    # completion war eine eigene Auswertung über task_events und ist jetzt ein anderer Name dafür
+    lifetimes = subparsers.add_parser("lifetimes", aliases=["completion"],
+                                      help="Zeit im Posteingang bis zum Verschwinden je Grund (erledigt, verschoben, gelöscht)")
+    lifetimes.add_argument("--outcome", choices=["completed", "moved", "deleted", "unknown"])
+    lifetimes.add_argument("--since", default="0000-00-00", help="Nur Tasks, die ab diesem Datum verschwunden sind")
+    lifetimes.add_argument("--histogram", action="store_true", help="Verteilung statt Kennzahlen")
+    lifetimes.set_defaults(query=query_lifetimes)
+
+    trend = subparsers.add_parser("trend", help="Verlauf der Posteingangsgröße")
+    trend.add_argument("--resolution", choices=list(RESOLUTIONS), default="day")
+    trend.add_argument("--since", help="Startdatum (YYYY-MM-DD)")
+    trend.add_argument("--bucket", default=TOTAL_BUCKET,
+                       help="Altersgruppe, z.B. '0-7' oder '>90' (Standard: Gesamtzahl)")
+    trend.set_defaults(query=query_trend_rows)
+
+    search = subparsers.add_parser("search", help="Tasks nach Namen suchen")
+    search.add_argument("text", help="Suchtext (Teilstring)")
+    search.add_argument("--changed-only", action="store_true", help="Nur geänderte Tasks")
+    search.add_argument("--limit", type=int, default=50)
+    search.set_defaults(query=query_search)
+
+    duplicates = subparsers.add_parser("duplicates", help="Gruppen fast gleicher Tasks")
+    duplicates.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD,
+                            help="Mindest-Ähnlichkeit der Trigramme (Jaccard, 0.0 - 1.0)")
+    duplicates.add_argument("--min-size", type=int, default=2, help="Mindestgröße eines Clusters")
+    duplicates.add_argument("--limit", type=int, default=50, help="Höchstens so viele Cluster")
+    duplicates.set_defaults(query=query_duplicates, writable=True)
+
+    return parser
+
+def open_database(db_path, writable=False):
+    """
+    Öffnet die Datenbank für Auswertungen, ohne writable nur lesend. Das Schema wird
+    hier nie angelegt oder umgestellt (die Umstellung von tasks auf task_state löscht
+    die alte Tabelle) - gibt (Verbindung, None) oder (None, Grund) zurück.
+    """
+    if not os.path.exists(db_path):
+        return None, f"Datenbank nicht gefunden: {db_path}"
+    mode = "rw" if writable else "ro"
+    conn = sqlite3.connect(f"{Path(os.path.abspath(db_path)).as_uri()}?mode={mode}", uri=True)
+    objects = dict(conn.execute("SELECT name, type FROM sqlite_master WHERE type IN ('table', 'view')"))
+    missing = [table for table in REQUIRED_TABLES if objects.get(table) != 'table']
+    if missing or objects.get('tasks') == 'table':
+        conn.close()
+        return None, (f"Datenbank {db_path} ist noch nicht auf das aktuelle Schema umgestellt - "
+                      "bitte zuerst inbox_history.py oder das Widget starten.")
+    return conn, None
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+
+    # Auswertungen ändern die Datenbank nicht - auch nicht, um sie umzustellen
+    conn, error = open_database(args.db, getattr(args, 'writable', False))
+    if conn is None:
+        raise SystemExit(error)
+
+    try:
+        columns, rows = args.query(conn, args)
+        WRITERS[args.format](columns, rows, sys.stdout)
+    except BrokenPipeError:
+        # z.B. bei "| head" - kein Fehler
+        pass
+    finally:
+        conn.close()
@@ -0,0 +1,356 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import clock
+import inbox_history
+from accounts import offline_token
+from storage import open_store, ENGINES
+
+# --------------------------
+# Konfiguration
+# --------------------------
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_CHURN = 0.05  # Anteil der Tasks, die pro Sync neu/umbenannt/gelöscht werden
+DEFAULT_REPEAT = 3
+DEFAULT_SEED = 42
+DEFAULT_OUTPUT = "benchmark_results.json"
+INBOX_PROJECT_ID = "1000"
+
+WORDS = [
+    "Aldi", "Gutschein", "einlösen", "Rechnung", "bezahlen", "Termin", "Arzt",
+    "anrufen", "Steuer", "Unterlagen", "Paket", "abholen", "Geburtstag", "Geschenk",
+    "kaufen", "Auto", "Werkstatt", "Mail", "beantworten", "Vertrag", "kündigen",
+]
+
+# --------------------------
+# Synthetische Daten
+# --------------------------
+def generate_inbox(size, rng):
+    """
+    Erzeugt einen synthetischen Posteingang im Format der Todoist-API.
+    """
+    tasks = []
+    for i in range(size):
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+        tasks.append({'id': str(10_000_000 + i), 'content': content, 'project_id': INBOX_PROJECT_ID})
+    return tasks
+
+def apply_churn(tasks, churn, rng):
+    """
+    Simuliert Änderungen zwischen zwei Syncs: Ein Drittel des Churns wird gelöscht,
+    ein Drittel umbenannt und ein Drittel neu angelegt.
+    """
+    changes = int(len(tasks) * churn / 3)
+    churned = [dict(task) for task in tasks]
+    rng.shuffle(churned)
+
+    # Löschen
+    churned = churned[changes:]
+
+    # Umbenennen
+    for task in churned[:changes]:
+        task['content'] = task['content'] + " (geändert)"
+
+    # Neu anlegen
+    next_id = max(int(task['id']) for task in tasks) + 1 if tasks else 10_000_000
+    for i in range(changes):
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+        churned.append({'id': str(next_id + i), 'content': content, 'project_id': INBOX_PROJECT_ID})
+
+    return churned
+
+def load_database(db_path, tasks, rng):
+    """
+    Legt eine Datenbank mit den gegebenen Tasks an. Die Datumswerte werden über
+    die letzten 120 Tage verteilt, damit die 30-Tage-Statistik etwas zu tun hat.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    inbox_history.DB_PATH = db_path
+    with contextlib.redirect_stdout(io.StringIO()):
+        inbox_history.init_database()
+
+    now = int(clock.timestamp())
+    rows = []
+    for task in tasks:
+        first_seen = now - rng.randint(0, 120 * 86400)
+        last_changed = rng.randint(first_seen, now)
+        rows.append((int(task['id']), task['content'], first_seen, last_changed))
+
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        'INSERT INTO task_state (task_id, task_name, first_seen_at, last_changed_at) VALUES (?, ?, ?, ?)',
+        rows
+    )
+    conn.commit()
+    conn.close()
+
+# --------------------------
+# Fake-API-Server
+# --------------------------
+class FakeTodoistHandler(BaseHTTPRequestHandler):
+    """
+    Beantwortet /projects und /tasks wie die Todoist REST-API v2 sowie
+    /completed/get_all wie die Sync-API v9.
+    Die Antworten werden einmal serialisiert und danach nur noch ausgeliefert.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path.endswith("/projects"):
+            body = self.server.projects_body
+        elif url.path.endswith("/tasks") and 'ids' in query:
+            # Aktive Tasks nach ID, unabhängig vom Projekt
+            ids = set(query['ids'][0].split(","))
+            body = json.dumps([task for task in self.server.other_tasks if task['id'] in ids]).encode()
+        elif url.path.endswith("/tasks"):
+            project_id = query.get('project_id', [None])[0]
+            body = self.server.tasks_body if project_id == INBOX_PROJECT_ID else b"[]"
+        elif url.path.endswith("/completed/get_all"):
+            offset = int(query.get('offset', ['0'])[0])
+            limit = int(query.get('limit', ['30'])[0])
+            body = json.dumps({'items': self.server.completed_items[offset:offset + limit]}).encode()
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keine Zugriffslogs während der Messung
+        pass
+
+class FakeTodoistServer:
+    """
+    Lokaler HTTP-Server, der einen festen Posteingang ausliefert.
+    """
+
+    def __init__(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeTodoistHandler)
+        self.httpd.projects_body = json.dumps([
+            {'id': INBOX_PROJECT_ID, 'name': 'Inbox', 'is_inbox_project': True},
+        ]).encode()
+        self.httpd.tasks_body = b"[]"
+        self.httpd.other_tasks = []  # Aktive Tasks in anderen Projekten (verschoben)
+        self.httpd.completed_items = []
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/rest/v2"
+
+    @property
+    def sync_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/sync/v9"
+
+    def set_tasks(self, tasks):
+        self.httpd.tasks_body = json.dumps(tasks).encode()
+
+    def set_moved(self, tasks):
+        self.httpd.other_tasks = tasks
+
+    def set_completed(self, items):
+        """
+        items im Format von /completed/get_all, z.B. {'task_id': '1', 'completed_at': '...'}.
+        """
+        self.httpd.completed_items = items
+
+    def __enter__(self):
+        # Die Attrappe prüft keinen Token - ohne konfigurierten reicht ein Platzhalter
+        self.token = offline_token()
+        self.token.__enter__()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.token.__exit__(*exc)
+
+# --------------------------
+# Messungen
+# --------------------------
+def measure(func, repeat, setup=None):
+    """
+    Führt func repeat-mal aus (setup jeweils vorher, ungemessen) und gibt
+    die einzelnen Laufzeiten in Sekunden zurück. Ausgaben werden verworfen.
+    """
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            runs.append(time.perf_counter() - start)
+    return runs
+
+def benchmark_size(size, churn, repeat, seed, workdir, server=None, engines=ENGINES):
+    """
+    Misst alle Hot Paths für eine Posteingangsgröße.
+    """
+    rng = random.Random(seed)
+    base_tasks = generate_inbox(size, rng)
+    churned_tasks = apply_churn(base_tasks, churn, rng)
+    db_path = os.path.join(workdir, f"bench_{size}.db")
+    template_path = db_path + ".template"
+
+    load_database(template_path, base_tasks, random.Random(seed))
+
+    def reset_database():
+        shutil.copyfile(template_path, db_path)
+        inbox_history.DB_PATH = db_path
+
+    reset_database()
+    db_tasks = inbox_history.get_db_tasks()
+    diff = inbox_history.compute_sync_diff(churned_tasks, db_tasks)
+
+    results = {}
+    results['get_db_tasks'] = measure(inbox_history.get_db_tasks, repeat, reset_database)
+    results['sync_reconciliation'] = measure(
+        lambda: inbox_history.compute_sync_diff(churned_tasks, db_tasks), repeat
+    )
+    results['batched_write'] = measure(lambda: inbox_history.apply_sync_diff(*diff), repeat, reset_database)
+
+    # Bericht ohne Netzwerk: der Posteingang wird direkt übergeben
+    churned_records = [(int(task['id']), task['content']) for task in churned_tasks]
+    original_get_inbox_records = inbox_history.get_inbox_records
+    inbox_history.get_inbox_records = lambda *args, **kwargs: churned_records
+    try:
+        results['show_inbox_with_history'] = measure(inbox_history.show_inbox_with_history, repeat, reset_database)
+    finally:
+        inbox_history.get_inbox_records = original_get_inbox_records
+
+    # Dieselbe Arbeit über die Speicher-Schnittstelle je Engine. Die In-Memory-Engine
+    # lädt den Stand beim init() (ungemessen) aus der Datenbank und schreibt ohne Checkpoint.
+    stores = {}
+
+    def open_engine(engine):
+        def setup():
+            reset_database()
+            stores[engine] = open_store(engine, db_path, checkpoint_interval=float('inf'))
+            with contextlib.redirect_stdout(io.StringIO()):
+                stores[engine].init()
+        return setup
+
+    for engine in engines:
+        results[f'{engine}:load_tasks'] = measure(lambda: stores[engine].load_tasks(), repeat, open_engine(engine))
+        results[f'{engine}:apply_diff'] = measure(lambda: stores[engine].apply_diff(*diff), repeat,
+                                                  open_engine(engine))
+
+    if server is not None:
+        server.set_tasks(churned_tasks)
+        # Die Hälfte der verschwundenen Tasks gilt als erledigt, der Rest als gelöscht
+        server.set_completed([{'task_id': str(task_id), 'completed_at': f"{clock.today().isoformat()}T12:00:00Z"}
+                              for task_id in sorted(diff[2])[::2]])
+        original_urls = inbox_history.API_BASE_URL, inbox_history.SYNC_API_URL
+        inbox_history.API_BASE_URL, inbox_history.SYNC_API_URL = server.base_url, server.sync_url
+        try:
+            results['fetch_inbox'] = measure(inbox_history.get_inbox_todos, repeat, reset_database)
+            results['fetch_inbox_stream'] = measure(inbox_history.get_inbox_records, repeat, reset_database)
+            results['full_sync'] = measure(inbox_history.sync_tasks, repeat, reset_database)
+            for engine in engines:
+                results[f'{engine}:full_sync'] = measure(lambda: inbox_history.sync_tasks(stores[engine]), repeat,
+                                                         open_engine(engine))
+        finally:
+            inbox_history.API_BASE_URL, inbox_history.SYNC_API_URL = original_urls
+
+    return {
+        'size': size,
+        'churn': churn,
+        'changes': {'new': len(diff[0]), 'renamed': len(diff[1]), 'deleted': len(diff[2])},
+        'timings': {
+            name: {'min': min(runs), 'median': sorted(runs)[len(runs) // 2], 'runs': runs}
+            for name, runs in results.items()
+        },
+    }
+
+def git_revision():
+    """
+    Ermittelt den aktuellen Git-Commit (falls verfügbar).
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(sizes, churn, repeat, seed, fetch=True, engines=ENGINES):
+    """
+    Führt die Benchmarks für alle Größen in einem temporären Verzeichnis aus.
+    """
+    original_db_path = inbox_history.DB_PATH
+    workdir = tempfile.mkdtemp(prefix="todoist_bench_")
+    results = []
+    try:
+        server_context = FakeTodoistServer() if fetch else contextlib.nullcontext()
+        with server_context as server:
+            for size in sizes:
+                print(f"Benchmark: {size} Tasks ...")
+                result = benchmark_size(size, churn, repeat, seed, workdir, server, engines)
+                for name, timing in result['timings'].items():
+                    print(f"   {name:<26} {timing['min'] * 1000:10.2f} ms")
+                results.append(result)
+    finally:
+        inbox_history.DB_PATH = original_db_path
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'created': clock.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sqlite': sqlite3.sqlite_version,
+        'seed': seed,
+        'repeat': repeat,
+        'results': results,
+    }
+
+# --------------------------
+# Hauptprogramm
+# --------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks für Sync- und Speicherpfade")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Kommagetrennte Posteingangsgrößen (z.B. 1000,100000,1000000)")
+    parser.add_argument("--churn", type=float, default=DEFAULT_CHURN,
+                        help="Anteil geänderter Tasks pro Sync (0.0 - 1.0)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Wiederholungen pro Messung")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Seed für reproduzierbare Daten")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Zieldatei für die JSON-Ergebnisse")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES),
+                        help="Speicher-Engines, die auf derselben Arbeit verglichen werden")
+    parser.add_argument("--no-fetch", action="store_true", help="Fetch-Messungen gegen den Fake-Server auslassen")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    report = run_benchmarks(sizes, args.churn, args.repeat, args.seed, fetch=not args.no_fetch,
+                            engines=args.engines)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Ergebnisse gespeichert: {args.output}")
@@ -0,0 +1,87 @@
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+# --------------------------
+# Uhren
+# --------------------------
+class SystemClock:
+    """
+    Die echte Uhr. Alle Datums- und Zeitstempel der Historie laufen über
+    clock.today() / clock.timestamp() / clock.now(), damit sich die Uhr
+    für Simulationen austauschen lässt (siehe replay).
+    Für Wartezeiten und Dauermessungen gilt weiterhin time.monotonic/perf_counter.
+    """
+
+    def time(self):
+        return time.time()
+
+    def now(self):
+        return datetime.now()
+
+    def today(self):
+        return date.today()
+
+    def __repr__(self):
+        return "SystemClock()"
+
+class SimulatedClock:
+    """
+    Uhr, die nur weiterläuft, wenn sie gestellt wird (set/advance).
+    Ohne start beginnt sie bei der aktuellen Zeit.
+    """
+
+    def __init__(self, start=None):
+        self.current = float(start if start is not None else time.time())
+
+    def time(self):
+        return self.current
+
+    def now(self):
+        return datetime.fromtimestamp(self.current)
+
+    def today(self):
+        return self.now().date()
+
+    def set(self, timestamp):
+        self.current = float(timestamp)
+
+    def advance(self, seconds):
+        self.current += seconds
+
+    def __repr__(self):
+        return f"SimulatedClock({self.now().isoformat(timespec='seconds')})"
+
+_clock = SystemClock()
+
+def get_clock():
+    return _clock
+
+def set_clock(new_clock=None):
+    """
+    Setzt die Uhr für den ganzen Prozess (ohne Angabe: wieder die echte Uhr).
+    Gibt die bisherige Uhr zurück.
+    """
+    global _clock
+    previous, _clock = _clock, new_clock or SystemClock()
+    return previous
+
+@contextmanager
+def use_clock(new_clock):
+    previous = set_clock(new_clock)
+    try:
+        yield new_clock
+    finally:
+        set_clock(previous)
+
+# --------------------------
+# Abkürzungen
+# --------------------------
+def timestamp():
+    return _clock.time()
+
+def now():
+    return _clock.now()
+
+def today():
+    return _clock.today()
@@ -0,0 +1,329 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from inbox_history import default_headers
+from todoist_api import api_post, PRIORITY_INTERACTIVE
+
+# --------------------------
+# Konfiguration
+# --------------------------
+DB_PATH = "tasks_history.db"
+SYNC_API_URL = "https://api.todoist.com/sync/v9"
+BATCH_LIMIT = 100  # Todoist nimmt höchstens 100 Befehle pro Request an
+BATCH_DELAY = 2.0  # Sekunden, in denen Schnellaktionen zu einem Request gesammelt werden
+RETRY_BASE = 10.0  # Erste Wartezeit nach einem fehlgeschlagenen Request, verdoppelt sich bis RETRY_MAX
+RETRY_MAX = 900.0
+
+ITEM_ADD = 'item_add'
+ITEM_CLOSE = 'item_close'  # Erledigen wie in der App (wiederkehrende Tasks springen weiter)
+ITEM_UPDATE = 'item_update'
+
+# --------------------------
+# Schema
+# --------------------------
+def init_command_schema(cursor):
+    """
+    Erstellt die Tabelle pending_commands. Ein Befehl bleibt darin, bis Todoist
+    ihn bestätigt oder abgelehnt hat - auch über Neustarts und Offline-Phasen hinweg.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pending_commands (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            uuid TEXT NOT NULL UNIQUE,
+            type TEXT NOT NULL,
+            args TEXT NOT NULL,
+            temp_id TEXT,
+            created REAL NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT
+        )
+    ''')
+
+# --------------------------
+# Befehls-Queue
+# --------------------------
+class CommandQueue:
+    """
+    Sendet Schnellaktionen als Befehle an die Todoist-Sync-API.
+    Befehle werden sofort in SQLite gespeichert und in einem eigenen Thread
+    gesammelt (BATCH_DELAY) und gebündelt in einem Request verschickt.
+    Nacheinander folgende Änderungen am selben Task werden zu einem item_update
+    zusammengefasst. Schlägt ein Request fehl (offline, Rate-Limit, 5xx), wird mit
+    wachsendem Abstand erneut gesendet; von Todoist abgelehnte Befehle werden verworfen.
+    """
+
+    def __init__(self, db_path=DB_PATH, headers=None, sync_url=SYNC_API_URL, delay=BATCH_DELAY):
+        self.db_path = db_path
+        self.headers = headers or {}
+        self.sync_url = sync_url
+        self.delay = delay
+        self.temp_id_mapping = {}  # temp_id -> echte ID aus bereits gesendeten Befehlen
+        self.sending = set()  # UUIDs im laufenden Request - werden nicht mehr zusammengefasst
+        self.failures = 0
+        self.retry_at = 0.0
+        self.closed = False
+        self.table_ready = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="command-sender", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        # Befehle aus einer früheren Sitzung gleich mitsenden
+        with self.condition:
+            self.condition.notify()
+        return self
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        if not self.table_ready:
+            init_command_schema(conn.cursor())
+            conn.commit()
+            self.table_ready = True
+        return conn
+
+    # --------------------------
+    # Schnellaktionen
+    # --------------------------
+    def complete(self, task_id):
+        return self.enqueue(ITEM_CLOSE, {'id': str(task_id)})
+
+    def rename(self, task_id, content):
+        return self.enqueue(ITEM_UPDATE, {'id': str(task_id), 'content': content})
+
+    def reschedule(self, task_id, due_date):
+        """
+        Setzt das Fälligkeitsdatum (date-Objekt) eines Tasks.
+        """
+        return self.enqueue(ITEM_UPDATE, {'id': str(task_id), 'due': {'date': due_date.isoformat()}})
+
+    def add(self, content, project_id=None):
+        """
+        Legt einen Task an und gibt seine temporäre ID zurück. Spätere Befehle
+        dürfen sie als 'id' verwenden, sie wird nach dem Senden ersetzt.
+        """
+        temp_id = str(uuid.uuid4())
+        args = {'content': content}
+        if project_id:
+            args['project_id'] = str(project_id)
+        self.enqueue(ITEM_ADD, args, temp_id)
+        return temp_id
+
+    def enqueue(self, command_type, args, temp_id=None):
+        """
+        Speichert einen Befehl dauerhaft und weckt den Sende-Thread.
+        Gibt die UUID des Befehls zurück.
+        """
+        if 'id' in args:
+            args = dict(args, id=self.temp_id_mapping.get(args['id'], args['id']))
+        command_uuid = str(uuid.uuid4())
+
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Befehls-Queue ist bereits geschlossen")
+            conn = self.connect()
+            try:
+                merged = False
+                if command_type == ITEM_UPDATE:
+                    # Letzten noch nicht gesendeten Befehl für denselben Task erweitern
+                    row = conn.execute('''
+                        SELECT uuid, type, args FROM pending_commands ORDER BY id DESC LIMIT 1
+                    ''').fetchone()
+                    if row and row[1] == ITEM_UPDATE and row[0] not in self.sending:
+                        previous = json.loads(row[2])
+                        if previous.get('id') == args['id']:
+                            previous.update(args)
+                            conn.execute('UPDATE pending_commands SET args = ? WHERE uuid = ?',
+                                         (json.dumps(previous), row[0]))
+                            command_uuid = row[0]
+                            merged = True
+                if not merged:
+                    conn.execute('''
+                        INSERT INTO pending_commands (uuid, type, args, temp_id, created)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (command_uuid, command_type, json.dumps(args), temp_id, time.time()))
+                conn.commit()
+            finally:
+                conn.close()
+            self.condition.notify()
+        return command_uuid
+
+    # --------------------------
+    # Sicht auf noch nicht gesendete Befehle
+    # --------------------------
+    def pending(self, limit=None):
+        """
+        Noch nicht bestätigte Befehle als Liste von (uuid, type, args, temp_id), älteste zuerst.
+        """
+        conn = self.connect()
+        try:
+            query = 'SELECT uuid, type, args, temp_id FROM pending_commands ORDER BY id'
+            if limit:
+                query += f' LIMIT {int(limit)}'
+            return [(row[0], row[1], json.loads(row[2]), row[3]) for row in conn.execute(query)]
+        finally:
+            conn.close()
+
+    def overlay_records(self, records):
+        """
+        Wendet ausstehende Befehle auf frisch geladene (task_id, content, ...)-Tupel an,
+        damit ein Sync vor dem Senden erledigte Tasks nicht wieder anzeigt
+        und Umbenennungen nicht zurücksetzt.
+        """
+        closed = set()
+        renamed = {}
+        for _, command_type, args, _ in self.pending():
+            if command_type == ITEM_CLOSE:
+                closed.add(args['id'])
+            elif command_type == ITEM_UPDATE and 'content' in args:
+                renamed[args['id']] = args['content']
+        if not closed and not renamed:
+            return records
+
+        result = []
+        for record in records:
+            key = str(record[0])
+            if key in closed:
+                continue
+            if key in renamed:
+                record = (record[0], renamed[key]) + tuple(record[2:])
+            result.append(record)
+        return result
+
+    # --------------------------
+    # Senden
+    # --------------------------
+    def send_batch(self):
+        """
+        Sendet bis zu BATCH_LIMIT Befehle in einem Request.
+        Gibt True zurück, wenn Todoist geantwortet hat (auch bei abgelehnten Befehlen).
+        """
+        # Lesen und Markieren unter der Sperre, damit enqueue nichts mehr in diese Befehle einfügt
+        with self.condition:
+            batch = self.pending(BATCH_LIMIT)
+            self.sending = {command_uuid for command_uuid, _, _, _ in batch}
+        if not batch:
+            return True
+
+        commands = []
+        for command_uuid, command_type, args, temp_id in batch:
+            command = {'type': command_type, 'uuid': command_uuid, 'args': args}
+            if temp_id:
+                command['temp_id'] = temp_id
+            commands.append(command)
+
+        try:
+            # Ohne eigene headers gilt das Standardkonto (Token bei jedem Request neu gelesen)
+            response = api_post(f"{self.sync_url}/sync", self.headers or default_headers(),
+                                data={'commands': json.dumps(commands)},
+                                priority=PRIORITY_INTERACTIVE, db_path=self.db_path)
+            if response is None:
+                raise RuntimeError("kein Rate-Limit-Budget")
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            result = response.json()
+        except Exception as e:
+            self.record_failure([command_uuid for command_uuid, _, _, _ in batch], str(e))
+            return False
+        finally:
+            with self.condition:
+                self.sending = set()
+
+        sync_status = result.get('sync_status') or {}
+        mapping = result.get('temp_id_mapping') or {}
+        finished = []
+        for command_uuid, command_type, args, _ in batch:
+            status = sync_status.get(command_uuid)
+            if status is None:
+                continue  # Nicht bearbeitet - beim nächsten Request erneut senden
+            if status != 'ok':
+                print(f"Befehl {command_type} {args.get('id', '')} abgelehnt: {status}")
+            finished.append(command_uuid)
+        self.finish(finished, mapping)
+        return True
+
+    def record_failure(self, command_uuids, error):
+        conn = self.connect()
+        try:
+            conn.executemany('''
+                UPDATE pending_commands SET attempts = attempts + 1, last_error = ? WHERE uuid = ?
+            ''', [(error, command_uuid) for command_uuid in command_uuids])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def finish(self, command_uuids, mapping):
+        """
+        Entfernt bestätigte bzw. abgelehnte Befehle und ersetzt temporäre IDs
+        in den noch ausstehenden Befehlen durch die echten.
+        """
+        with self.condition:
+            self.temp_id_mapping.update(mapping)
+            conn = self.connect()
+            try:
+                conn.executemany('DELETE FROM pending_commands WHERE uuid = ?',
+                                 [(command_uuid,) for command_uuid in command_uuids])
+                if mapping:
+                    rows = conn.execute('SELECT uuid, args FROM pending_commands').fetchall()
+                    for command_uuid, args_json in rows:
+                        args = json.loads(args_json)
+                        if args.get('id') in mapping:
+                            args['id'] = mapping[args['id']]
+                            conn.execute('UPDATE pending_commands SET args = ? WHERE uuid = ?',
+                                         (json.dumps(args), command_uuid))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def has_pending(self):
+        conn = self.connect()
+        try:
+            return conn.execute('SELECT 1 FROM pending_commands LIMIT 1').fetchone() is not None
+        finally:
+            conn.close()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.closed and not self.has_pending():
+                    self.condition.wait()
+                if self.closed:
+                    return
+                # Weitere Aktionen sammeln bzw. nach Fehlern abwarten
+                wait = max(self.delay, self.retry_at - time.time())
+                self.condition.wait_for(lambda: self.closed, timeout=wait)
+                if self.closed:
+                    return
+
+            try:
+                ok = self.send_batch()
+            except sqlite3.Error as e:
+                print(f"Fehler beim Lesen der Befehls-Queue: {e}")
+                ok = False
+            self.record_result(ok)
+
+    def record_result(self, ok):
+        """
+        Setzt nach einem Request die Wartezeit bis zum nächsten: nach Fehlern
+        RETRY_BASE, dann jeweils doppelt so lang bis höchstens RETRY_MAX.
+        """
+        if ok:
+            self.failures = 0
+            self.retry_at = 0.0
+        else:
+            self.failures += 1
+            self.retry_at = time.time() + min(RETRY_MAX, RETRY_BASE * 2 ** (self.failures - 1))
+
+    def close(self, timeout=5.0):
+        """
+        Beendet den Sende-Thread. Nicht gesendete Befehle bleiben gespeichert
+        und werden beim nächsten Start verschickt.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+        return not self.has_pending()
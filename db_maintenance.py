@@ -0,0 +1,302 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# --------------------------
+# Konfiguration
+# --------------------------
+DB_PATH = "tasks_history.db"
+BACKUP_DIR = "backups"
+BACKUP_KEEP = 7  # Anzahl aufbewahrter Sicherungen
+
+VACUUM_INTERVAL = 3600  # Sekunden zwischen zwei Runden inkrementellem Vacuum
+OPTIMIZE_INTERVAL = 24 * 3600  # PRAGMA optimize (ANALYZE nur wo nötig)
+INTEGRITY_INTERVAL = 24 * 3600  # PRAGMA quick_check
+BACKUP_INTERVAL = 24 * 3600  # Online-Sicherung über die Backup-API
+
+VACUUM_PAGES = 64  # Freie Seiten pro Schritt
+BACKUP_PAGES = 128  # Kopierte Seiten pro Schritt
+ANALYSIS_LIMIT = 400  # Zeilen je Index, die ANALYZE höchstens liest
+SLICE_PAUSE = 0.05  # Sekunden zwischen zwei Schritten, damit Syncs dazwischen schreiben können
+BUSY_TIMEOUT = 0.2  # Sekunden, die ein Schritt auf eine Sperre wartet, bevor er aufgibt
+CHECK_INTERVAL = 60  # Sekunden, in denen der Scheduler nach fälligen Aufgaben sieht
+
+TASKS = ('vacuum', 'optimize', 'integrity', 'backup')
+ABORTED = "abgebrochen"  # Ergebnis einer beim Beenden unterbrochenen Aufgabe - sie bleibt fällig
+
+# --------------------------
+# Schema
+# --------------------------
+def init_maintenance_schema(cursor):
+    """
+    Erstellt die Tabelle maintenance_runs mit dem letzten Lauf und Ergebnis je Aufgabe.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            task TEXT PRIMARY KEY,
+            last_run REAL NOT NULL,
+            duration_ms REAL NOT NULL,
+            result TEXT NOT NULL
+        )
+    ''')
+
+def connect(db_path=DB_PATH):
+    # Kurzer Timeout: ein Wartungsschritt weicht einem Sync aus, statt ihn aufzuhalten
+    return sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+
+def record_run(conn, task, started, result):
+    conn.execute('''
+        INSERT OR REPLACE INTO maintenance_runs (task, last_run, duration_ms, result)
+        VALUES (?, ?, ?, ?)
+    ''', (task, time.time(), (time.perf_counter() - started) * 1000, result))
+
+def last_runs(conn):
+    init_maintenance_schema(conn.cursor())
+    return {row[0]: row[1:] for row in conn.execute('SELECT task, last_run, duration_ms, result FROM maintenance_runs')}
+
+# --------------------------
+# Wartungsschritte
+# --------------------------
+def incremental_vacuum_enabled(conn):
+    return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+
+def enable_incremental_vacuum(conn):
+    """
+    Stellt die Datenbank auf auto_vacuum=INCREMENTAL um. Bei bestehenden Datenbanken
+    braucht das einmal ein vollständiges VACUUM, das die Datenbank für die ganze Dauer
+    sperrt - deshalb nur über 'python db_maintenance.py --convert', nie vom Scheduler.
+    Neue Datenbanken legt init_database direkt so an. Gibt True zurück, wenn der Modus aktiv ist.
+    """
+    if incremental_vacuum_enabled(conn):
+        return True
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    return incremental_vacuum_enabled(conn)
+
+def vacuum_step(conn, pages=VACUUM_PAGES):
+    """
+    Gibt bis zu pages freie Seiten an das Dateisystem zurück.
+    Gibt die Anzahl der danach noch freien Seiten zurück.
+    """
+    # execute() führt das Pragma nur einen Schritt (= eine Seite) weit aus, executescript bis zum Ende
+    conn.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+    return conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+def optimize(conn):
+    """
+    PRAGMA optimize mit begrenzter Analyse: ANALYZE läuft nur für Tabellen,
+    deren Statistik veraltet ist, und liest je Index höchstens ANALYSIS_LIMIT Zeilen.
+    """
+    conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is None:
+        # Noch nie analysiert - optimize würde dann nichts tun
+        conn.execute('ANALYZE')
+    conn.execute('PRAGMA optimize')
+
+def table_names(conn):
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+
+def quick_check(conn, table):
+    """
+    PRAGMA quick_check für eine Tabelle. Gibt die Liste der Fehler zurück (leer wenn ok).
+    """
+    rows = [row[0] for row in conn.execute(f'PRAGMA quick_check("{table}")')]
+    return [] if rows == ['ok'] else rows
+
+def backup_path(db_path, backup_dir=BACKUP_DIR):
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(backup_dir, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
+
+def backup(conn, target_path, pages=BACKUP_PAGES, pause=SLICE_PAUSE, keep=BACKUP_KEEP):
+    """
+    Online-Sicherung über die Backup-API in Schritten zu pages Seiten. Zwischen den
+    Schritten können andere Verbindungen schreiben (die Kopie beginnt dann neu).
+    Die Sicherung entsteht unter einem temporären Namen und ersetzt nichts Halbfertiges.
+    Ältere Sicherungen über keep hinaus werden gelöscht.
+    """
+    directory = os.path.dirname(target_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    temp_path = target_path + ".tmp"
+    target = sqlite3.connect(temp_path)
+    try:
+        conn.backup(target, pages=pages, sleep=pause)
+    finally:
+        target.close()
+    os.replace(temp_path, target_path)
+
+    prefix = os.path.basename(target_path).rsplit("_", 2)[0] + "_"
+    backups = sorted(name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith(".db"))
+    for name in backups[:-keep] if keep else []:
+        os.remove(os.path.join(directory, name))
+    return target_path
+
+# --------------------------
+# Scheduler
+# --------------------------
+class MaintenanceScheduler:
+    """
+    Führt die Wartung in einem eigenen Thread in kleinen Schritten aus: inkrementelles
+    Vacuum, PRAGMA optimize, quick_check je Tabelle und Online-Sicherungen.
+    Vor jedem Schritt wird is_busy() gefragt (z.B. ob gerade geschrieben wird);
+    solange es True liefert, wartet die Wartung. Ein Schritt, der keine Sperre
+    bekommt, wird nach BUSY_TIMEOUT abgebrochen und später wiederholt.
+    Letzter Lauf und Ergebnis stehen in maintenance_runs.
+    """
+
+    def __init__(self, db_path=DB_PATH, is_busy=None, backup_dir=BACKUP_DIR, intervals=None):
+        self.db_path = db_path
+        self.is_busy = is_busy or (lambda: False)
+        self.backup_dir = backup_dir
+        self.intervals = {
+            'vacuum': VACUUM_INTERVAL,
+            'optimize': OPTIMIZE_INTERVAL,
+            'integrity': INTEGRITY_INTERVAL,
+            'backup': BACKUP_INTERVAL,
+        }
+        self.intervals.update(intervals or {})
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="db-maintenance", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def due_tasks(self, conn, now=None):
+        now = time.time() if now is None else now
+        runs = last_runs(conn)
+        return [task for task in TASKS
+                if self.intervals.get(task) and (now - runs.get(task, (0,))[0] >= self.intervals[task]
+                                                 or runs[task][2] == ABORTED)]
+
+    def wait_slice(self):
+        """
+        Pause zwischen zwei Schritten, verlängert solange is_busy() gilt.
+        Gibt False zurück, wenn der Scheduler beendet wird.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.closed, timeout=SLICE_PAUSE)
+            while not self.closed and self.is_busy():
+                self.condition.wait_for(lambda: self.closed, timeout=SLICE_PAUSE)
+            return not self.closed
+
+    def run_task(self, conn, task):
+        """
+        Führt eine Aufgabe in Schritten aus und gibt das Ergebnis als Text zurück.
+        """
+        if task == 'vacuum':
+            if not incremental_vacuum_enabled(conn):
+                # Die Umstellung braucht ein blockierendes VACUUM - nur auf ausdrücklichen Wunsch
+                return "auto_vacuum nicht aktiv (python db_maintenance.py --convert)"
+            freed = 0
+            free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            while free_pages and self.wait_slice():
+                remaining = vacuum_step(conn)
+                freed += free_pages - remaining
+                free_pages = remaining
+            return f"{freed} Seiten freigegeben, {free_pages} frei"
+        if task == 'optimize':
+            optimize(conn)
+            return "ok"
+        if task == 'integrity':
+            errors = []
+            for table in table_names(conn):
+                if not self.wait_slice():
+                    # Nicht alle Tabellen geprüft - kein "ok" eintragen
+                    return ABORTED
+                errors.extend(quick_check(conn, table))
+            if errors:
+                print(f"Warnung: Integritätsprüfung von '{self.db_path}' meldet {len(errors)} Fehler: {errors[:3]}")
+                return "; ".join(errors[:10])
+            return "ok"
+        if task == 'backup':
+            path = backup(conn, backup_path(self.db_path, self.backup_dir))
+            return path
+        raise ValueError(f"Unbekannte Wartungsaufgabe: {task}")
+
+    def run_due(self, tasks=None):
+        """
+        Führt alle fälligen (bzw. die angegebenen) Aufgaben aus.
+        Gibt {Aufgabe: Ergebnis} zurück; gesperrte Schritte werden beim nächsten Mal wiederholt.
+        """
+        results = {}
+        conn = connect(self.db_path)
+        try:
+            init_maintenance_schema(conn.cursor())
+            for task in tasks or self.due_tasks(conn):
+                if not self.wait_slice():
+                    break
+                started = time.perf_counter()
+                try:
+                    results[task] = self.run_task(conn, task)
+                except sqlite3.OperationalError as e:
+                    # Datenbank gerade gesperrt - nicht warten, später erneut versuchen
+                    results[task] = f"verschoben: {e}"
+                    continue
+                record_run(conn, task, started, results[task])
+        finally:
+            conn.close()
+        return results
+
+    def run(self):
+        while True:
+            try:
+                self.run_due()
+            except Exception as e:
+                print(f"Fehler bei der Datenbank-Wartung: {e}")
+            with self.condition:
+                self.condition.wait_for(lambda: self.closed, timeout=CHECK_INTERVAL)
+                if self.closed:
+                    return
+
+    def close(self, timeout=5.0):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+# --------------------------
+# Kommandozeile
+# --------------------------
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Wartung der Task-Datenbank")
+    parser.add_argument("--db", default=DB_PATH, help="Pfad zur Datenbank")
+    parser.add_argument("--run", nargs="*", choices=TASKS, metavar="AUFGABE",
+                        help=f"Aufgaben sofort ausführen ({', '.join(TASKS)}; ohne Angabe alle)")
+    parser.add_argument("--convert", action="store_true",
+                        help="Auf auto_vacuum=INCREMENTAL umstellen (einmaliges VACUUM, sperrt die Datenbank)")
+    parser.add_argument("--backup-dir", default=BACKUP_DIR, help="Verzeichnis für Sicherungen")
+    args = parser.parse_args()
+
+    scheduler = MaintenanceScheduler(args.db, backup_dir=args.backup_dir)
+    if args.convert:
+        conn = sqlite3.connect(args.db, isolation_level=None)
+        try:
+            active = enable_incremental_vacuum(conn)
+        finally:
+            conn.close()
+        print("auto_vacuum=INCREMENTAL aktiv." if active else "Umstellung fehlgeschlagen.")
+    if args.run is not None:
+        for task, result in scheduler.run_due(args.run or list(TASKS)).items():
+            print(f"{task:<10} {result}")
+
+    conn = connect(args.db)
+    try:
+        runs = last_runs(conn)
+    finally:
+        conn.close()
+    print(f"\n{'Aufgabe':<10} {'Letzter Lauf':<20} {'Dauer':>10}  Ergebnis")
+    for task in TASKS:
+        if task in runs:
+            last_run, duration_ms, result = runs[task]
+            print(f"{task:<10} {datetime.fromtimestamp(last_run).strftime('%d.%m.%Y %H:%M:%S'):<20} "
+                  f"{duration_ms:>8.0f}ms  {result}")
+        else:
+            print(f"{task:<10} {'nie':<20}")
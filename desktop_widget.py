@@ -1,14 +1,22 @@
 import tkinter as tk
-from tkinter import ttk
-import requests
-import sqlite3
-import json
-from datetime import datetime, date
+from tkinter import simpledialog
+from datetime import timedelta
 import threading
 import time
 import os
 import sys
-import psutil  # Für Prozess-Management
+import clock
+from todoist_api import api_get, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from sync_metrics import MetricsRecorder, phase, count
+from inbox_history import (classify_disappeared_tasks, default_headers, disappeared_since, iter_task_records,
+                           task_record)
+from storage import open_store
+from write_queue import WriteBehindQueue
+from command_queue import CommandQueue
+from widget_layout import FontMetrics, TaskLayout, TaskRowCache, format_task_lines, DEFAULT_COLUMNS
+from idle_policy import IdlePolicy, session_state
+from db_maintenance import MaintenanceScheduler
+from task_snapshot import SnapshotReader, TaskMapping, snapshot_path_for
 
 # --------------------------
 # Single-Instance Check
@@ -17,6 +25,9 @@ def check_single_instance():
     """
     Prüft ob bereits eine Instanz des Desktop-Widgets läuft.
     """
+    # psutil nur hier laden - wird sonst nirgends gebraucht
+    import psutil
+    
     script_name = "desktop_widget.py"
     current_pid = os.getpid()
     
@@ -49,10 +60,35 @@ def check_single_instance():
 # --------------------------
 # Konfiguration
 # --------------------------
-API_TOKEN = "391abfcd2e31d30fe065d9d96d4478144ca21891"
-HEADERS = {"Authorization": f"Bearer {API_TOKEN}"}
 DB_PATH = "tasks_history.db"
 UPDATE_INTERVAL = 300  # 5 Minuten in Sekunden
+PERSIST_SYNC_METRICS = True  # Zeitmessungen in Tabelle sync_metrics speichern
+# Port für den lokalen Prometheus-Endpunkt /metrics (0 = deaktiviert)
+METRICS_PORT = int(os.environ.get("TODOIST_METRICS_PORT", "0"))
+# Port für Todoist-Webhooks (0 = deaktiviert, nur Polling). Mit Webhooks wird nur noch
+# alle WEBHOOK_POLL_INTERVAL Sekunden zur Konsistenzprüfung gepollt.
+WEBHOOK_PORT = int(os.environ.get("TODOIST_WEBHOOK_PORT", "0"))
+WEBHOOK_POLL_INTERVAL = 3600
+# Wenn gesetzt: alle API-Antworten in diese Kassette aufnehmen (abspielen mit replay.py play)
+RECORD_CASSETTE = os.environ.get("TODOIST_CASSETTE", "")
+DATE_FORMAT = '%d.%m.%Y'
+TEXT_FONT = ('Consolas', 9)
+# Spalten je Task-Zeile, z.B. ('date', 'priority', 'project', 'content')
+WIDGET_COLUMNS = DEFAULT_COLUMNS
+FRAME_PADDING = 10  # Abstand des Hauptcontainers zum Fensterrand
+# 'sqlite' = direkt in die Datenbank, 'memory' = Hot Cache im Speicher mit Checkpoints in die Datenbank
+STORAGE_ENGINE = "sqlite"
+CHECKPOINT_INTERVAL = 300  # Sekunden zwischen zwei Checkpoints (nur 'memory')
+# Leerlauf: ab IDLE_AFTER Sekunden ohne Eingabe (oder gesperrt) seltener pollen, ab PAUSE_AFTER gar nicht
+IDLE_AFTER = 600
+PAUSE_AFTER = 3600
+SESSION_CHECK_INTERVAL = 1.0  # Sekunden zwischen zwei Abfragen von Eingabe- und Sperrzustand
+DB_MAINTENANCE = True  # Vacuum, optimize, quick_check und Sicherungen in kleinen Schritten
+# Nach jedem Sync einen gemappten Snapshot (tasks_history.snap) für inspect_db, find_changes usw. veröffentlichen
+PUBLISH_SNAPSHOT = True
+# Fast gleiche Tasks markieren (Index aus duplicates.py, folgt den DB-Schreibvorgängen)
+SHOW_DUPLICATES = False
+DUPLICATE_MARKER = "≈ "
 
 class TaskDesktopWidget:
     def __init__(self):
@@ -68,8 +104,54 @@ class TaskDesktopWidget:
         self.mouse_left_widget_time = None
         self.shutdown_flag = False  # Flag für sauberes Beenden
         
+        # Leerlauf: ausgeblendet nicht rendern, inaktiv seltener bzw. gar nicht pollen
+        self.idle = IdlePolicy(IDLE_AFTER, PAUSE_AFTER)
+        self.wake_event = threading.Event()  # weckt den Update-Thread bei Zustandswechseln
+        
+        # Zeitmessung der Sync-Zyklen (Ringpuffer, optional in der DB)
+        self.metrics = MetricsRecorder(DB_PATH if PERSIST_SYNC_METRICS else None)
+        self.exporter = None
+        if METRICS_PORT:
+            self.start_metrics_exporter()
+        self.recorder = None
+        if RECORD_CASSETTE:
+            from replay import CassetteRecorder
+            self.recorder = CassetteRecorder(RECORD_CASSETTE).install()
+        
+        # Speicher-Engine einmalig öffnen, Schreibzugriffe laufen gebündelt im Hintergrund
+        snapshot_path = snapshot_path_for(DB_PATH) if PUBLISH_SNAPSHOT else None
+        self.store = open_store(STORAGE_ENGINE, DB_PATH, CHECKPOINT_INTERVAL, snapshot_path)
+        self.store.init()
+        self.snapshots = SnapshotReader(snapshot_path) if snapshot_path else None
+        self.write_queue = WriteBehindQueue(self.store).start()
+        # Schnellaktionen gehen gebündelt und dauerhaft gespeichert an die Sync-API
+        self.commands = CommandQueue(DB_PATH).start()
+        # Wartung weicht der Write-Behind-Queue aus, solange dort Änderungen anstehen
+        self.maintenance = None
+        if DB_MAINTENANCE:
+            self.maintenance = MaintenanceScheduler(
+                DB_PATH, is_busy=lambda: self.write_queue.writing or bool(self.write_queue.pending)
+            ).start()
+        
+        # Layout und Render-Cache entstehen in setup_layout, sobald die Schrift gemessen ist
+        self.layout = None
+        self.row_cache = None
+        self.rendered_text = None
+        self.current_geometry = None
+        
+        # Zuletzt angezeigte Tasks und Posteingang - Webhooks ändern sie ohne API-Aufruf
+        self.current_tasks = None
+        self.inbox_project_id = None
+        self.duplicate_ids = set()
+        if SHOW_DUPLICATES:
+            self.start_duplicate_backfill()
+        self.webhook = None
+        if WEBHOOK_PORT:
+            self.start_webhook_receiver()
+        
         self.setup_window()
         self.setup_ui()
+        self.setup_layout()
         self.start_update_thread()
         self.start_mouse_tracking()
         
@@ -107,20 +189,42 @@ class TaskDesktopWidget:
         screen_width = self.root.winfo_screenwidth()
         screen_height = self.root.winfo_screenheight()
         
-        # Höhe basierend auf Anzahl Tasks berechnen
-        # Jede Zeile ca. 20px + Header (80px) + Footer (40px) + Padding (20px)
-        line_height = 20
-        header_footer_height = 140
+        # Höhe aus gemessener Zeilenhöhe und Rahmen (vor setup_layout: Mindesthöhe)
         min_height = 200
-        
-        calculated_height = header_footer_height + (task_count * line_height)
-        self.window_height = max(min_height, min(calculated_height, screen_height - 100))
+        max_height = screen_height - 100
+        if self.layout:
+            self.window_height = self.layout.window_height(task_count, min_height, max_height)
+        else:
+            self.window_height = min_height
         
         # Fensterposition berechnen (oben rechts mit etwas Abstand)
         x = screen_width - self.window_width - 20  # 20px vom rechten Rand
         y = 50  # 50px vom oberen Rand
         
-        self.root.geometry(f"{self.window_width}x{self.window_height}+{x}+{y}")
+        # Nur ein Geometrie-Aufruf und nur bei tatsächlicher Änderung
+        geometry = f"{self.window_width}x{self.window_height}+{x}+{y}"
+        if geometry != self.current_geometry:
+            self.root.geometry(geometry)
+            self.current_geometry = geometry
+        
+    def setup_layout(self):
+        """
+        Misst Schrift und Fensterrahmen einmalig und legt Layout und Render-Cache an.
+        """
+        import tkinter.font as tkfont
+        
+        metrics = FontMetrics(tkfont.Font(root=self.root, font=TEXT_FONT))
+        
+        # Nutzbare Textbreite: Fenster abzüglich Container-Abstand und Innenabstand des Text-Widgets
+        text_inset = 2 * sum(int(self.task_text.cget(option)) for option in ('borderwidth', 'highlightthickness', 'padx'))
+        text_width_px = self.window_width - 2 * FRAME_PADDING - text_inset
+        self.layout = TaskLayout(metrics, text_width_px, WIDGET_COLUMNS, DATE_FORMAT)
+        
+        # Höhe von Titel, Status und Abständen: einmal mit genau einer Textzeile messen
+        self.root.update_idletasks()
+        self.layout.chrome_height = self.root.winfo_reqheight() - metrics.line_height
+        
+        self.row_cache = TaskRowCache(self.layout)
         
     def setup_ui(self):
         """
@@ -128,7 +232,7 @@ class TaskDesktopWidget:
         """
         # Hauptcontainer
         main_frame = tk.Frame(self.root, bg='#2b2b2b')
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=FRAME_PADDING, pady=FRAME_PADDING)
         
         # Titel - als separates Widget für Drag-Funktionalität
         self.title_frame = tk.Frame(main_frame, bg='#2b2b2b')
@@ -161,7 +265,7 @@ class TaskDesktopWidget:
             main_frame,
             bg='#1e1e1e',
             fg='white',
-            font=('Consolas', 9),
+            font=TEXT_FONT,
             relief=tk.FLAT,
             wrap=tk.NONE,  # Kein Zeilenumbruch, da wir Text abschneiden
             state=tk.DISABLED,
@@ -170,6 +274,9 @@ class TaskDesktopWidget:
         )
         self.task_text.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
         
+        # Rechtsklick auf eine Zeile: Schnellaktionen
+        self.task_text.bind('<Button-3>', self.show_quick_actions)
+        
         # Status-Label
         self.status_label = tk.Label(
             main_frame,
@@ -215,12 +322,60 @@ class TaskDesktopWidget:
             # Doppelklick zum Ausblenden
             widget.bind('<Double-Button-1>', double_click_hide)
         
+    def start_metrics_exporter(self):
+        """
+        Startet den lokalen Metrik-Endpunkt. Wird nur bei gesetztem METRICS_PORT
+        importiert, damit das Widget ohne Exporter keinen Zusatzaufwand hat.
+        """
+        from metrics_server import MetricsExporter
+        
+        try:
+            # Die Altersgruppen zählt die Engine selbst (SQLite per GROUP BY), ohne alle Tasks zu laden
+            self.exporter = MetricsExporter(METRICS_PORT, age_source=self.store.count_by_age).start(self.metrics)
+        except OSError as e:
+            print(f"Warnung: Metrik-Endpunkt konnte nicht gestartet werden: {e}")
+            self.exporter = None
+        
+    def start_webhook_receiver(self):
+        """
+        Startet den Webhook-Empfänger. Ereignisse werden im Tk-Thread übernommen.
+        """
+        from webhook_receiver import WebhookReceiver
+        
+        def on_event(event_name, event_data):
+            self.root.after(0, lambda: self.apply_webhook_event(event_name, event_data))
+        
+        try:
+            self.webhook = WebhookReceiver(on_event, port=WEBHOOK_PORT).start()
+        except (OSError, ValueError) as e:
+            print(f"Warnung: Webhook-Empfänger konnte nicht gestartet werden, es wird gepollt: {e}")
+            self.webhook = None
+        
     def close_app(self):
         """
         Schließt die Anwendung ordentlich.
         """
         print("Schließe Desktop-Widget...")
         self.shutdown_flag = True
+        self.wake_event.set()
+        
+        # Ausstehende DB-Änderungen noch schreiben (bei 'memory' inkl. letztem Checkpoint)
+        self.write_queue.close()
+        self.store.close()
+        if self.snapshots:
+            self.snapshots.close()
+        # Nicht gesendete Schnellaktionen bleiben gespeichert und gehen beim nächsten Start raus
+        self.commands.close()
+        if self.maintenance:
+            self.maintenance.close()
+        
+        # Webhook-Empfänger und Metrik-Endpunkt beenden
+        if self.webhook:
+            self.webhook.stop()
+        if self.exporter:
+            self.exporter.stop()
+        if self.recorder:
+            self.recorder.close()
         
         # Timer stoppen
         if self.hide_timer:
@@ -239,10 +394,17 @@ class TaskDesktopWidget:
         Startet das kontinuierliche Mouse-Tracking.
         """
         def mouse_tracker():
+            last_session_check = 0.0
             while not self.shutdown_flag:
                 try:
                     self.check_mouse_position()
-                    time.sleep(0.1)  # Alle 100ms prüfen
+                    now = time.monotonic()
+                    if now - last_session_check >= SESSION_CHECK_INTERVAL:
+                        last_session_check = now
+                        if self.idle.observe_session(*session_state()):
+                            self.wake_event.set()
+                    # Alle 100ms prüfen, im Leerlauf seltener
+                    time.sleep(self.idle.mouse_interval())
                 except:
                     break
         
@@ -337,7 +499,12 @@ class TaskDesktopWidget:
         """
         if not self.is_visible:
             self.is_visible = True
+            if self.idle.set_visible(True):
+                self.wake_event.set()
             self.root.attributes('-alpha', self.visible_alpha)
+            # Ausgelassenes Rendern mit dem neuesten Stand nachholen
+            if self.idle.take_deferred_render() and self.current_tasks is not None:
+                self.root.after(0, lambda: self.render_tasks(self.current_tasks))
             
             # Alten Hide-Timer stoppen falls vorhanden
             if self.hide_timer:
@@ -353,6 +520,7 @@ class TaskDesktopWidget:
         # Doppelt prüfen ob Maus wirklich nicht mehr über Widget ist
         if not self.mouse_over_widget:
             self.is_visible = False
+            self.idle.set_visible(False)
             self.root.attributes('-alpha', 0.0)
             self.hide_timer = None
         # Wenn Maus noch über Widget ist, nicht verstecken - Timer wird durch mouse_leave neu gesetzt
@@ -363,6 +531,7 @@ class TaskDesktopWidget:
         """
         # Widget ausblenden
         self.is_visible = False
+        self.idle.set_visible(False)
         self.root.attributes('-alpha', 0.0)
         
         # Timer stoppen falls aktiv
@@ -376,67 +545,34 @@ class TaskDesktopWidget:
     # --------------------------
     # Datenbank-Funktionen (vereinfacht)
     # --------------------------
-    def init_database(self):
-        """
-        Erstellt die SQLite-Datenbank und die Tasks-Tabelle, falls sie nicht existiert.
-        """
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                task_id INTEGER PRIMARY KEY,
-                task_name TEXT NOT NULL,
-                first_seen DATE NOT NULL,
-                last_changed DATE NOT NULL
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-
-    def get_db_tasks(self):
-        """
-        Ruft alle Tasks aus der Datenbank ab.
-        """
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT task_id, task_name, first_seen, last_changed FROM tasks')
-        rows = cursor.fetchall()
-        
-        conn.close()
-        
-        db_tasks = {}
-        for row in rows:
-            task_id, name, first_seen, last_changed = row
-            db_tasks[task_id] = {
-                'name': name,
-                'first_seen': first_seen,
-                'last_changed': last_changed
-            }
-        
-        return db_tasks
-
-    def get_projects(self):
+    def get_projects(self, priority=PRIORITY_BACKGROUND):
         """
         Ruft alle Projekte ab.
         """
         url = "https://api.todoist.com/rest/v2/projects"
         try:
-            response = requests.get(url, headers=HEADERS)
+            with phase('fetch'):
+                response = api_get(url, default_headers(), priority=priority, db_path=DB_PATH)
+            if response is None:
+                return []
             if response.status_code == 200:
-                return response.json()
+                count('bytes_transferred', len(response.content))
+                with phase('parse'):
+                    return response.json()
             else:
                 return []
         except Exception as e:
             return []
 
-    def get_inbox_project_id(self):
+    def get_inbox_project_id(self, priority=PRIORITY_BACKGROUND):
         """
         Findet die Projekt-ID des Posteingangs.
         """
-        projects = self.get_projects()
+        projects = self.get_projects(priority)
+        
+        # Projektnamen für die Spalte 'project' (ändert nur bei Bedarf die Layout-Version)
+        if self.layout:
+            self.layout.set_project_names({project['id']: project.get('name', '') for project in projects})
         
         for project in projects:
             if project.get('is_inbox_project', False):
@@ -447,212 +583,335 @@ class TaskDesktopWidget:
         
         return None
 
-    def insert_new_task(self, task_id, task_name):
-        """
-        Fügt einen neuen Task in die Datenbank ein.
-        """
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        today = date.today().isoformat()
-        
-        cursor.execute('''
-            INSERT INTO tasks (task_id, task_name, first_seen, last_changed)
-            VALUES (?, ?, ?, ?)
-        ''', (task_id, task_name, today, today))
-        
-        conn.commit()
-        conn.close()
-
-    def update_task_name(self, task_id, new_name):
+    def load_db_tasks(self):
         """
-        Aktualisiert den Namen eines Tasks und setzt last_changed auf heute.
+        Aktueller Stand der Tasks inkl. noch nicht geschriebener bzw. gerade
+        geschriebener Änderungen (siehe WriteBehindQueue.load).
         """
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        today = date.today().isoformat()
-        
-        cursor.execute('''
-            UPDATE tasks 
-            SET task_name = ?, last_changed = ?
-            WHERE task_id = ?
-        ''', (new_name, today, task_id))
-        
-        conn.commit()
-        conn.close()
+        return self.write_queue.load(self.read_db_tasks)
 
-    def delete_task(self, task_id):
+    def read_db_tasks(self):
         """
-        Entfernt einen Task aus der Datenbank.
+        Liest aus dem gemappten Snapshot, solange er dem zuletzt geschriebenen Stand
+        entspricht und niemand sonst die Datenbank geändert hat, sonst aus der Speicher-Engine.
         """
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
-        
-        conn.commit()
-        conn.close()
+        snapshot = self.snapshots.current() if self.snapshots else None
+        if (snapshot is not None and snapshot.generation == self.store.snapshot_generation
+                and snapshot.data_version == self.store.data_version()):
+            return TaskMapping(snapshot)
+        return self.store.load_tasks()
 
-    def sync_tasks_to_database(self, todoist_tasks):
+    def sync_tasks_to_database(self, todoist_tasks, priority=PRIORITY_BACKGROUND):
         """
         Synchronisiert Todoist-Tasks mit der lokalen Datenbank.
+        Verschwundene Tasks werden vorher als erledigt, verschoben oder gelöscht klassifiziert.
         """
-        # Bestehende Tasks aus DB abrufen
-        db_tasks = self.get_db_tasks()
-        
-        # Set der aktuellen Todoist Task-IDs
-        current_task_ids = set()
-        
-        # Durch alle Todoist-Tasks gehen
-        for task in todoist_tasks:
-            task_id = int(task.get('id'))  # Sicherstellen, dass task_id ein Integer ist
-            task_name = task.get('content', 'Unbekannt')
-            current_task_ids.add(task_id)
+        with phase('diff'):
+            # Bestehende Tasks aus DB abrufen (inkl. noch nicht geschriebener Änderungen)
+            db_tasks = self.load_db_tasks()
             
-            if task_id not in db_tasks:
-                # Neuer Task
-                self.insert_new_task(task_id, task_name)
-            else:
-                # Existierender Task - prüfen ob Name geändert
-                if db_tasks[task_id]['name'] != task_name:
-                    self.update_task_name(task_id, task_name)
-                # Wenn Name gleich ist, nichts tun
-        
-        # Tasks aus DB entfernen, die nicht mehr in Todoist existieren
-        db_task_ids = set(db_tasks.keys())
-        deleted_task_ids = db_task_ids - current_task_ids
-        
-        for task_id in deleted_task_ids:
-            self.delete_task(task_id)
+            # Set der aktuellen Todoist Task-IDs
+            current_task_ids = set()
+            new_tasks = []
+            renamed_tasks = []
             
-    def get_inbox_todos(self):
-        """
-        Ruft alle aktiven Todos aus dem Posteingang ab.
-        """
-        inbox_id = self.get_inbox_project_id()
+            # Durch alle Todoist-Tasks gehen
+            for task_id, task_name, *_ in todoist_tasks:
+                current_task_ids.add(task_id)
+                
+                if task_id not in db_tasks:
+                    # Neuer Task
+                    new_tasks.append((task_id, task_name))
+                elif db_tasks[task_id]['name'] != task_name:
+                    # Existierender Task mit geändertem Namen
+                    renamed_tasks.append((task_id, task_name))
+            
+            # Tasks aus DB entfernen, die nicht mehr in Todoist existieren
+            deleted_task_ids = set(db_tasks.keys()) - current_task_ids
         
-        if not inbox_id:
-            return []
+        # Nur geänderte und entfernte Tasks müssen neu formatiert werden
+        self.row_cache.invalidate(task_id for task_id, _ in renamed_tasks)
+        self.row_cache.invalidate(deleted_task_ids)
         
-        url = f"https://api.todoist.com/rest/v2/tasks"
-        params = {'project_id': inbox_id}
+        outcomes = classify_disappeared_tasks(deleted_task_ids, disappeared_since(deleted_task_ids, db_tasks),
+                                              priority=priority, db_path=DB_PATH)
         
-        try:
-            response = requests.get(url, headers=HEADERS, params=params)
-            if response.status_code != 200:
-                return []
-            
-            return response.json()
+        # Nur einreihen - geschrieben wird im Hintergrund-Thread der Write-Behind-Queue
+        with phase('write'):
+            for task_id, task_name in new_tasks:
+                self.write_queue.add(task_id, task_name)
+            for task_id, task_name in renamed_tasks:
+                self.write_queue.rename(task_id, task_name)
+            for task_id in deleted_task_ids:
+                self.write_queue.delete(task_id, outcomes.get(task_id))
+            self.write_queue.request_snapshot()
+        
+        count('tasks_added', len(new_tasks))
+        count('tasks_renamed', len(renamed_tasks))
+        count('tasks_deleted', len(deleted_task_ids))
             
-        except Exception as e:
-            return []
+    def get_inbox_todos(self, priority=PRIORITY_BACKGROUND):
         """
-        Ruft alle aktiven Todos aus dem Posteingang ab.
+        Ruft alle aktiven Todos aus dem Posteingang ab - gestreamt und direkt als
+        kompakte (task_id, content)-Tupel, damit große Antworten nicht komplett im Speicher landen.
+        Gibt None zurück, wenn die API nicht erreichbar war oder das Rate-Limit greift.
         """
-        inbox_id = self.get_inbox_project_id()
+        inbox_id = self.get_inbox_project_id(priority)
         
         if not inbox_id:
-            return []
+            return None
+        self.inbox_project_id = inbox_id
         
         url = f"https://api.todoist.com/rest/v2/tasks"
         params = {'project_id': inbox_id}
         
         try:
-            response = requests.get(url, headers=HEADERS, params=params)
-            if response.status_code != 200:
-                return []
-            
-            return response.json()
+            with phase('fetch'):
+                response = api_get(url, default_headers(), params=params, priority=priority, db_path=DB_PATH, stream=True)
+            if response is None:
+                return None
+            try:
+                if response.status_code != 200:
+                    return None
+                with phase('parse'):
+                    return list(iter_task_records(response, self.layout.fields))
+            finally:
+                response.close()
             
         except Exception as e:
-            return []
+            return None
             
-    def sync_and_display_tasks(self):
+    def sync_and_display_tasks(self, priority=PRIORITY_BACKGROUND):
         """
         Synchronisiert Tasks und aktualisiert die Anzeige.
+        Interaktive Aktualisierungen haben beim Rate-Limit Vorrang vor Hintergrund-Polls.
+        Jeder Aufruf wird als Sync-Zyklus mit Zeitmessung je Phase erfasst.
         """
+        cycle = self.metrics.start("desktop_widget")
+        error = None
         try:
             # Status aktualisieren
             self.update_status("Synchronisiere...")
             
-            # Datenbank initialisieren
-            self.init_database()
-            
             # Tasks laden
-            todoist_tasks = self.get_inbox_todos()
+            todoist_tasks = self.get_inbox_todos(priority)
+            if todoist_tasks is not None:
+                # Noch nicht gesendete Schnellaktionen nicht durch den API-Stand zurücksetzen
+                todoist_tasks = self.commands.overlay_records(todoist_tasks)
+                self.current_tasks = todoist_tasks
+            
+            if todoist_tasks is None:
+                # Bisherige Anzeige behalten statt einen leeren Posteingang zu zeigen
+                self.update_status(f"API nicht verfügbar (Rate-Limit?) - {clock.now().strftime('%H:%M:%S')}")
+                return
             
             if not todoist_tasks:
                 self.update_status("Keine Tasks gefunden")
-                self.display_tasks([])
+                with phase('render'):
+                    self.render_tasks([])
                 return
             
             # WICHTIG: Tasks mit Datenbank synchronisieren
-            self.sync_tasks_to_database(todoist_tasks)
-            
-            # Aktualisierte DB-Daten laden
-            db_tasks = self.get_db_tasks()
+            self.sync_tasks_to_database(todoist_tasks, priority)
             
-            # Tasks für Anzeige vorbereiten
-            display_tasks = []
-            
-            for i, task in enumerate(todoist_tasks, 1):
-                task_id_raw = task.get('id')
-                task_id = int(task_id_raw) if task_id_raw else 0
-                content = task.get('content', 'Unbekannte Aufgabe')
-                
-                # Datum ermitteln - sollte jetzt immer existieren
-                display_date = "Unbekannt"
-                if task_id in db_tasks:
-                    first_seen = db_tasks[task_id]['first_seen']
-                    last_changed = db_tasks[task_id]['last_changed']
-                    
-                    relevant_date = last_changed if first_seen != last_changed else first_seen
-                    
-                    try:
-                        date_obj = datetime.strptime(relevant_date, '%Y-%m-%d')
-                        display_date = date_obj.strftime('%d.%m.%Y')
-                    except:
-                        display_date = relevant_date
-                else:
-                    # Das sollte jetzt nie passieren, da wir synchronisiert haben
-                    display_date = "FEHLER"
-                
-                display_tasks.append({
-                    'number': i,
-                    'date': display_date,
-                    'content': content
-                })
+            if SHOW_DUPLICATES:
+                self.update_duplicate_ids(todoist_tasks)
             
-            # Anzeige aktualisieren
-            self.display_tasks(display_tasks)
-            self.update_status(f"Letztes Update: {datetime.now().strftime('%H:%M:%S')} ({len(display_tasks)} Tasks)")
+            with phase('render'):
+                self.render_tasks(todoist_tasks)
+            self.update_status(
+                f"Letztes Update: {clock.now().strftime('%H:%M:%S')} "
+                f"({len(todoist_tasks)} Tasks, {(time.perf_counter() - cycle.start_time) * 1000:.0f} ms)"
+            )
             
         except Exception as e:
+            error = e
+            print(f"Fehler beim Sync: {e}")
             self.update_status(f"Fehler: {str(e)}")
+        finally:
+            self.metrics.finish(cycle, error)
             
-    def display_tasks(self, tasks):
+    def apply_webhook_event(self, event_name, event_data):
+        """
+        Übernimmt ein Webhook-Ereignis ohne API-Aufruf: Diff gegen den aktuellen Stand
+        einreihen und die angezeigte Liste direkt anpassen.
+        """
+        from webhook_receiver import webhook_diff
+
+        if self.shutdown_flag:
+            return
+        if self.inbox_project_id is None or self.current_tasks is None:
+            # Noch kein erster Sync - stattdessen vollständig laden
+            self.sync_and_display_tasks(PRIORITY_INTERACTIVE)
+            return
+
+        cycle = self.metrics.start("webhook")
+        error = None
+        try:
+            with phase('diff'):
+                db_names = {task_id: data['name']
+                            for task_id, data in self.load_db_tasks().items()}
+                new_tasks, renamed_tasks, deleted_task_ids, outcomes = webhook_diff(
+                    event_name, event_data, self.inbox_project_id, db_names
+                )
+
+            with phase('write'):
+                for task_id, task_name in new_tasks:
+                    self.write_queue.add(task_id, task_name)
+                for task_id, task_name in renamed_tasks:
+                    self.write_queue.rename(task_id, task_name)
+                for task_id in deleted_task_ids:
+                    self.write_queue.delete(task_id, outcomes.get(task_id))
+                if new_tasks or renamed_tasks or deleted_task_ids:
+                    self.write_queue.request_snapshot()
+            self.row_cache.invalidate(task_id for task_id, _ in renamed_tasks)
+            self.row_cache.invalidate(deleted_task_ids)
+            count('tasks_added', len(new_tasks))
+            count('tasks_renamed', len(renamed_tasks))
+            count('tasks_deleted', len(deleted_task_ids))
+
+            # Angezeigte Liste: entfernte Tasks raus, Tasks im Posteingang ersetzen oder anhängen
+            # (auch ohne Namensänderung, z.B. bei geänderter Priorität)
+            record = task_record(event_data, self.layout.fields)
+            tasks = [task for task in self.current_tasks if task[0] not in deleted_task_ids]
+            in_inbox = str(event_data.get('project_id')) == str(self.inbox_project_id)
+            if in_inbox and not event_data.get('checked') and (event_name == 'item:updated' or new_tasks):
+                positions = {task[0]: i for i, task in enumerate(tasks)}
+                if record[0] in positions:
+                    tasks[positions[record[0]]] = record
+                else:
+                    tasks.append(record)
+            self.current_tasks = tasks
+
+            with phase('render'):
+                self.render_tasks(tasks)
+            self.update_status(f"Webhook {event_name}: {clock.now().strftime('%H:%M:%S')} ({len(tasks)} Tasks)")
+        except Exception as e:
+            error = e
+            print(f"Fehler beim Übernehmen des Webhooks: {e}")
+        finally:
+            self.metrics.finish(cycle, error)
+
+    def start_duplicate_backfill(self):
+        """
+        Trägt Tasks, die schon vor dem Einschalten von SHOW_DUPLICATES in der Datenbank
+        standen, im Hintergrund in den Duplikat-Index nach. Neue und geänderte Tasks
+        führt apply_diff ohnehin nach.
+        """
+        from duplicates import backfill_duplicate_index
+
+        def backfill():
+            try:
+                indexed = backfill_duplicate_index(DB_PATH)
+                if indexed:
+                    print(f"Duplikat-Index: {indexed} Tasks nachgetragen")
+            except Exception as e:
+                print(f"Warnung: Duplikat-Index konnte nicht nachgetragen werden: {e}")
+
+        threading.Thread(target=backfill, name="duplicate-backfill", daemon=True).start()
+
+    def update_duplicate_ids(self, todoist_tasks):
+        """
+        Ermittelt, welche angezeigten Tasks ein fast gleiches Gegenstück haben.
+        """
+        from duplicates import duplicate_task_ids
+        
+        try:
+            self.duplicate_ids = duplicate_task_ids(DB_PATH, [task[0] for task in todoist_tasks])
+        except Exception as e:
+            print(f"Warnung: Duplikatsuche fehlgeschlagen: {e}")
+            self.duplicate_ids = set()
+
+    # --------------------------
+    # Schnellaktionen
+    # --------------------------
+    def show_quick_actions(self, event):
+        """
+        Zeigt das Kontextmenü für den Task unter dem Mauszeiger.
+        """
+        line = int(self.task_text.index(f"@{event.x},{event.y}").split('.')[0])
+        if not self.current_tasks or line > len(self.current_tasks):
+            return
+        task = self.current_tasks[line - 1]
+        today = clock.today()
+
+        menu = tk.Menu(self.root, tearoff=0)
+        menu.add_command(label="Erledigt", command=lambda: self.quick_complete(task))
+        menu.add_command(label="Umbenennen...", command=lambda: self.quick_rename(task))
+        menu.add_separator()
+        menu.add_command(label="Heute", command=lambda: self.quick_reschedule(task, today))
+        menu.add_command(label="Morgen", command=lambda: self.quick_reschedule(task, today + timedelta(days=1)))
+        menu.add_command(label="Nächste Woche",
+                         command=lambda: self.quick_reschedule(task, today + timedelta(days=7 - today.weekday())))
+        try:
+            menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            menu.grab_release()
+
+    def quick_complete(self, task):
+        """
+        Erledigt einen Task: sofort aus Anzeige und DB, der API-Befehl folgt gebündelt.
+        """
+        task_id = task[0]
+        self.commands.complete(task_id)
+        self.write_queue.delete(task_id, ('completed', self.inbox_project_id, clock.today().isoformat()))
+        self.row_cache.invalidate([task_id])
+        self.current_tasks = [t for t in self.current_tasks if t[0] != task_id]
+        self.render_tasks(self.current_tasks)
+        self.update_status(f"Erledigt: {task[1]}")
+
+    def quick_rename(self, task):
+        new_name = simpledialog.askstring("Umbenennen", "Neuer Name:", initialvalue=task[1], parent=self.root)
+        if not new_name or not new_name.strip() or new_name.strip() == task[1]:
+            return
+        new_name = new_name.strip()
+        task_id = task[0]
+
+        self.commands.rename(task_id, new_name)
+        self.write_queue.rename(task_id, new_name)
+        self.row_cache.invalidate([task_id])
+        self.current_tasks = [(task_id, new_name) + tuple(t[2:]) if t[0] == task_id else t
+                              for t in self.current_tasks]
+        self.render_tasks(self.current_tasks)
+        self.update_status(f"Umbenannt: {new_name}")
+
+    def quick_reschedule(self, task, due_date):
+        # Das Fälligkeitsdatum wird nicht angezeigt - nur der API-Befehl wird eingereiht
+        self.commands.reschedule(task[0], due_date)
+        self.update_status(f"Verschoben auf {due_date.strftime(DATE_FORMAT)}: {task[1]}")
+
+    def render_tasks(self, todoist_tasks):
+        """
+        Bereitet die Tasks mit ihren Historie-Daten für die Anzeige auf und zeigt sie an.
+        Unveränderte Tasks kommen aus dem Render-Cache; die Datenbank wird nur gelesen,
+        wenn mindestens ein Task neu formatiert werden muss.
+        Ist das Widget ausgeblendet, wird erst beim Einblenden gerendert (show_widget).
         """
-        Zeigt die Tasks im Text-Widget an.
+        if not self.idle.should_render():
+            return
+        
+        # Aktualisierte DB-Daten (noch nicht geschriebene Änderungen eingeschlossen) nur bei Bedarf laden
+        lines = format_task_lines(todoist_tasks, self.row_cache,
+                                  self.load_db_tasks,
+                                  self.duplicate_ids, DUPLICATE_MARKER)
+        self.display_tasks(lines)
+        
+    def display_tasks(self, lines):
         """
+        Zeigt die fertig formatierten Zeilen im Text-Widget an.
+        Ist der Text unverändert, bleibt das Widget unangetastet.
+        """
+        text = "".join(lines) if lines else "Keine Tasks im Posteingang."
+        if text == self.rendered_text:
+            return
+        self.rendered_text = text
+        
         # Fenstergröße an Anzahl Tasks anpassen
-        self.position_window(len(tasks))
+        self.position_window(len(lines))
         
         self.task_text.config(state=tk.NORMAL)
         self.task_text.delete(1.0, tk.END)
-        
-        if not tasks:
-            self.task_text.insert(tk.END, "Keine Tasks im Posteingang.")
-        else:
-            for task in tasks:
-                # Text auf 30 Zeichen begrenzen
-                content = task['content']
-                if len(content) > 30:
-                    content = content[:30].strip()
-                
-                line = f"{task['number']:2d}. {task['date']} - {content}\n"
-                self.task_text.insert(tk.END, line)
-        
+        self.task_text.insert(tk.END, text)
         self.task_text.config(state=tk.DISABLED)
         
     def update_status(self, message):
@@ -666,14 +925,24 @@ class TaskDesktopWidget:
         Startet den Background-Thread für automatische Updates.
         """
         def update_worker():
-            # Sofortiges erstes Update
-            self.root.after(0, self.sync_and_display_tasks)
+            # Sofortiges erstes Update (interaktiv, da der Benutzer gerade startet)
+            self.root.after(0, lambda: self.sync_and_display_tasks(PRIORITY_INTERACTIVE))
+            last_sync = time.monotonic()
             
             while not self.shutdown_flag:
                 try:
-                    time.sleep(UPDATE_INTERVAL)
+                    # Erst zurücksetzen, dann den Zustand lesen - ein Wechsel danach weckt das nächste wait()
+                    self.wake_event.clear()
+                    # Mit Webhooks kommen Änderungen sofort - der Poll prüft nur noch die Konsistenz
+                    base = WEBHOOK_POLL_INTERVAL if self.webhook else UPDATE_INTERVAL
+                    # Im Leerlauf gestreckt, in der Pause None: warten bis der Zustand wechselt
+                    delay = self.idle.next_sync_delay(last_sync, base)
+                    if delay is None or delay > 0:
+                        self.wake_event.wait(delay)
+                        continue
                     if not self.shutdown_flag:  # Doppelt prüfen
                         self.root.after(0, self.sync_and_display_tasks)
+                        last_sync = time.monotonic()
                 except:
                     break
         
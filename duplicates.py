@@ -0,0 +1,258 @@
+import random
+import re
+import struct
+import zlib
+
+# --------------------------
+# Konfiguration
+# --------------------------
+NUM_PERM = 48  # Länge der MinHash-Signatur
+BANDS = 16  # LSH: Signatur in BANDS Bänder zu je ROWS Werten
+ROWS = NUM_PERM // BANDS
+SIMILARITY_THRESHOLD = 0.5  # Jaccard-Ähnlichkeit der Trigramme, ab der zwei Tasks als Duplikat gelten
+NEIGHBOURS = 4  # Vergleiche pro Task innerhalb eines LSH-Buckets (statt aller Paare)
+SEED = 1  # Fest, da die Signaturen in der Datenbank gespeichert werden
+
+PRIME = 2147483647  # 2^31 - 1
+_rng = random.Random(SEED)
+PERMUTATIONS = [(_rng.randrange(1, PRIME), _rng.randrange(0, PRIME)) for _ in range(NUM_PERM)]
+SIGNATURE_FORMAT = f"<{NUM_PERM}I"
+
+# --------------------------
+# Schema
+# --------------------------
+def init_duplicate_schema(cursor):
+    """
+    Erstellt den LSH-Index für die Duplikatsuche:
+    task_minhash hält die Signatur je Task, task_lsh die Buckets je Band.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS task_minhash (
+            task_id INTEGER PRIMARY KEY,
+            signature BLOB NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS task_lsh (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            task_id INTEGER NOT NULL,
+            PRIMARY KEY (band, bucket, task_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_lsh_task ON task_lsh (task_id)')
+
+# --------------------------
+# Signaturen
+# --------------------------
+def normalize(name):
+    """
+    Kleinbuchstaben, Satzzeichen entfernt, Leerraum vereinheitlicht.
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", name.lower()).split())
+
+def trigrams(name):
+    text = f" {normalize(name)} "
+    if len(text) < 3:
+        return {text}
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+_shingle_hashes = {}
+
+def shingle_hashes(shingle):
+    """
+    Die NUM_PERM permutierten Hashwerte eines Trigramms. Es gibt nur wenige tausend
+    verschiedene Trigramme, daher wird jedes nur einmal berechnet.
+    """
+    values = _shingle_hashes.get(shingle)
+    if values is None:
+        h = zlib.crc32(shingle.encode("utf-8"))
+        values = _shingle_hashes[shingle] = tuple((a * h + b) % PRIME for a, b in PERMUTATIONS)
+    return values
+
+def minhash(name):
+    """
+    MinHash-Signatur (Tupel mit NUM_PERM Werten) über die Trigramme des Namens.
+    """
+    return tuple(map(min, zip(*(shingle_hashes(shingle) for shingle in trigrams(name)))))
+
+def band_buckets(signature):
+    """
+    (Band, Bucket) je Band - Tasks im selben Bucket sind Kandidaten.
+    """
+    return [(band, zlib.crc32(struct.pack(f"<{ROWS}I", *signature[band * ROWS:(band + 1) * ROWS])))
+            for band in range(BANDS)]
+
+# --------------------------
+# Index pflegen
+# --------------------------
+def update_duplicate_index(cursor, changed_tasks, deleted_task_ids):
+    """
+    Aktualisiert den Index inkrementell: changed_tasks als (task_id, name) für neue
+    und umbenannte Tasks, deleted_task_ids für entfernte. Läuft in der Transaktion des Syncs.
+    """
+    changed_tasks = list(changed_tasks)
+    removed = [(task_id,) for task_id in deleted_task_ids] + [(task_id,) for task_id, _ in changed_tasks]
+    cursor.executemany('DELETE FROM task_lsh WHERE task_id = ?', removed)
+    cursor.executemany('DELETE FROM task_minhash WHERE task_id = ?', removed)
+
+    signatures = []
+    buckets = []
+    for task_id, name in changed_tasks:
+        signature = minhash(name)
+        signatures.append((task_id, struct.pack(SIGNATURE_FORMAT, *signature)))
+        buckets.extend((band, bucket, task_id) for band, bucket in band_buckets(signature))
+    cursor.executemany('INSERT OR REPLACE INTO task_minhash (task_id, signature) VALUES (?, ?)', signatures)
+    cursor.executemany('INSERT OR IGNORE INTO task_lsh (band, bucket, task_id) VALUES (?, ?, ?)', buckets)
+
+def refresh_duplicate_index(cursor, batch_size=5000, limit=None):
+    """
+    Nimmt Tasks auf, die noch nicht im Index stehen (z.B. aus der Zeit vor dem Index),
+    und entfernt Einträge verschwundener Tasks. Mit limit höchstens so viele auf einmal.
+    Gibt die Anzahl neu indizierter Tasks zurück.
+    """
+    cursor.execute('''
+        DELETE FROM task_lsh WHERE task_id NOT IN (SELECT task_id FROM task_state)
+    ''')
+    cursor.execute('''
+        DELETE FROM task_minhash WHERE task_id NOT IN (SELECT task_id FROM task_state)
+    ''')
+    missing = cursor.execute('''
+        SELECT t.task_id, t.task_name FROM task_state t
+        LEFT JOIN task_minhash m ON m.task_id = t.task_id
+        WHERE m.task_id IS NULL
+        LIMIT ?
+    ''', (-1 if limit is None else limit,)).fetchall()
+    for start in range(0, len(missing), batch_size):
+        update_duplicate_index(cursor, missing[start:start + batch_size], [])
+    return len(missing)
+
+def backfill_duplicate_index(db_path, batch_size=1000):
+    """
+    refresh_duplicate_index mit eigener Verbindung und einer Transaktion je batch_size Tasks,
+    damit andere Schreiber (z.B. die Write-Behind-Queue des Widgets) zwischendurch zum Zug kommen.
+    Gibt die Anzahl neu indizierter Tasks zurück.
+    """
+    import sqlite3
+
+    total = 0
+    conn = sqlite3.connect(db_path)
+    try:
+        while True:
+            with conn:
+                indexed = refresh_duplicate_index(conn.cursor(), batch_size, limit=batch_size)
+            total += indexed
+            if indexed < batch_size:
+                return total
+    finally:
+        conn.close()
+
+# --------------------------
+# Cluster finden
+# --------------------------
+def find_duplicate_clusters(conn, threshold=SIMILARITY_THRESHOLD, task_ids=None):
+    """
+    Findet Gruppen ähnlicher Tasks über die LSH-Buckets, ohne alle Paare zu vergleichen:
+    Innerhalb eines Buckets wird jeder Task nur mit seinen NEIGHBOURS Vorgängern
+    (nach Namen sortiert) verglichen.
+    Mit task_ids werden nur Buckets betrachtet, in denen einer dieser Tasks liegt.
+    Gibt eine Liste von Clustern zurück, je Cluster [(task_id, name, Ähnlichkeit zum Vertreter)].
+    """
+    if task_ids is not None:
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS duplicate_filter (task_id INTEGER PRIMARY KEY)')
+        conn.execute('DELETE FROM duplicate_filter')
+        conn.executemany('INSERT OR IGNORE INTO duplicate_filter VALUES (?)', [(task_id,) for task_id in task_ids])
+        bucket_filter = '''WHERE (band, bucket) IN (SELECT l.band, l.bucket FROM task_lsh l
+                                                     JOIN duplicate_filter f ON f.task_id = l.task_id)'''
+    else:
+        bucket_filter = ''
+    rows = conn.execute(f'''
+        SELECT GROUP_CONCAT(task_id) FROM task_lsh {bucket_filter}
+        GROUP BY band, bucket HAVING COUNT(*) > 1
+    ''').fetchall()
+
+    groups = [[int(task_id) for task_id in row[0].split(",")] for row in rows]
+    involved = {task_id for group in groups for task_id in group}
+    if not involved:
+        return []
+    names = {}
+    involved = list(involved)
+    for start in range(0, len(involved), 500):
+        chunk = involved[start:start + 500]
+        names.update(conn.execute(
+            f'SELECT task_id, task_name FROM task_state WHERE task_id IN ({",".join("?" * len(chunk))})', chunk
+        ))
+    # Gleich lautende Tasks (nach normalize) werden über einen Vertreter verglichen,
+    # damit große Gruppen identischer Namen nicht viele Vergleiche kosten
+    twins = {}
+    representative = {}
+    for task_id in sorted(names):
+        key = normalize(names[task_id])
+        first = representative.setdefault(key, task_id)
+        if first != task_id:
+            twins.setdefault(first, []).append(task_id)
+    rep_of = {task_id: representative[normalize(name)] for task_id, name in names.items()}
+    shingles = {task_id: trigrams(names[task_id]) for task_id in set(rep_of.values())}
+
+    edges = {}  # Vertreter -> {ähnlicher Vertreter: Ähnlichkeit}
+    checked = set()
+    for group in groups:
+        members = sorted({rep_of[task_id] for task_id in group if task_id in rep_of},
+                         key=lambda task_id: names[task_id])
+        for i, task_id in enumerate(members):
+            for other in members[max(0, i - NEIGHBOURS):i]:
+                pair = (other, task_id) if other < task_id else (task_id, other)
+                if pair in checked:
+                    continue
+                checked.add(pair)
+                similarity = jaccard(shingles[other], shingles[task_id])
+                if similarity >= threshold:
+                    edges.setdefault(task_id, {})[other] = similarity
+                    edges.setdefault(other, {})[task_id] = similarity
+
+    # Jeder Cluster hat einen Vertreter, dem alle Mitglieder ähnlich sind - so entstehen
+    # keine Ketten A ~ B ~ C, in denen A und C nichts gemeinsam haben
+    assigned = set()
+    result = []
+    for leader in sorted(edges, key=lambda task_id: (-len(edges[task_id]), names[task_id])):
+        if leader in assigned:
+            continue
+        members = [task_id for task_id in edges[leader] if task_id not in assigned]
+        if not members:
+            continue
+        assigned.add(leader)
+        assigned.update(members)
+        cluster = [(leader, 1.0)] + sorted(((task_id, round(edges[leader][task_id], 2)) for task_id in members),
+                                           key=lambda member: (-member[1], names[member[0]]))
+        result.append(cluster)
+    # Nur gleich lautende Tasks ohne weitere Ähnliche
+    result.extend([(task_id, 1.0)] for task_id in twins if task_id not in assigned)
+
+    clusters = []
+    for cluster in result:
+        expanded = []
+        for task_id, similarity in cluster:
+            expanded.append((task_id, names[task_id], similarity))
+            expanded.extend((twin, names[twin], similarity) for twin in twins.get(task_id, ()))
+        clusters.append(expanded)
+    clusters.sort(key=lambda cluster: (-len(cluster), cluster[0][1]))
+    return clusters
+
+def duplicate_task_ids(db_path, task_ids, threshold=SIMILARITY_THRESHOLD):
+    """
+    IDs der angegebenen Tasks, die zu einem Duplikat-Cluster gehören (für die Markierung im Widget).
+    """
+    import sqlite3
+
+    task_ids = set(task_ids)
+    conn = sqlite3.connect(db_path)
+    try:
+        clusters = find_duplicate_clusters(conn, threshold, task_ids)
+    finally:
+        conn.close()
+    return {task_id for cluster in clusters for task_id, _, _ in cluster if task_id in task_ids}
@@ -1,47 +1,82 @@
 import sqlite3
-from datetime import datetime
+
+from task_snapshot import open_snapshot, snapshot_path_for, local_time
 
 DB_PATH = "tasks_history.db"
 
-def find_changed_task():
+def snapshot_changes(snapshot, text):
+    """
+    Tasks mit text im Namen und alle geänderten Tasks aus dem Snapshot,
+    jeweils als (task_id, name, first_seen, last_changed) mit Zeitstempeln.
+    """
+    matches = []
+    for task_id, name in snapshot.find(text):
+        task = snapshot[task_id]
+        matches.append((task_id, name, task['first_seen'], task['last_changed']))
+    return matches, snapshot.changed()
+
+def database_changes(conn, text):
+    """
+    Wie snapshot_changes, aber direkt aus task_state - mit denselben Regeln:
+    Suche ohne Beachtung der Schreibweise, geändert heißt an einem anderen Tag (Ortszeit).
+    """
+    cursor = conn.cursor()
+    matches = []
+    if text:
+        cursor.execute('''
+            SELECT task_id, task_name, first_seen_at, last_changed_at FROM task_state
+            WHERE instr(lower(task_name), lower(?)) > 0
+            ORDER BY task_id
+        ''', (text,))
+        matches = cursor.fetchall()
+    cursor.execute('''
+        SELECT task_id, task_name, first_seen_at, last_changed_at FROM task_state
+        WHERE date(first_seen_at, 'unixepoch', 'localtime') != date(last_changed_at, 'unixepoch', 'localtime')
+        ORDER BY task_id
+    ''')
+    return matches, cursor.fetchall()
+
+def find_changed_task(db_path=DB_PATH):
     """
     Sucht nach dem geänderten Aldi Gutschein Task.
     """
     print("SUCHE NACH GEÄNDERTEM TASK")
     print("=" * 40)
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Suche nach Tasks mit "Aldi" im Namen
-    cursor.execute("SELECT task_id, task_name, first_seen, last_changed FROM tasks WHERE task_name LIKE '%Aldi%'")
-    aldi_tasks = cursor.fetchall()
-    
+
+    # Vom Sync veröffentlichter Snapshot, solange er zur Datenbank passt, sonst direkt aus der Datenbank
+    snapshot = open_snapshot(snapshot_path_for(db_path), db_path)
+    if snapshot is not None:
+        with snapshot:
+            print(f"Quelle: {snapshot}")
+            aldi_tasks, changed_tasks = snapshot_changes(snapshot, "Aldi")
+    else:
+        conn = sqlite3.connect(db_path)
+        try:
+            aldi_tasks, changed_tasks = database_changes(conn, "Aldi")
+        finally:
+            conn.close()
+    changed_ids = {task[0] for task in changed_tasks}
+
     print("Tasks mit 'Aldi' im Namen:")
     for task in aldi_tasks:
         task_id, name, first_seen, last_changed = task
         print(f"  ID: {task_id}")
         print(f"  Name: {name}")
-        print(f"  Erstellt: {first_seen}")
-        print(f"  Geändert: {last_changed}")
-        if first_seen != last_changed:
+        print(f"  Erstellt: {local_time(first_seen)}")
+        print(f"  Geändert: {local_time(last_changed)}")
+        if task_id in changed_ids:
             print(f"  >>> TASK WURDE GEÄNDERT! <<<")
         print("  ---")
-    
-    # Alle Tasks wo first_seen != last_changed
+
+    # Alle Tasks, die an einem späteren Tag geändert wurden
     print("\nAlle geänderten Tasks:")
-    cursor.execute("SELECT task_id, task_name, first_seen, last_changed FROM tasks WHERE first_seen != last_changed")
-    changed_tasks = cursor.fetchall()
-    
     if changed_tasks:
         for task in changed_tasks:
             task_id, name, first_seen, last_changed = task
             print(f"  ID: {task_id} - {name}")
-            print(f"    Erstellt: {first_seen}, Geändert: {last_changed}")
+            print(f"    Erstellt: {local_time(first_seen)}, Geändert: {local_time(last_changed)}")
     else:
         print("  Keine geänderten Tasks gefunden.")
-    
-    conn.close()
 
 if __name__ == "__main__":
     find_changed_task()
@@ -0,0 +1,278 @@
+import argparse
+import gzip
+import json
+import socket
+import sqlite3
+import sys
+from datetime import datetime
+
+from inbox_history import init_database
+from inbox_snapshots import DAY
+
+# --------------------------
+# Konfiguration
+# --------------------------
+DB_PATH = "tasks_history.db"
+CHUNK_SIZE = 5000  # Zeilen pro Block beim Lesen und Schreiben
+FORMAT_VERSION = 2  # 2: task_state mit Zeitstempeln statt der Sicht tasks
+
+# Exportierte Tabellen und Spalten (task_events ohne die lokale id)
+TABLES = {
+    'task_state': ('task_id', 'task_name', 'first_seen_at', 'last_changed_at'),
+    'task_events': ('task_id', 'event', 'event_date', 'task_name', 'first_seen'),
+    'task_lifetimes': ('task_id', 'task_name', 'outcome', 'first_seen', 'ended', 'lifetime_days', 'project_id'),
+}
+
+# Beim Import werden auch Dateien aus Version 1 mit der Sicht tasks (Datumswerte) gelesen
+IMPORT_TABLES = dict(TABLES, tasks=('task_id', 'task_name', 'first_seen', 'last_changed'))
+
+# Zusammenführen: bekannte Tasks behalten das früheste first_seen,
+# Name und last_changed kommen vom zuletzt geänderten Stand.
+MERGE_SQL = {
+    'task_state': '''
+        INSERT INTO task_state (task_id, task_name, first_seen_at, last_changed_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (task_id) DO UPDATE SET
+            task_name = CASE WHEN excluded.last_changed_at > last_changed_at
+                             THEN excluded.task_name ELSE task_name END,
+            first_seen_at = MIN(first_seen_at, excluded.first_seen_at),
+            last_changed_at = MAX(last_changed_at, excluded.last_changed_at)
+        WHERE excluded.last_changed_at > last_changed_at OR excluded.first_seen_at < first_seen_at
+    ''',
+    # Version 1: ein Datum wird zu Mitternacht Ortszeit und ersetzt einen
+    # lokalen Zeitstempel nur, wenn es auf einen anderen Tag fällt
+    'tasks': f'''
+        INSERT INTO task_state (task_id, task_name, first_seen_at, last_changed_at)
+        VALUES (?1, ?2, CAST(strftime('%s', ?3, 'utc') AS INTEGER), CAST(strftime('%s', ?4, 'utc') AS INTEGER))
+        ON CONFLICT (task_id) DO UPDATE SET
+            task_name = CASE WHEN excluded.last_changed_at > last_changed_at
+                             THEN excluded.task_name ELSE task_name END,
+            first_seen_at = CASE WHEN excluded.first_seen_at + {DAY} <= first_seen_at
+                                 THEN excluded.first_seen_at ELSE first_seen_at END,
+            last_changed_at = CASE WHEN excluded.last_changed_at > last_changed_at
+                                   THEN excluded.last_changed_at ELSE last_changed_at END
+        WHERE excluded.last_changed_at > last_changed_at OR excluded.first_seen_at + {DAY} <= first_seen_at
+    ''',
+    # Ereignisse haben keine maschinenübergreifende ID - Duplikate werden
+    # über (task_id, event, event_date, task_name) erkannt
+    'task_events': '''
+        INSERT INTO task_events (task_id, event, event_date, task_name, first_seen)
+        SELECT ?1, ?2, ?3, ?4, ?5
+        WHERE NOT EXISTS (
+            SELECT 1 FROM task_events
+            WHERE event = ?2 AND task_id = ?1 AND event_date = ?3 AND task_name = ?4
+        )
+    ''',
+    # Pro Task zählt das zuletzt beobachtete Verschwinden
+    'task_lifetimes': '''
+        INSERT INTO task_lifetimes (task_id, task_name, outcome, first_seen, ended, lifetime_days, project_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (task_id) DO UPDATE SET
+            task_name = excluded.task_name,
+            outcome = excluded.outcome,
+            first_seen = excluded.first_seen,
+            ended = excluded.ended,
+            lifetime_days = excluded.lifetime_days,
+            project_id = excluded.project_id
+        WHERE excluded.ended > ended
+    ''',
+}
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# --------------------------
+# Lesen aus der Datenbank
+# --------------------------
+def iter_chunks(conn, table):
+    """
+    Liefert die Zeilen einer Tabelle in Blöcken von CHUNK_SIZE.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?", (table,)
+    ).fetchone()
+    if not exists:
+        return
+
+    order = 'id' if table == 'task_events' else 'task_id'
+    cursor = conn.execute(f'SELECT {", ".join(TABLES[table])} FROM {table} ORDER BY {order}')
+    while True:
+        rows = cursor.fetchmany(CHUNK_SIZE)
+        if not rows:
+            return
+        yield rows
+
+def make_header():
+    return {
+        'type': 'header',
+        'version': FORMAT_VERSION,
+        'source': socket.gethostname(),
+        'exported_at': datetime.now().isoformat(timespec='seconds'),
+        'tables': {table: list(columns) for table, columns in TABLES.items()},
+    }
+
+# --------------------------
+# Export
+# --------------------------
+def export_ndjson(conn, out):
+    """
+    Schreibt eine Zeile JSON pro Datensatz: {"table": ..., Spalte: Wert, ...}.
+    """
+    out.write(json.dumps(make_header(), ensure_ascii=False) + "\n")
+    counts = {}
+    for table, columns in TABLES.items():
+        counts[table] = 0
+        for rows in iter_chunks(conn, table):
+            out.writelines(
+                json.dumps(dict(zip(columns, row), table=table), ensure_ascii=False) + "\n"
+                for row in rows
+            )
+            counts[table] += len(rows)
+    return counts
+
+def export_columnar(conn, out):
+    """
+    Schreibt spaltenweise Blöcke als gzip-komprimierte JSON-Zeilen:
+    {"table": ..., "rows": n, "columns": {Spalte: [Werte...]}}.
+    Gleichartige Werte liegen beieinander und komprimieren dadurch deutlich besser.
+    """
+    out.write((json.dumps(make_header(), ensure_ascii=False) + "\n").encode("utf-8"))
+    counts = {}
+    for table, columns in TABLES.items():
+        counts[table] = 0
+        for rows in iter_chunks(conn, table):
+            block = {
+                'table': table,
+                'rows': len(rows),
+                'columns': {column: [row[i] for row in rows] for i, column in enumerate(columns)},
+            }
+            out.write((json.dumps(block, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+            counts[table] += len(rows)
+    return counts
+
+def export_history(db_path, path, fmt):
+    """
+    Exportiert die Historie in eine Datei ('-' = stdout, nur NDJSON).
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        if fmt == 'columnar':
+            with gzip.open(path, "wb") as out:
+                return export_columnar(conn, out)
+        if path == "-":
+            return export_ndjson(conn, sys.stdout)
+        with open(path, "w", encoding="utf-8") as out:
+            return export_ndjson(conn, out)
+    finally:
+        conn.close()
+
+# --------------------------
+# Import
+# --------------------------
+def iter_ndjson_batches(lines):
+    """
+    Liest NDJSON-Zeilen und liefert (Tabelle, Zeilen) in Blöcken von CHUNK_SIZE.
+    """
+    batches = {table: [] for table in IMPORT_TABLES}
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        table = record.get('table')
+        if record.get('type') == 'header':
+            check_header(record)
+            continue
+        if table not in IMPORT_TABLES:
+            continue
+        batch = batches[table]
+        batch.append(tuple(record.get(column) for column in IMPORT_TABLES[table]))
+        if len(batch) >= CHUNK_SIZE:
+            yield table, batch
+            batches[table] = []
+    for table, batch in batches.items():
+        if batch:
+            yield table, batch
+
+def iter_columnar_batches(lines):
+    """
+    Liest spaltenweise Blöcke und liefert (Tabelle, Zeilen) je Block.
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        block = json.loads(line)
+        if block.get('type') == 'header':
+            check_header(block)
+            continue
+        table = block.get('table')
+        if table not in IMPORT_TABLES:
+            continue
+        columns = block['columns']
+        yield table, list(zip(*(columns[column] for column in IMPORT_TABLES[table])))
+
+def check_header(header):
+    if header.get('version', 0) > FORMAT_VERSION:
+        raise ValueError(f"Exportformat Version {header['version']} wird nicht unterstützt")
+    print(f"Import von '{header.get('source', 'unbekannt')}' (exportiert {header.get('exported_at', '?')})")
+
+def import_history(db_path, path):
+    """
+    Führt eine Export-Datei idempotent in die Datenbank zusammen.
+    Jeder Block wird in einer eigenen Transaktion geschrieben - ein abgebrochener
+    Import kann einfach wiederholt werden.
+    """
+    init_database(db_path)
+
+    if path == "-":
+        source = sys.stdin
+        batches = iter_ndjson_batches(source)
+    else:
+        with open(path, "rb") as f:
+            columnar = f.read(2) == GZIP_MAGIC
+        if columnar:
+            source = gzip.open(path, "rt", encoding="utf-8")
+            batches = iter_columnar_batches(source)
+        else:
+            source = open(path, "r", encoding="utf-8")
+            batches = iter_ndjson_batches(source)
+
+    conn = sqlite3.connect(db_path)
+    counts = {table: 0 for table in TABLES}
+    try:
+        for table, rows in batches:
+            # rowcount zählt nur die Zeilen der Anweisung selbst, nicht die der Trigger
+            with conn:
+                changed = conn.executemany(MERGE_SQL[table], rows).rowcount
+            # Tasks aus Version 1 landen ebenfalls in task_state
+            target = 'task_state' if table == 'tasks' else table
+            counts[target] += changed
+    finally:
+        conn.close()
+        if source is not sys.stdin:
+            source.close()
+    return counts
+
+# --------------------------
+# Hauptprogramm
+# --------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Task-Historie exportieren und zusammenführen")
+    parser.add_argument("--db", default=DB_PATH, help="Pfad zur Datenbank")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Historie exportieren")
+    export_parser.add_argument("output", help="Zieldatei ('-' für stdout, nur NDJSON)")
+    export_parser.add_argument("--format", choices=["ndjson", "columnar"], default="ndjson")
+
+    import_parser = subparsers.add_parser("import", help="Export-Dateien zusammenführen (mehrfach ausführbar)")
+    import_parser.add_argument("inputs", nargs="+", help="Export-Dateien ('-' für stdin); Format wird erkannt")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        counts = export_history(args.db, args.output, args.format)
+        print(f"Export abgeschlossen: " + ", ".join(f"{table}: {n}" for table, n in counts.items()),
+              file=sys.stderr)
+    else:
+        for path in args.inputs:
+            counts = import_history(args.db, path)
+            print(f"{path}: geänderte Zeilen - " + ", ".join(f"{table}: {n}" for table, n in counts.items()))
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import deque
+
+# --------------------------
+# Konfiguration
+# --------------------------
+IDLE_AFTER = 600  # Sekunden ohne Eingabe, ab denen die Sitzung als inaktiv gilt
+PAUSE_AFTER = 3600  # Sekunden ohne Eingabe, ab denen alle Hintergrundarbeit ruht
+IDLE_POLL_FACTOR = 4  # Poll-Intervall wird bei Inaktivität bzw. gesperrter Sitzung gestreckt
+MOUSE_INTERVAL = 0.1  # Mausabfrage im Normalbetrieb
+IDLE_MOUSE_INTERVAL = 1.0  # Mausabfrage bei Inaktivität und Pause
+LOG_SIZE = 200  # Anzahl der gespeicherten Entscheidungen
+
+VISIBLE = 'visible'  # Widget eingeblendet: rendern und normal pollen
+HIDDEN = 'hidden'  # Widget ausgeblendet: pollen, aber nicht rendern
+IDLE = 'idle'  # Keine Eingaben seit IDLE_AFTER oder Sitzung gesperrt: seltener pollen
+PAUSED = 'paused'  # Keine Eingaben seit PAUSE_AFTER: nicht mehr pollen
+
+# --------------------------
+# Zustandsmaschine
+# --------------------------
+class IdlePolicy:
+    """
+    Entscheidet, ob das Widget rendert, wie oft es pollt und wie oft die Maus
+    abgefragt wird. Eingaben sind nur Sichtbarkeit (set_visible) und der
+    Sitzungszustand (observe_session) - die Uhr ist austauschbar, damit sich
+    die Zustände ohne Fenster und ohne Windows durchspielen lassen.
+    Jede Entscheidung landet in log als (Zeit, Entscheidung, Zustand, Details).
+    """
+
+    def __init__(self, idle_after=IDLE_AFTER, pause_after=PAUSE_AFTER,
+                 poll_factor=IDLE_POLL_FACTOR, clock=time.monotonic, verbose=True):
+        self.idle_after = idle_after
+        self.pause_after = pause_after
+        self.poll_factor = poll_factor
+        self.clock = clock
+        self.verbose = verbose
+        self.visible = False
+        self.idle_seconds = 0.0
+        self.locked = False
+        self.state = HIDDEN
+        self.render_deferred = False
+        self.log = deque(maxlen=LOG_SIZE)
+        self.lock = threading.Lock()
+
+    def record(self, decision, detail=''):
+        self.log.append((self.clock(), decision, self.state, detail))
+
+    # --------------------------
+    # Eingaben
+    # --------------------------
+    def set_visible(self, visible):
+        """
+        Gibt True zurück, wenn sich der Zustand dadurch geändert hat.
+        """
+        with self.lock:
+            self.visible = visible
+            return self.evaluate('eingeblendet' if visible else 'ausgeblendet')
+
+    def observe_session(self, idle_seconds, locked=False):
+        """
+        Übernimmt Sekunden seit der letzten Eingabe und ob die Sitzung gesperrt ist.
+        Gibt True zurück, wenn sich der Zustand dadurch geändert hat.
+        """
+        with self.lock:
+            self.idle_seconds = idle_seconds
+            self.locked = locked
+            return self.evaluate(f"{idle_seconds:.0f} s ohne Eingabe{', gesperrt' if locked else ''}")
+
+    def evaluate(self, reason):
+        if self.idle_seconds >= self.pause_after:
+            state = PAUSED
+        elif self.locked or self.idle_seconds >= self.idle_after:
+            state = IDLE
+        else:
+            state = VISIBLE if self.visible else HIDDEN
+        if state == self.state:
+            return False
+        previous, self.state = self.state, state
+        self.record('transition', f"{previous} -> {state} ({reason})")
+        if self.verbose:
+            print(f"Leerlauf: {previous} -> {state} ({reason})")
+        return True
+
+    # --------------------------
+    # Entscheidungen
+    # --------------------------
+    def should_render(self):
+        """
+        Gerendert wird nur in ein sichtbares Fenster. Sonst wird vermerkt,
+        dass beim nächsten Einblenden der neueste Stand angezeigt werden muss.
+        """
+        with self.lock:
+            if self.visible:
+                self.record('render')
+                return True
+            self.render_deferred = True
+            self.record('render_skipped')
+            return False
+
+    def take_deferred_render(self):
+        """
+        True, wenn seit dem Ausblenden ein Rendern ausgelassen wurde (setzt den Vermerk zurück).
+        """
+        with self.lock:
+            deferred, self.render_deferred = self.render_deferred, False
+            if deferred:
+                self.record('render_deferred')
+            return deferred
+
+    def poll_interval(self, base):
+        """
+        Sekunden bis zum nächsten Poll oder None, solange pausiert wird.
+        """
+        if self.state == PAUSED:
+            return None
+        if self.state == IDLE:
+            return base * self.poll_factor
+        return base
+
+    def next_sync_delay(self, last_sync, base):
+        """
+        Wartezeit bis zum nächsten Sync, gemessen ab last_sync (Zeit der Uhr).
+        0 heißt sofort synchronisieren, None heißt warten bis sich der Zustand ändert.
+        """
+        with self.lock:
+            interval = self.poll_interval(base)
+            if interval is None:
+                self.record('sync_paused')
+                return None
+            delay = max(0.0, last_sync + interval - self.clock())
+            self.record('sync' if delay == 0 else 'sync_wait', f"{delay:.0f} s (Intervall {interval:.0f} s)")
+            return delay
+
+    def mouse_interval(self):
+        return MOUSE_INTERVAL if self.state in (VISIBLE, HIDDEN) else IDLE_MOUSE_INTERVAL
+
+# --------------------------
+# Sitzungszustand (Windows)
+# --------------------------
+def session_state():
+    """
+    Sekunden seit der letzten Eingabe und ob die Sitzung gesperrt ist.
+    Ohne Windows-API gilt die Sitzung als aktiv: (0.0, False).
+    """
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class LASTINPUTINFO(ctypes.Structure):
+            _fields_ = [('cbSize', wintypes.UINT), ('dwTime', wintypes.DWORD)]
+
+        user32 = ctypes.windll.user32
+        info = LASTINPUTINFO()
+        info.cbSize = ctypes.sizeof(info)
+        if not user32.GetLastInputInfo(ctypes.byref(info)):
+            return 0.0, False
+        idle_ms = (ctypes.windll.kernel32.GetTickCount() - info.dwTime) & 0xFFFFFFFF
+        # Bei gesperrter Sitzung lässt sich der Eingabe-Desktop nicht öffnen
+        desktop = user32.OpenInputDesktop(0, False, 0x0100)  # DESKTOP_SWITCHDESKTOP
+        locked = not desktop
+        if desktop:
+            user32.CloseDesktop(desktop)
+        return idle_ms / 1000.0, locked
+    except (ImportError, AttributeError, OSError):
+        return 0.0, False
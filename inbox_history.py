@@ -1,48 +1,155 @@
-import requests
 import sqlite3
-import json
 from datetime import datetime, date
-import os
+
+import clock
+from todoist_api import api_get, PRIORITY_BACKGROUND
+from sync_metrics import MetricsRecorder, phase, count
+from inbox_snapshots import init_snapshot_schema, record_snapshot, age_bucket_labels, DAY
+from duplicates import init_duplicate_schema, update_duplicate_index
 
 # --------------------------
 # Konfiguration
 # --------------------------
-API_TOKEN = "391abfcd2e31d30fe065d9d96d4478144ca21891"
-HEADERS = {"Authorization": f"Bearer {API_TOKEN}"}
 DB_PATH = "tasks_history.db"
+API_BASE_URL = "https://api.todoist.com/rest/v2"
+SYNC_API_URL = "https://api.todoist.com/sync/v9"  # Erledigte Tasks gibt es nur über die Sync-API
+COMPLETED_PAGE_SIZE = 200  # Maximum von /completed/get_all
+COMPLETED_MAX_PAGES = 5
+STREAM_CHUNK_SIZE = 64 * 1024  # Bytes pro Block beim Streamen großer Antworten
+STALE_DAYS = 30  # Tasks ohne Änderung seit mehr Tagen gelten als "alt"
+AGE_BUCKETS = (7, STALE_DAYS, 90)  # Obergrenzen der Altersgruppen in Tagen
+SNAPSHOT_PROJECT = "inbox"  # Die Tabelle tasks enthält nur den Posteingang
+PERSIST_SYNC_METRICS = True  # Zeitmessungen in Tabelle sync_metrics speichern
 
 # --------------------------
 # Datenbank-Funktionen
 # --------------------------
-def init_database():
+def init_database(db_path=None):
     """
     Erstellt die SQLite-Datenbank und die Tasks-Tabelle, falls sie nicht existiert.
+    Ohne db_path wird DB_PATH verwendet.
     """
-    conn = sqlite3.connect(DB_PATH)
+    db_path = db_path or DB_PATH
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
+    # Wirkt nur bei neuen Datenbanken, bestehende stellt "db_maintenance.py --convert" um
+    cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    
+    init_task_schema(cursor)
+    init_history_schema(cursor)
     
+    conn.commit()
+    conn.close()
+    print(f"Datenbank '{db_path}' initialisiert.")
+
+def init_task_schema(cursor):
+    """
+    Erstellt die Tabelle task_state mit first_seen_at / last_changed_at als
+    Unix-Zeitstempel (Sekunden) und darüber die Sicht tasks mit den bisherigen
+    Datumsspalten first_seen / last_changed für Auswertungen und ältere Skripte.
+    Eine bestehende Tabelle tasks mit Datumsspalten wird dabei übernommen
+    (ein Datum wird zu Mitternacht Ortszeit). task_state_version zählt alle
+    Änderungen an task_state mit (siehe task_snapshot.read_data_version).
+    """
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tasks (
+        CREATE TABLE IF NOT EXISTS task_state (
             task_id INTEGER PRIMARY KEY,
             task_name TEXT NOT NULL,
-            first_seen DATE NOT NULL,
-            last_changed DATE NOT NULL
+            first_seen_at INTEGER NOT NULL,
+            last_changed_at INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_state_last_changed ON task_state (last_changed_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_state_first_seen ON task_state (first_seen_at)')
+
+    # Datenstand für Leser des Task-Snapshots: jede Änderung an task_state erhöht ihn,
+    # auch von Skripten, die selbst keinen Snapshot veröffentlichen
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS task_state_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO task_state_version (id, version) VALUES (1, 1)')
+    for operation in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS task_state_version_{operation.lower()} AFTER {operation} ON task_state
+            BEGIN
+                UPDATE task_state_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks'")
+    if cursor.fetchone():
+        # Umstellung einer Datenbank mit Datumsspalten - wiederholbar, falls sie abbricht
+        migrated = cursor.execute('''
+            INSERT OR IGNORE INTO task_state (task_id, task_name, first_seen_at, last_changed_at)
+            SELECT task_id, task_name,
+                   COALESCE(CAST(strftime('%s', first_seen, 'utc') AS INTEGER), 0),
+                   COALESCE(CAST(strftime('%s', last_changed, 'utc') AS INTEGER), 0)
+            FROM tasks
+        ''').rowcount
+        cursor.execute('DROP TABLE tasks')
+        print(f"Tabelle tasks auf Zeitstempel umgestellt ({migrated} Tasks).")
+
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS tasks AS
+        SELECT task_id, task_name,
+               date(first_seen_at, 'unixepoch', 'localtime') AS first_seen,
+               date(last_changed_at, 'unixepoch', 'localtime') AS last_changed
+        FROM task_state
+    ''')
+
+def init_history_schema(cursor):
+    """
+    Erstellt die Ereignis-Tabelle task_events und die Indizes für Auswertungen.
+    Jede Änderung beim Sync (added, renamed, deleted) wird dort protokolliert,
+    bei deleted zusammen mit first_seen, damit die Lebensdauer ohne Join berechnet werden kann.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS task_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            event_date DATE NOT NULL,
+            task_name TEXT NOT NULL,
+            first_seen DATE
         )
     ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_events_date ON task_events (event_date, event)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_events_event_task ON task_events (event, task_id)')
     
-    conn.commit()
-    conn.close()
-    print(f"Datenbank '{DB_PATH}' initialisiert.")
+    # Lebensdauer verschwundener Tasks mit Grund (completed, moved, deleted, unknown)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS task_lifetimes (
+            task_id INTEGER PRIMARY KEY,
+            task_name TEXT NOT NULL,
+            outcome TEXT NOT NULL,
+            first_seen DATE NOT NULL,
+            ended DATE NOT NULL,
+            lifetime_days INTEGER NOT NULL,
+            project_id TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_lifetimes_outcome ON task_lifetimes (outcome, lifetime_days)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_lifetimes_ended ON task_lifetimes (ended)')
+
+    # Zeitreihe der Posteingangsgröße
+    init_snapshot_schema(cursor)
 
-def get_db_tasks():
+    # LSH-Index für die Duplikatsuche
+    init_duplicate_schema(cursor)
+
+def get_db_tasks(db_path=None):
     """
     Ruft alle Tasks aus der Datenbank ab.
-    Gibt ein Dictionary zurück: {task_id: {'name': name, 'first_seen': date, 'last_changed': date}}
+    Gibt ein Dictionary zurück: {task_id: {'name': name, 'first_seen': Zeitstempel, 'last_changed': Zeitstempel}}
+    (Unix-Sekunden, siehe init_task_schema).
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(db_path or DB_PATH)
     cursor = conn.cursor()
     
-    cursor.execute('SELECT task_id, task_name, first_seen, last_changed FROM tasks')
+    cursor.execute('SELECT task_id, task_name, first_seen_at, last_changed_at FROM task_state')
     rows = cursor.fetchall()
     
     conn.close()
@@ -63,79 +170,293 @@ def insert_new_task(task_id, task_name):
     Fügt einen neuen Task in die Datenbank ein.
     """
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    today = date.today().isoformat()
-    
-    cursor.execute('''
-        INSERT INTO tasks (task_id, task_name, first_seen, last_changed)
-        VALUES (?, ?, ?, ?)
-    ''', (task_id, task_name, today, today))
-    
-    conn.commit()
-    conn.close()
+    try:
+        with conn:
+            cursor = conn.cursor()
+
+            now = int(clock.timestamp())
+            today = clock.today().isoformat()
+
+            cursor.execute('''
+                INSERT INTO task_state (task_id, task_name, first_seen_at, last_changed_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (task_id) DO UPDATE SET
+                    task_name = excluded.task_name, last_changed_at = excluded.last_changed_at
+            ''', (task_id, task_name, now, now))
+            cursor.execute('''
+                INSERT INTO task_events (task_id, event, event_date, task_name)
+                VALUES (?, 'added', ?, ?)
+            ''', (task_id, today, task_name))
+            update_duplicate_index(cursor, [(task_id, task_name)], [])
+    finally:
+        conn.close()
     print(f"   [NEU] Task hinzugefügt: ID {task_id} - {task_name}")
 
 def update_task_name(task_id, new_name):
     """
-    Aktualisiert den Namen eines Tasks und setzt last_changed auf heute.
+    Aktualisiert den Namen eines Tasks und setzt last_changed auf jetzt.
     """
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    today = date.today().isoformat()
-    
-    cursor.execute('''
-        UPDATE tasks 
-        SET task_name = ?, last_changed = ?
-        WHERE task_id = ?
-    ''', (new_name, today, task_id))
-    
-    conn.commit()
-    conn.close()
+    try:
+        with conn:
+            cursor = conn.cursor()
+
+            now = int(clock.timestamp())
+            today = clock.today().isoformat()
+
+            cursor.execute('''
+                UPDATE task_state 
+                SET task_name = ?, last_changed_at = ?
+                WHERE task_id = ?
+            ''', (new_name, now, task_id))
+            cursor.execute('''
+                INSERT INTO task_events (task_id, event, event_date, task_name)
+                VALUES (?, 'renamed', ?, ?)
+            ''', (task_id, today, new_name))
+            update_duplicate_index(cursor, [(task_id, new_name)], [])
+    finally:
+        conn.close()
     print(f"   [GEÄNDERT] Task aktualisiert: ID {task_id} - {new_name}")
 
-def delete_task(task_id):
+def delete_task(task_id, outcome=None):
     """
-    Entfernt einen Task aus der Datenbank.
+    Entfernt einen Task aus der Datenbank und speichert seine Lebensdauer.
+    outcome ist ein Eintrag aus classify_disappeared_tasks (ohne: 'unknown').
     """
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Hole den Namen für die Ausgabe
-    cursor.execute('SELECT task_name FROM tasks WHERE task_id = ?', (task_id,))
-    result = cursor.fetchone()
-    name = result[0] if result else "Unbekannt"
-    
-    cursor.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
-    
-    conn.commit()
-    conn.close()
+    try:
+        with conn:
+            cursor = conn.cursor()
+
+            # Hole den Namen für die Ausgabe
+            cursor.execute('SELECT task_name FROM task_state WHERE task_id = ?', (task_id,))
+            result = cursor.fetchone()
+            name = result[0] if result else "Unbekannt"
+
+            cursor.execute('''
+                INSERT INTO task_events (task_id, event, event_date, task_name, first_seen)
+                SELECT task_id, 'deleted', ?, task_name, first_seen FROM tasks WHERE task_id = ?
+            ''', (clock.today().isoformat(), task_id))
+            record_lifetimes(cursor, [task_id], {task_id: outcome} if outcome else {}, clock.today().isoformat())
+            cursor.execute('DELETE FROM task_state WHERE task_id = ?', (task_id,))
+            update_duplicate_index(cursor, [], [task_id])
+    finally:
+        conn.close()
     print(f"   [ENTFERNT] Task gelöscht: ID {task_id} - {name}")
 
-def days_since_date(date_string):
+def get_db_names(db_path=None):
+    """
+    Ruft nur ID und Namen aller Tasks ab: {task_id: name}.
+    Für den Sync-Diff genügt das und braucht nur einen Bruchteil des Speichers von get_db_tasks.
+    """
+    conn = sqlite3.connect(db_path or DB_PATH)
+    try:
+        return dict(conn.execute('SELECT task_id, task_name FROM task_state'))
+    finally:
+        conn.close()
+
+def get_disappeared_since(task_ids, db_path=None):
     """
-    Berechnet die Anzahl Tage seit einem gegebenen Datum.
+    Frühestes first_seen der angegebenen Tasks direkt aus der Datenbank
+    (Gegenstück zu disappeared_since ohne geladenes db_tasks).
     """
+    task_ids = list(task_ids)
+    since = None
+    conn = sqlite3.connect(db_path or DB_PATH)
     try:
-        task_date = datetime.strptime(date_string, '%Y-%m-%d').date()
-        today = date.today()
-        return (today - task_date).days
-    except:
-        return 0
+        # In Blöcken, damit die Anzahl der SQL-Parameter begrenzt bleibt
+        for start in range(0, len(task_ids), 500):
+            chunk = task_ids[start:start + 500]
+            value = conn.execute(
+                f'SELECT MIN(first_seen_at) FROM task_state WHERE task_id IN ({",".join("?" * len(chunk))})', chunk
+            ).fetchone()[0]
+            if value is not None and (since is None or value < since):
+                since = value
+    finally:
+        conn.close()
+    return since
+
+def compute_record_diff(records, db_names):
+    """
+    Vergleicht kompakte (task_id, task_name)-Tupel mit {task_id: name} aus get_db_names.
+    db_names wird dabei verbraucht: Was übrig bleibt, sind die verschwundenen Tasks.
+    So entsteht kein zusätzliches Set aller aktuellen IDs.
+    Gibt (neue Tasks, umbenannte Tasks, {task_id: name} der verschwundenen Tasks) zurück.
+    """
+    new_tasks = []
+    renamed_tasks = []
+    new_task_ids = set()
+
+    for task_id, task_name in records:
+        old_name = db_names.pop(task_id, None)
+        if old_name is None:
+            # Doppelte IDs in der API-Antwort nur einmal einfügen
+            if task_id not in new_task_ids:
+                new_task_ids.add(task_id)
+                new_tasks.append((task_id, task_name))
+        elif old_name != task_name:
+            renamed_tasks.append((task_id, task_name))
+
+    return new_tasks, renamed_tasks, db_names
+
+def compute_sync_diff(todoist_tasks, db_tasks):
+    """
+    Vergleicht die Todoist-Tasks mit den Tasks aus der Datenbank.
+    Gibt (neue Tasks, umbenannte Tasks, gelöschte Task-IDs) zurück,
+    neue und umbenannte Tasks jeweils als Liste von (task_id, task_name).
+    """
+    # Sicherstellen, dass task_id ein Integer ist
+    records = ((int(task.get('id')), task.get('content', 'Unbekannt')) for task in todoist_tasks)
+    db_names = {task_id: data['name'] for task_id, data in db_tasks.items()}
+
+    new_tasks, renamed_tasks, deleted = compute_record_diff(records, db_names)
+    return new_tasks, renamed_tasks, list(deleted)
+
+def record_lifetimes(cursor, task_ids, outcomes, today):
+    """
+    Speichert Lebensdauer und Grund des Verschwindens für Tasks, die noch in
+    der Tabelle task_state stehen (also vor dem DELETE aufrufen).
+    outcomes: {task_id: (Grund, Projekt-ID, Enddatum oder None)} - fehlende Tasks gelten als 'unknown'.
+    """
+    rows = []
+    for task_id in task_ids:
+        outcome, project_id, ended = outcomes.get(task_id) or ('unknown', None, None)
+        rows.append({'task_id': task_id, 'outcome': outcome, 'project_id': project_id, 'ended': ended or today})
+    cursor.executemany('''
+        INSERT OR REPLACE INTO task_lifetimes
+            (task_id, task_name, outcome, first_seen, ended, lifetime_days, project_id)
+        SELECT task_id, task_name, :outcome, first_seen, :ended,
+               MAX(0, CAST(julianday(:ended) - julianday(first_seen) AS INTEGER)), :project_id
+        FROM tasks WHERE task_id = :task_id
+    ''', rows)
+
+def apply_sync_diff(new_tasks, renamed_tasks, deleted_task_ids, db_path=None, outcomes=None):
+    """
+    Schreibt alle Änderungen eines Syncs gebündelt in einer einzigen Transaktion
+    und hängt einen Snapshot der Posteingangsgröße an.
+    outcomes klassifiziert die gelöschten Tasks (siehe classify_disappeared_tasks).
+    """
+    conn = sqlite3.connect(db_path or DB_PATH)
+    try:
+        with conn:
+            cursor = conn.cursor()
+
+            now = int(clock.timestamp())
+            today = clock.today().isoformat()
+
+            # Idempotent: ein schon vorhandener Task (z.B. erneut eingereiht) wird nur aktualisiert
+            cursor.executemany('''
+                INSERT INTO task_state (task_id, task_name, first_seen_at, last_changed_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (task_id) DO UPDATE SET
+                    task_name = excluded.task_name, last_changed_at = excluded.last_changed_at
+            ''', [(task_id, task_name, now, now) for task_id, task_name in new_tasks])
+
+            cursor.executemany('''
+                UPDATE task_state
+                SET task_name = ?, last_changed_at = ?
+                WHERE task_id = ?
+            ''', [(task_name, now, task_id) for task_id, task_name in renamed_tasks])
+
+            # Ereignisse protokollieren - gelöschte Tasks vor dem DELETE, damit first_seen erhalten bleibt
+            cursor.executemany('''
+                INSERT INTO task_events (task_id, event, event_date, task_name)
+                VALUES (?, ?, ?, ?)
+            ''', [(task_id, 'added', today, task_name) for task_id, task_name in new_tasks] +
+                 [(task_id, 'renamed', today, task_name) for task_id, task_name in renamed_tasks])
+
+            cursor.executemany('''
+                INSERT INTO task_events (task_id, event, event_date, task_name, first_seen)
+                SELECT task_id, 'deleted', ?, task_name, first_seen FROM tasks WHERE task_id = ?
+            ''', [(today, task_id) for task_id in deleted_task_ids])
+            record_lifetimes(cursor, deleted_task_ids, outcomes or {}, today)
+
+            cursor.executemany('DELETE FROM task_state WHERE task_id = ?',
+                               [(task_id,) for task_id in deleted_task_ids])
+
+            # Duplikat-Index nur für die geänderten Tasks nachführen
+            update_duplicate_index(cursor, list(new_tasks) + list(renamed_tasks), deleted_task_ids)
+
+            # Snapshot der Posteingangsgröße in derselben Transaktion
+            record_snapshot(cursor, SNAPSHOT_PROJECT, AGE_BUCKETS)
+    finally:
+        conn.close()
+
+def days_since(timestamp, now=None):
+    """
+    Volle Tage seit einem Zeitstempel (Unix-Sekunden) - reine Ganzzahl-Arithmetik.
+    """
+    if now is None:
+        now = int(clock.timestamp())
+    return (now - timestamp) // DAY
+
+def format_timestamp(timestamp, date_format='%d.%m.%Y'):
+    """
+    Zeitstempel als Datum in Ortszeit für die Anzeige.
+    """
+    return datetime.fromtimestamp(timestamp).strftime(date_format)
+
+def find_stale_tasks(db_tasks, min_days=STALE_DAYS):
+    """
+    Gibt alle Tasks zurück, die seit mehr als min_days Tagen unverändert sind,
+    als Liste von (task_id, name, Tage), die ältesten zuerst.
+    """
+    old_tasks = []
+    now = int(clock.timestamp())
+    for task_id, data in db_tasks.items():
+        days = days_since(data['last_changed'], now)
+        if days > min_days:
+            old_tasks.append((task_id, data['name'], days))
+    
+    old_tasks.sort(key=lambda x: x[2], reverse=True)  # Nach Tagen sortieren
+    return old_tasks
+
+def count_tasks_by_age(db_tasks, buckets=AGE_BUCKETS):
+    """
+    Zählt die Tasks nach Tagen seit der letzten Änderung.
+    Gibt ein Dictionary {Altersgruppe: Anzahl} zurück, z.B. {'0-7': 3, '8-30': 5, ...}.
+    """
+    labels = age_bucket_labels(buckets)
+    counts = dict.fromkeys(labels, 0)
+    now = int(clock.timestamp())
+    for data in db_tasks.values():
+        days = days_since(data['last_changed'], now)
+        for label, upper in zip(labels, buckets):
+            if days <= upper:
+                counts[label] += 1
+                break
+        else:
+            counts[labels[-1]] += 1
+    
+    return counts
 
 # --------------------------
 # Todoist API-Funktionen
 # --------------------------
-def get_projects():
+def default_headers():
+    """
+    Header mit dem Token des Standardkontos (accounts.json bzw. TODOIST_API_TOKEN),
+    bei jedem Aufruf neu gelesen, damit ein rotierter Token ohne Neustart greift.
+    """
+    # accounts baut auf diesem Modul auf - erst hier importieren
+    from accounts import default_account
+    return default_account().headers()
+
+def get_projects(priority=PRIORITY_BACKGROUND, headers=None, db_path=None):
     """
     Ruft alle Projekte ab und gibt sie zurück.
+    headers und db_path erlauben andere Konten als das Standardkonto.
     """
-    url = "https://api.todoist.com/rest/v2/projects"
+    url = f"{API_BASE_URL}/projects"
     try:
-        response = requests.get(url, headers=HEADERS)
+        with phase('fetch'):
+            response = api_get(url, headers or default_headers(), priority=priority, db_path=db_path or DB_PATH)
+        if response is None:
+            return []
         if response.status_code == 200:
-            return response.json()
+            count('bytes_transferred', len(response.content))
+            with phase('parse'):
+                return response.json()
         else:
             print(f"Fehler beim Abrufen der Projekte: {response.status_code}")
             return []
@@ -143,11 +464,11 @@ def get_projects():
         print(f"Fehler beim Abrufen der Projekte: {e}")
         return []
 
-def get_inbox_project_id():
+def get_inbox_project_id(priority=PRIORITY_BACKGROUND, headers=None, db_path=None):
     """
     Findet die Projekt-ID des Posteingangs (Inbox).
     """
-    projects = get_projects()
+    projects = get_projects(priority, headers, db_path)
     
     for project in projects:
         if project.get('is_inbox_project', False):
@@ -158,144 +479,379 @@ def get_inbox_project_id():
     
     return None
 
-def get_inbox_todos():
+def get_inbox_todos(priority=PRIORITY_BACKGROUND, headers=None, db_path=None):
     """
     Ruft alle aktiven (nicht erledigten) Todos aus dem Posteingang ab.
+    Gibt None zurück, wenn die API nicht erreichbar war oder das Rate-Limit
+    greift - damit ein Fehler nicht als leerer Posteingang gewertet wird.
     """
-    inbox_id = get_inbox_project_id()
+    inbox_id = get_inbox_project_id(priority, headers, db_path)
     
     if not inbox_id:
         print("Konnte Posteingang nicht finden!")
-        return []
+        return None
     
     # Nur aktive Tasks abrufen (is_completed=false ist Standard)
-    url = f"https://api.todoist.com/rest/v2/tasks"
+    url = f"{API_BASE_URL}/tasks"
     params = {'project_id': inbox_id}
     
     try:
-        response = requests.get(url, headers=HEADERS, params=params)
+        with phase('fetch'):
+            response = api_get(url, headers or default_headers(), params=params, priority=priority,
+                               db_path=db_path or DB_PATH)
+        if response is None:
+            return None
         if response.status_code != 200:
             print(f"Fehler beim Abrufen der Aufgaben: {response.status_code}")
-            return []
+            return None
         
-        return response.json()
+        count('bytes_transferred', len(response.content))
+        with phase('parse'):
+            return response.json()
         
     except Exception as e:
         print(f"Fehler beim Abrufen der Aufgaben: {e}")
-        return []
+        return None
+
+def iter_json_array(chunks):
+    """
+    Zerlegt ein JSON-Array aus Text-Blöcken Element für Element, ohne das ganze
+    Dokument im Speicher zu halten. Gepuffert wird höchstens ein Block plus ein
+    unvollständiges Element. Gedacht für Arrays aus Objekten (wie /tasks) - ein
+    Objekt lässt sich erst dekodieren, wenn es vollständig ist.
+    """
+    import json
+
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    for chunk in chunks:
+        buffer += chunk
+        pos = 0
+        while True:
+            # Leerzeichen und Kommas zwischen den Elementen überspringen
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("JSON-Array erwartet")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, pos_end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Element noch unvollständig - nächsten Block abwarten
+                break
+            yield item
+            pos = pos_end
+        buffer = buffer[pos:]
+    raise ValueError("JSON-Array unvollständig")
+
+def iter_task_records(response, fields=('id', 'content')):
+    """
+    Liest die Task-Liste einer mit stream=True geladenen Response blockweise und
+    liefert kompakte (task_id, content)-Tupel. Das JSON-Objekt eines Tasks lebt
+    nur, bis seine Felder übernommen sind. Weitere Felder (z.B. 'priority') werden
+    in der Reihenfolge von fields an das Tupel angehängt.
+    """
+    import codecs
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def chunks():
+        for block in response.iter_content(STREAM_CHUNK_SIZE):
+            count('bytes_transferred', len(block))
+            yield decoder.decode(block)
+        yield decoder.decode(b"", final=True)
+
+    for task in iter_json_array(chunks()):
+        yield task_record(task, fields)
+
+def task_record(task, fields=('id', 'content')):
+    """
+    Macht aus einem Task-Objekt der API ein kompaktes (task_id, content, ...)-Tupel.
+    """
+    task_id_raw = task.get('id')
+    record = (int(task_id_raw) if task_id_raw else 0, task.get('content', 'Unbekannt'))
+    if len(fields) > 2:
+        record += tuple(task.get(field) for field in fields[2:])
+    return record
+
+def open_inbox_stream(priority=PRIORITY_BACKGROUND, headers=None, db_path=None):
+    """
+    Startet den Abruf der Posteingang-Tasks mit stream=True.
+    Gibt die noch ungelesene Response zurück (vom Aufrufer zu schließen) oder None.
+    """
+    inbox_id = get_inbox_project_id(priority, headers, db_path)
+
+    if not inbox_id:
+        print("Konnte Posteingang nicht finden!")
+        return None
+
+    url = f"{API_BASE_URL}/tasks"
+    params = {'project_id': inbox_id}
+
+    with phase('fetch'):
+        response = api_get(url, headers or default_headers(), params=params, priority=priority,
+                           db_path=db_path or DB_PATH, stream=True)
+    if response is None:
+        return None
+    if response.status_code != 200:
+        print(f"Fehler beim Abrufen der Aufgaben: {response.status_code}")
+        response.close()
+        return None
+    return response
+
+def get_inbox_records(priority=PRIORITY_BACKGROUND, headers=None, db_path=None):
+    """
+    Wie get_inbox_todos, aber speicherschonend für große Posteingänge: Die Antwort
+    wird gestreamt und direkt in (task_id, content)-Tupel zerlegt.
+    Gibt None zurück, wenn die API nicht erreichbar war oder das Rate-Limit greift.
+    """
+    try:
+        response = open_inbox_stream(priority, headers, db_path)
+        if response is None:
+            return None
+        try:
+            # Der Body wird erst beim Parsen übertragen - die Phase enthält daher auch Netzwerkzeit
+            with phase('parse'):
+                return list(iter_task_records(response))
+        finally:
+            response.close()
+
+    except Exception as e:
+        print(f"Fehler beim Abrufen der Aufgaben: {e}")
+        return None
+
+def diff_inbox_stream(db_names, priority=PRIORITY_BACKGROUND, headers=None, db_path=None):
+    """
+    Vergleicht den Posteingang direkt beim Einlesen mit db_names (aus get_db_names),
+    ohne die Task-Liste aufzubauen - im Speicher liegen nur die Änderungen.
+    Gibt (neue Tasks, umbenannte Tasks, {task_id: name} der verschwundenen Tasks,
+    Anzahl Tasks in Todoist) zurück oder None, wenn die Antwort nicht vollständig
+    gelesen werden konnte - dann darf nichts gelöscht werden.
+    """
+    try:
+        response = open_inbox_stream(priority, headers, db_path)
+        if response is None:
+            return None
+        try:
+            todoist_count = 0
+
+            def counted(records):
+                nonlocal todoist_count
+                for record in records:
+                    todoist_count += 1
+                    yield record
+
+            # Einlesen und Abgleich laufen verschränkt - beides zählt zur Phase parse
+            with phase('parse'):
+                new_tasks, renamed_tasks, deleted = compute_record_diff(
+                    counted(iter_task_records(response)), db_names
+                )
+            return new_tasks, renamed_tasks, deleted, todoist_count
+        finally:
+            response.close()
+
+    except Exception as e:
+        print(f"Fehler beim Abrufen der Aufgaben: {e}")
+        return None
+
+def classify_disappeared_tasks(task_ids, since=None, priority=PRIORITY_BACKGROUND, headers=None, db_path=None):
+    """
+    Ermittelt gebündelt statt pro Task, warum Tasks aus dem Posteingang verschwunden sind:
+    ein Abruf der erledigten Tasks seit since (Sync-API, weitere Seiten nur falls nötig)
+    und ein Abruf der restlichen IDs als aktive Tasks (gefunden = verschoben, sonst gelöscht).
+    Gibt {task_id: (Grund, Projekt-ID, Enddatum oder None)} zurück. Tasks, die wegen
+    eines API-Fehlers nicht geklärt werden konnten, fehlen im Ergebnis.
+    """
+    remaining = set(task_ids)
+    outcomes = {}
+    if not remaining:
+        return outcomes
+    db_path = db_path or DB_PATH
+
+    try:
+        headers = headers or default_headers()
+        params = {'limit': COMPLETED_PAGE_SIZE, 'offset': 0}
+        if since is not None:
+            # Ab Tagesbeginn, wie bisher mit reinen Datumswerten
+            params['since'] = f"{date.fromtimestamp(since).isoformat()}T00:00:00"
+        for _ in range(COMPLETED_MAX_PAGES):
+            with phase('fetch'):
+                response = api_get(f"{SYNC_API_URL}/completed/get_all", headers, params=params,
+                                   priority=priority, db_path=db_path)
+            if response is None or response.status_code != 200:
+                return outcomes
+            count('bytes_transferred', len(response.content))
+            with phase('parse'):
+                items = response.json().get('items', [])
+            for item in items:
+                task_id = int(item.get('task_id') or 0)
+                if task_id in remaining:
+                    remaining.discard(task_id)
+                    completed_at = item.get('completed_at') or ''
+                    outcomes[task_id] = ('completed', item.get('project_id'), completed_at[:10] or None)
+            if not remaining or len(items) < COMPLETED_PAGE_SIZE:
+                break
+            params['offset'] += COMPLETED_PAGE_SIZE
+
+        if remaining:
+            # Noch aktive Tasks wurden in ein anderes Projekt verschoben
+            params = {'ids': ",".join(str(task_id) for task_id in sorted(remaining))}
+            with phase('fetch'):
+                response = api_get(f"{API_BASE_URL}/tasks", headers, params=params,
+                                   priority=priority, db_path=db_path)
+            if response is None or response.status_code != 200:
+                return outcomes
+            count('bytes_transferred', len(response.content))
+            with phase('parse'):
+                active_tasks = response.json()
+            for task in active_tasks:
+                task_id = int(task.get('id') or 0)
+                if task_id in remaining:
+                    remaining.discard(task_id)
+                    outcomes[task_id] = ('moved', task.get('project_id'), None)
+
+        for task_id in remaining:
+            outcomes[task_id] = ('deleted', None, None)
+    except Exception as e:
+        print(f"Fehler beim Klassifizieren entfernter Tasks: {e}")
+
+    return outcomes
+
+def disappeared_since(deleted_task_ids, db_tasks):
+    """
+    Frühestes first_seen der verschwundenen Tasks - ältere erledigte Tasks sind irrelevant.
+    """
+    return min((db_tasks[task_id]['first_seen'] for task_id in deleted_task_ids), default=None)
 
 # --------------------------
 # Hauptlogik
 # --------------------------
-def sync_tasks():
+def sync_tasks(store=None):
     """
     Synchronisiert Todoist-Tasks mit der lokalen Datenbank.
+    store ist eine Speicher-Engine aus storage (ohne: SQLite unter DB_PATH).
     """
+    if store is None:
+        # storage baut auf diesem Modul auf - erst hier importieren
+        from storage import SQLiteStore
+        store = SQLiteStore()
+
     print("=" * 80)
     print("TASK-SYNCHRONISATION")
     print("=" * 80)
     
-    # Aktuelle Tasks aus Todoist abrufen
-    todoist_tasks = get_inbox_todos()
-    print(f"Todoist Tasks geladen: {len(todoist_tasks)}")
-    
-    # Bestehende Tasks aus DB abrufen
-    db_tasks = get_db_tasks()
-    print(f"DB Tasks geladen: {len(db_tasks)}")
+    # Aus der DB genügen ID und Name
+    with phase('diff'):
+        db_names = store.load_names()
+    db_count = len(db_names)
     
-    # Set der aktuellen Todoist Task-IDs
-    current_task_ids = set()
+    # Todoist-Tasks beim Einlesen abgleichen - die vollständige Liste wird nie aufgebaut
+    result = diff_inbox_stream(db_names)
+    if result is None:
+        # Ohne vollständige API-Antwort nichts löschen
+        print("Synchronisation abgebrochen: Todoist-Tasks konnten nicht geladen werden.")
+        return
+    new_tasks, renamed_tasks, deleted, todoist_count = result
+    print(f"Todoist Tasks geladen: {todoist_count}")
+    print(f"DB Tasks geladen: {db_count}")
     
     print("\nSynchronisation:")
-    
-    # Durch alle Todoist-Tasks gehen
-    for task in todoist_tasks:
-        task_id = int(task.get('id'))  # Sicherstellen, dass task_id ein Integer ist
-        task_name = task.get('content', 'Unbekannt')
-        current_task_ids.add(task_id)
-        
-        if task_id not in db_tasks:
-            # Neuer Task
-            insert_new_task(task_id, task_name)
-        else:
-            # Existierender Task - prüfen ob Name geändert
-            if db_tasks[task_id]['name'] != task_name:
-                update_task_name(task_id, task_name)
-            # Wenn Name gleich ist, nichts tun
-    
-    # Tasks aus DB entfernen, die nicht mehr in Todoist existieren
-    db_task_ids = set(db_tasks.keys())
-    deleted_task_ids = db_task_ids - current_task_ids
-    
-    for task_id in deleted_task_ids:
-        delete_task(task_id)
-    
+
+    # Erledigt, verschoben oder gelöscht?
+    outcomes = classify_disappeared_tasks(deleted, store.disappeared_since(deleted))
+
+    # Alle Änderungen gebündelt in einer Transaktion schreiben
+    with phase('write'):
+        store.apply_diff(new_tasks, renamed_tasks, list(deleted), outcomes=outcomes)
+    count('tasks_added', len(new_tasks))
+    count('tasks_renamed', len(renamed_tasks))
+    count('tasks_deleted', len(deleted))
+
+    for task_id, task_name in new_tasks:
+        print(f"   [NEU] Task hinzugefügt: ID {task_id} - {task_name}")
+    for task_id, task_name in renamed_tasks:
+        print(f"   [GEÄNDERT] Task aktualisiert: ID {task_id} - {task_name}")
+    for task_id, task_name in deleted.items():
+        outcome = outcomes.get(task_id, ('unknown',))[0]
+        print(f"   [ENTFERNT] Task {outcome}: ID {task_id} - {task_name}")
+
     print(f"\nSynchronisation abgeschlossen!")
-    print(f"- Aktive Tasks in Todoist: {len(current_task_ids)}")
-    print(f"- Neue Tasks: {len(current_task_ids - db_task_ids)}")
-    print(f"- Geänderte Tasks: wird während Sync angezeigt")
-    print(f"- Entfernte Tasks: {len(deleted_task_ids)}")
+    print(f"- Aktive Tasks in Todoist: {todoist_count}")
+    print(f"- Neue Tasks: {len(new_tasks)}")
+    print(f"- Geänderte Tasks: {len(renamed_tasks)}")
+    print(f"- Entfernte Tasks: {len(deleted)}")
 
-def show_inbox_with_history():
+def show_inbox_with_history(store=None):
     """
     Zeigt die Posteingang-Tasks mit Historie-Informationen an.
     """
+    if store is None:
+        from storage import SQLiteStore
+        store = SQLiteStore()
+
     print("\n" + "=" * 80)
     print("POSTEINGANG MIT HISTORIE")
     print("=" * 80)
     
     # Aktuelle Tasks aus Todoist
-    tasks = get_inbox_todos()
+    tasks = get_inbox_records()
     
     if not tasks:
         print("Keine Tasks im Posteingang gefunden.")
         return
     
-    # Historie-Daten aus DB
-    db_tasks = get_db_tasks()
+    # Historie-Daten aus dem gemappten Snapshot, wenn die Engine gerade einen veröffentlicht hat, sonst aus der DB
+    snapshot = None
+    if store.snapshot_generation is not None:
+        from task_snapshot import open_snapshot
+        snapshot = open_snapshot(store.snapshot_path)
+        # Veraltet, wenn inzwischen ein anderer Prozess veröffentlicht oder in die Datenbank geschrieben hat
+        if snapshot is not None and (snapshot.generation != store.snapshot_generation
+                                     or snapshot.data_version != store.data_version()):
+            snapshot.close()
+            snapshot = None
+    try:
+        db_tasks = snapshot if snapshot is not None else store.load_tasks()
     
-    print(f"\nTodos im Posteingang ({len(tasks)} Aufgaben):")
-    print("-" * 80)
+        print(f"\nTodos im Posteingang ({len(tasks)} Aufgaben):")
+        print("-" * 80)
     
-    for i, task in enumerate(tasks, 1):
-        task_id_raw = task.get('id')
-        task_id = int(task_id_raw) if task_id_raw else 0
-        content = task.get('content', 'Unbekannte Aufgabe')
-        
-        # Datum für die Anzeige ermitteln
-        display_date = "Unbekannt"
-        if task_id in db_tasks:
-            first_seen = db_tasks[task_id]['first_seen']
-            last_changed = db_tasks[task_id]['last_changed']
-            
-            # Verwende das relevante Datum:
-            # - Bei Änderungen: last_changed (zeigt wann zuletzt geändert)
-            # - Ohne Änderungen: first_seen (zeigt Erstellungsdatum)
-            relevant_date = last_changed if first_seen != last_changed else first_seen
+        for i, (task_id, content) in enumerate(tasks, 1):
+            # Datum für die Anzeige ermitteln
+            display_date = "Unbekannt"
+            if task_id in db_tasks:
+                first_seen = db_tasks[task_id]['first_seen']
+                last_changed = db_tasks[task_id]['last_changed']
             
-            try:
-                date_obj = datetime.strptime(relevant_date, '%Y-%m-%d')
-                display_date = date_obj.strftime('%d.%m.%Y')
-            except:
-                display_date = relevant_date
+                # Verwende das relevante Datum:
+                # - Bei Änderungen: last_changed (zeigt wann zuletzt geändert)
+                # - Ohne Änderungen: first_seen (zeigt Erstellungsdatum)
+                relevant_date = last_changed if first_seen != last_changed else first_seen
+                display_date = format_timestamp(relevant_date)
         
-        print(f"{i:2d}. {display_date} - {content}")
+            print(f"{i:2d}. {display_date} - {content}")
     
-    print("-" * 80)
+        print("-" * 80)
     
-    # Statistik über "alte" Tasks
-    if db_tasks:
-        old_tasks = []
-        for task_id, data in db_tasks.items():
-            days = days_since_date(data['last_changed'])
-            if days > 30:  # Mehr als 30 Tage unverändert
-                old_tasks.append((task_id, data['name'], days))
+        # Statistik über "alte" Tasks
+        if db_tasks:
+            old_tasks = snapshot.stale(STALE_DAYS) if snapshot is not None else find_stale_tasks(db_tasks)
         
-        if old_tasks:
-            print(f"\n⚠️  Tasks ohne Änderung > 30 Tage ({len(old_tasks)}):")
-            old_tasks.sort(key=lambda x: x[2], reverse=True)  # Nach Tagen sortieren
-            for task_id, name, days in old_tasks[:10]:  # Top 10
-                print(f"   - {name} ({days} Tage)")
+            if old_tasks:
+                print(f"\n⚠️  Tasks ohne Änderung > {STALE_DAYS} Tage ({len(old_tasks)}):")
+                for task_id, name, days in old_tasks[:10]:  # Top 10
+                    print(f"   - {name} ({days} Tage)")
+    finally:
+        if snapshot is not None:
+            snapshot.close()
 
 # --------------------------
 # Hauptprogramm
@@ -304,11 +860,27 @@ if __name__ == "__main__":
     print("Todoist Task-Historie-Manager")
     print("=" * 40)
     
-    # Datenbank initialisieren
-    init_database()
-    
-    # Tasks synchronisieren
-    sync_tasks()
+    # Datenbank initialisieren (veröffentlicht nach jedem Sync auch den Task-Snapshot)
+    from storage import SQLiteStore
+    from task_snapshot import snapshot_path_for
+    store = SQLiteStore(snapshot_path=snapshot_path_for(DB_PATH))
+    store.init()
     
-    # Posteingang mit Historie anzeigen
-    show_inbox_with_history()
+    # Zeitmessung des Sync-Zyklus (TODOIST_PROFILE=1 aktiviert zusätzlich cProfile)
+    recorder = MetricsRecorder(DB_PATH if PERSIST_SYNC_METRICS else None)
+    cycle = recorder.start("inbox_history")
+    error = None
+    try:
+        # Tasks synchronisieren
+        sync_tasks(store)
+        
+        # Posteingang mit Historie anzeigen
+        with phase('render'):
+            show_inbox_with_history(store)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        recorder.finish(cycle, error)
+        phases_text = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in cycle.phases.items())
+        print(f"\nSync-Zyklus: {cycle.total * 1000:.0f} ms ({phases_text})")
@@ -0,0 +1,179 @@
+import clock
+
+# --------------------------
+# Konfiguration
+# --------------------------
+# Auflösungen in Sekunden (0 = Rohdaten je Sync)
+RAW = 0
+HOUR = 3600
+DAY = 86400
+WEEK = 604800
+RESOLUTIONS = {'raw': RAW, 'hour': HOUR, 'day': DAY, 'week': WEEK}
+WEEK_OFFSET = 4 * DAY  # Epoch (1970-01-01) war ein Donnerstag - Wochen beginnen am Montag
+
+# (Quelle, Ziel, Aufbewahrung der Quelle in Sekunden) - ältere Zeilen werden verdichtet
+ROLLUPS = (
+    (RAW, HOUR, 2 * DAY),
+    (HOUR, DAY, 30 * DAY),
+    (DAY, WEEK, 365 * DAY),
+)
+WEEK_RETENTION = 5 * 365 * DAY  # Danach werden auch Wochenwerte gelöscht
+
+TOTAL_BUCKET = "total"
+
+# --------------------------
+# Schema
+# --------------------------
+def init_snapshot_schema(cursor):
+    """
+    Erstellt die Tabelle inbox_snapshots.
+    Eine Zeile pro (Auflösung, Projekt, Altersgruppe, Zeitpunkt). Gespeichert werden
+    Summe und Anzahl der Messungen, damit verdichtete Zeilen exakt zusammengeführt werden können.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inbox_snapshots (
+            resolution INTEGER NOT NULL,
+            project_id TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            count_sum INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            min_count INTEGER NOT NULL,
+            max_count INTEGER NOT NULL,
+            PRIMARY KEY (resolution, project_id, bucket, ts)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_inbox_snapshots_series
+        ON inbox_snapshots (project_id, bucket, ts)
+    ''')
+
+def age_bucket_labels(buckets):
+    """
+    Bezeichnungen der Altersgruppen, z.B. ['0-7', '8-30', '31-90', '>90'].
+    Entsprechen denen aus inbox_history.count_tasks_by_age.
+    """
+    labels = []
+    lower = 0
+    for upper in buckets:
+        labels.append(f"{lower}-{upper}")
+        lower = upper + 1
+    labels.append(f">{buckets[-1]}")
+    return labels
+
+def age_bucket_sql(expression, buckets):
+    """
+    Baut einen CASE-Ausdruck, der ein Alter in Tagen einer Altersgruppe zuordnet.
+    """
+    labels = age_bucket_labels(buckets)
+    cases = [f"WHEN {expression} <= {int(upper)} THEN '{label}'" for label, upper in zip(labels, buckets)]
+    return f"CASE {' '.join(cases)} ELSE '{labels[-1]}' END"
+
+def period_start_sql(ts, period):
+    """
+    SQL-Ausdruck für den Beginn des Zeitraums, in den ts fällt.
+    """
+    return f'''CASE WHEN {period} = {WEEK} THEN (({ts} - {WEEK_OFFSET}) / {period}) * {period} + {WEEK_OFFSET}
+                    WHEN {period} > 0 THEN ({ts} / {period}) * {period}
+                    ELSE {ts} END'''
+
+# --------------------------
+# Schreiben
+# --------------------------
+def record_snapshot(cursor, project_id, buckets, now=None):
+    """
+    Schreibt einen Snapshot des aktuellen Posteingangs (Gesamtzahl und Anzahl je
+    Altersgruppe) und verdichtet anschließend ältere Snapshots.
+    Die Zählung läuft in SQL über die Tabelle task_state, leere Altersgruppen werden mit 0 gespeichert.
+    """
+    now = int(now if now is not None else clock.timestamp())
+
+    counts = count_by_age(cursor, buckets, now)
+    counts[TOTAL_BUCKET] = sum(counts.values())
+
+    write_snapshot_counts(cursor, project_id, counts, now)
+    rollup_snapshots(cursor, now)
+
+def count_by_age(cursor, buckets, now=None):
+    """
+    Zählt die Tasks in task_state je Altersgruppe (Tage seit der letzten Änderung) per GROUP BY.
+    Gibt {Altersgruppe: Anzahl} wie inbox_history.count_tasks_by_age zurück, leere Gruppen mit 0.
+    """
+    now = int(now if now is not None else clock.timestamp())
+    counts = dict.fromkeys(age_bucket_labels(buckets), 0)
+    cursor.execute(f'''
+        SELECT {age_bucket_sql("age", buckets)} AS bucket, COUNT(*)
+        FROM (SELECT (? - last_changed_at) / {DAY} AS age FROM task_state)
+        GROUP BY bucket
+    ''', (now,))
+    counts.update(cursor.fetchall())
+    return counts
+
+def write_snapshot_counts(cursor, project_id, counts, now):
+    """
+    Schreibt bereits gezählte Werte {Altersgruppe bzw. total: Anzahl} als Rohdaten-Snapshot.
+    Für Speicher-Engines, die außerhalb von SQLite zählen (siehe storage.MemoryStore).
+    """
+    cursor.executemany(f'''
+        INSERT OR REPLACE INTO inbox_snapshots
+            (resolution, project_id, bucket, ts, count_sum, samples, min_count, max_count)
+        VALUES ({RAW}, ?, ?, ?, ?, 1, ?, ?)
+    ''', [(project_id, bucket, int(now), n, n, n) for bucket, n in counts.items()])
+
+def rollup_snapshots(cursor, now=None):
+    """
+    Verdichtet Snapshots, die älter als ihre Aufbewahrungszeit sind, in die nächst
+    gröbere Auflösung und löscht Wochenwerte nach WEEK_RETENTION.
+    Es werden nur die abgelaufenen Zeilen angefasst.
+    """
+    now = int(now if now is not None else clock.timestamp())
+
+    for source, target, retention in ROLLUPS:
+        cutoff = now - retention
+        cursor.execute(f'''
+            INSERT INTO inbox_snapshots
+                (resolution, project_id, bucket, ts, count_sum, samples, min_count, max_count)
+            SELECT ?, project_id, bucket, {period_start_sql('ts', target)} AS period_start,
+                   SUM(count_sum), SUM(samples), MIN(min_count), MAX(max_count)
+            FROM inbox_snapshots
+            WHERE resolution = ? AND ts < ?
+            GROUP BY project_id, bucket, period_start
+            ON CONFLICT (resolution, project_id, bucket, ts) DO UPDATE SET
+                count_sum = count_sum + excluded.count_sum,
+                samples = samples + excluded.samples,
+                min_count = MIN(min_count, excluded.min_count),
+                max_count = MAX(max_count, excluded.max_count)
+        ''', (target, source, cutoff))
+        cursor.execute('DELETE FROM inbox_snapshots WHERE resolution = ? AND ts < ?', (source, cutoff))
+
+    cursor.execute('DELETE FROM inbox_snapshots WHERE resolution = ? AND ts < ?',
+                   (WEEK, now - WEEK_RETENTION))
+
+# --------------------------
+# Abfragen
+# --------------------------
+def query_trend(cursor, resolution, since_ts, bucket=TOTAL_BUCKET, project_id=None):
+    """
+    Liefert den Verlauf (Beginn, Durchschnitt, Minimum, Maximum, Messungen) je Zeitraum.
+    Zeilen feinerer Auflösung werden auf die gewünschte Auflösung zusammengefasst,
+    gröbere Zeilen (ältere Daten) bleiben in ihrer eigenen Auflösung.
+    Der Aufwand hängt damit von der Anzahl der Zeiträume ab, nicht von der Anzahl der Syncs.
+    Ohne project_id werden die Messungen aller Projekte gemeinsam gemittelt.
+    """
+    project_filter = "AND project_id = ?" if project_id is not None else ""
+    params = [resolution, bucket, since_ts] + ([project_id] if project_id is not None else [])
+
+    return cursor.execute(f'''
+        SELECT {period_start_sql('ts', 'period')} AS period_start,
+               SUM(count_sum) * 1.0 / SUM(samples) AS avg_count,
+               MIN(min_count) AS min_count,
+               MAX(max_count) AS max_count,
+               SUM(samples) AS samples
+        FROM (
+            SELECT ts, count_sum, samples, min_count, max_count, MAX(resolution, ?) AS period
+            FROM inbox_snapshots
+            WHERE bucket = ? AND ts >= ? {project_filter}
+        )
+        GROUP BY period_start
+        ORDER BY period_start
+    ''', params)
@@ -1,12 +1,5 @@
-import requests
-import json
-from datetime import datetime
-
-# --------------------------
-# Konfiguration
-# --------------------------
-API_TOKEN = "391abfcd2e31d30fe065d9d96d4478144ca21891"
-HEADERS = {"Authorization": f"Bearer {API_TOKEN}"}
+from inbox_history import default_headers
+from todoist_api import api_get, PRIORITY_INTERACTIVE
 
 def get_projects():
     """
@@ -14,7 +7,9 @@ def get_projects():
     """
     url = "https://api.todoist.com/rest/v2/projects"
     try:
-        response = requests.get(url, headers=HEADERS)
+        response = api_get(url, default_headers(), priority=PRIORITY_INTERACTIVE)
+        if response is None:
+            return []
         if response.status_code == 200:
             return response.json()
         else:
@@ -61,7 +56,10 @@ def get_inbox_todos():
     params = {'project_id': inbox_id}
     
     try:
-        response = requests.get(url, headers=HEADERS, params=params)
+        response = api_get(url, default_headers(), params=params, priority=PRIORITY_INTERACTIVE)
+        if response is None:
+            print("Rate-Limit erreicht, bitte später erneut versuchen.")
+            return
         if response.status_code != 200:
             print(f"Fehler beim Abrufen der Aufgaben: {response.status_code}")
             return
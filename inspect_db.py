@@ -1,45 +1,81 @@
 import sqlite3
-from datetime import datetime
+from itertools import islice
+
+from task_snapshot import open_snapshot, snapshot_path_for, local_time
 
 DB_PATH = "tasks_history.db"
 
-def inspect_database():
+def inspect_database(db_path=DB_PATH):
     """
     Zeigt den Inhalt der Datenbank an.
     """
     print("DATENBANK-INSPEKTION")
     print("=" * 50)
     
-    conn = sqlite3.connect(DB_PATH)
+    # Vom Sync veröffentlichter Snapshot, solange er zur Datenbank passt - ohne alle Zeilen zu laden
+    snapshot = open_snapshot(snapshot_path_for(db_path), db_path)
+    if snapshot is not None:
+        with snapshot:
+            inspect_snapshot(snapshot)
+        return
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        inspect_sqlite(conn)
+    finally:
+        conn.close()
+
+def inspect_sqlite(conn):
+    """
+    Wie inspect_snapshot, aber direkt aus task_state.
+    """
     cursor = conn.cursor()
     
     # Anzahl Tasks
-    cursor.execute('SELECT COUNT(*) FROM tasks')
+    cursor.execute('SELECT COUNT(*) FROM task_state')
     count = cursor.fetchone()[0]
     print(f"Gesamt Anzahl Tasks in DB: {count}")
     
     # Erste 5 Tasks anzeigen
     print(f"\nErste 5 Tasks:")
-    cursor.execute('SELECT task_id, task_name, first_seen, last_changed FROM tasks LIMIT 5')
+    cursor.execute('SELECT task_id, task_name, first_seen_at, last_changed_at FROM task_state ORDER BY task_id LIMIT 5')
     tasks = cursor.fetchall()
     
     for task in tasks:
         task_id, name, first_seen, last_changed = task
         print(f"  ID: {task_id}")
         print(f"  Name: {name}")
-        print(f"  Erstellt: {first_seen}")
-        print(f"  Geändert: {last_changed}")
+        print(f"  Erstellt: {local_time(first_seen)}")
+        print(f"  Geändert: {local_time(last_changed)}")
         print("  ---")
     
-    # Datum-Statistiken
+    # Datum-Statistiken (Tage in Ortszeit, wie in der Sicht tasks)
     print(f"\nDatum-Statistiken:")
     cursor.execute('SELECT first_seen, COUNT(*) as count FROM tasks GROUP BY first_seen ORDER BY first_seen')
     date_stats = cursor.fetchall()
     
     for date_str, count in date_stats:
         print(f"  {date_str}: {count} Tasks")
+
+def inspect_snapshot(snapshot):
+    """
+    Wie inspect_database, aber aus dem gemappten Task-Snapshot.
+    """
+    print(f"Quelle: {snapshot}")
+    print(f"Gesamt Anzahl Tasks in DB: {len(snapshot)}")
     
-    conn.close()
+    print(f"\nErste 5 Tasks:")
+    for task_id in islice(snapshot, 5):
+        task = snapshot[task_id]
+        print(f"  ID: {task_id}")
+        print(f"  Name: {task['name']}")
+        print(f"  Erstellt: {local_time(task['first_seen'])}")
+        print(f"  Geändert: {local_time(task['last_changed'])}")
+        print("  ---")
+    
+    print(f"\nDatum-Statistiken:")
+    for date_str, count in snapshot.count_by_first_seen().items():
+        print(f"  {date_str}: {count} Tasks")
 
 if __name__ == "__main__":
     inspect_database()
@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# --------------------------
+# Konfiguration
+# --------------------------
+DEFAULT_SIZE = 100000
+DEFAULT_CHURN = 0.05
+DEFAULT_SEED = 42
+
+# Speicher-Budget für einen vollständigen Sync von DEFAULT_SIZE Tasks in MB
+# (tracemalloc_peak: Python-Allokationen, max_rss: Spitzenwert des ganzen Prozesses)
+BUDGETS_MB = {
+    'tracemalloc_peak': 30,
+    'max_rss': 110,
+}
+
+MODES = ('records', 'dicts')
+
+# --------------------------
+# Messung im Kindprozess
+# --------------------------
+def peak_rss_mb():
+    """
+    Höchster Arbeitsspeicher des aktuellen Prozesses in MB.
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows: kein resource-Modul
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux liefert KB, macOS Bytes
+    return usage / 1024 ** 2 if sys.platform == "darwin" else usage / 1024
+
+def sync_with_dicts():
+    """
+    Der frühere Ablauf zum Vergleich: vollständiges JSON, db_tasks mit allen Spalten.
+    """
+    import inbox_history
+
+    todoist_tasks = inbox_history.get_inbox_todos()
+    db_tasks = inbox_history.get_db_tasks()
+    new_tasks, renamed_tasks, deleted_task_ids = inbox_history.compute_sync_diff(todoist_tasks, db_tasks)
+    outcomes = inbox_history.classify_disappeared_tasks(
+        deleted_task_ids, inbox_history.disappeared_since(deleted_task_ids, db_tasks)
+    )
+    inbox_history.apply_sync_diff(new_tasks, renamed_tasks, deleted_task_ids, outcomes=outcomes)
+
+def run_child(mode, trace, db_path, base_url, sync_url):
+    """
+    Führt einen Sync aus und gibt den Speicherbedarf als JSON auf stdout aus.
+    """
+    import contextlib
+    import tracemalloc
+
+    import inbox_history
+
+    inbox_history.DB_PATH = db_path
+    inbox_history.API_BASE_URL = base_url
+    inbox_history.SYNC_API_URL = sync_url
+
+    if trace:
+        tracemalloc.start()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if mode == 'records':
+            inbox_history.sync_tasks()
+        else:
+            sync_with_dicts()
+
+    result = {'max_rss': round(peak_rss_mb(), 1)}
+    if trace:
+        result['tracemalloc_peak'] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 1)
+        tracemalloc.stop()
+    print(json.dumps(result))
+
+# --------------------------
+# Steuerung
+# --------------------------
+def measure(mode, trace, pristine_db, work_db, server):
+    shutil.copyfile(pristine_db, work_db)
+    command = [sys.executable, os.path.abspath(__file__), "--child", mode,
+               "--db", work_db, "--base-url", server.base_url, "--sync-url", server.sync_url]
+    if trace:
+        command.append("--trace")
+    result = subprocess.run(command, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"Messung ({mode}) fehlgeschlagen:\n{result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def run_memory_benchmark(size, churn, seed, modes):
+    """
+    Legt eine Datenbank mit size Tasks an, liefert den geänderten Posteingang über
+    den Fake-Server aus und misst je Modus einmal mit tracemalloc (Python-Allokationen)
+    und einmal ohne (RSS, ohne den Overhead von tracemalloc).
+    """
+    from benchmark import FakeTodoistServer, generate_inbox, apply_churn, load_database
+
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix="todoist_memory_")
+    try:
+        pristine_db = os.path.join(workdir, "pristine.db")
+        work_db = os.path.join(workdir, "work.db")
+        tasks = generate_inbox(size, rng)
+        load_database(pristine_db, tasks, rng)
+        churned_tasks = apply_churn(tasks, churn, rng)
+        del tasks
+
+        results = {}
+        with FakeTodoistServer() as server:
+            server.set_tasks(churned_tasks)
+            for mode in modes:
+                results[mode] = measure(mode, False, pristine_db, work_db, server)
+                results[mode].update(measure(mode, True, pristine_db, work_db, server))
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# --------------------------
+# Hauptprogramm
+# --------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speicherbedarf eines Syncs mit großem Posteingang")
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE, help="Anzahl Tasks")
+    parser.add_argument("--churn", type=float, default=DEFAULT_CHURN, help="Anteil geänderter Tasks")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES),
+                        help="records = aktueller Sync, dicts = früherer Ablauf zum Vergleich")
+    parser.add_argument("--json", help="Ergebnisse zusätzlich als JSON speichern")
+    # Interne Optionen für den Kindprozess
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--trace", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--sync-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.trace, args.db, args.base_url, args.sync_url)
+        sys.exit(0)
+
+    print(f"Speicher-Benchmark: {args.size} Tasks, Churn {args.churn:.0%}")
+    results = run_memory_benchmark(args.size, args.churn, args.seed, args.modes)
+
+    # Das Budget gilt für DEFAULT_SIZE - bei anderen Größen wird nur berichtet
+    check = args.size == DEFAULT_SIZE and 'records' in results
+    ok = True
+    print(f"{'Modus':<10} {'tracemalloc':>12} {'max RSS':>10}")
+    print("-" * 36)
+    for mode, result in results.items():
+        print(f"{mode:<10} {result['tracemalloc_peak']:>9.1f} MB {result['max_rss']:>7.1f} MB")
+    if check:
+        for name, budget in BUDGETS_MB.items():
+            value = results['records'][name]
+            status = "OK" if value <= budget else "ÜBERSCHRITTEN"
+            ok = ok and value <= budget
+            print(f"Budget {name}: {value:.1f} / {budget} MB - {status}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'size': args.size, 'churn': args.churn, 'results': results}, f, indent=2)
+
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,202 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import todoist_api
+
+# --------------------------
+# Konfiguration
+# --------------------------
+METRICS_HOST = "127.0.0.1"  # Nur lokal erreichbar
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# --------------------------
+# Metrik-Typen
+# --------------------------
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+class Counter:
+    """
+    Monoton steigender Zähler mit optionalen Labels.
+    """
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(key)} {value}")
+        return lines
+
+class Histogram:
+    """
+    Histogramm mit festen Buckets (kumulativ wie bei Prometheus).
+    """
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}  # Labels -> [Bucket-Zähler, Summe, Anzahl]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (bucket_counts, total, count) in sorted(self.series.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    lines.append(f"{self.name}_bucket{format_labels(key + (('le', bound),))} {bucket_count}")
+                lines.append(f"{self.name}_bucket{format_labels(key + (('le', '+Inf'),))} {count}")
+                lines.append(f"{self.name}_sum{format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{format_labels(key)} {count}")
+        return lines
+
+# --------------------------
+# Exporter
+# --------------------------
+class MetricsExporter:
+    """
+    Sammelt Sync-Metriken und stellt sie unter /metrics im Prometheus-Textformat bereit.
+    Die Hooks in Recorder und API-Client werden erst bei start() registriert,
+    ohne Exporter entsteht also kein Zusatzaufwand.
+    """
+
+    def __init__(self, port, host=METRICS_HOST, age_source=None):
+        self.port = port
+        self.host = host
+        self.age_source = age_source  # Callable -> {Altersgruppe: Anzahl}
+        self.httpd = None
+        self.recorder = None
+
+        self.sync_duration = Histogram("todoist_sync_duration_seconds", "Dauer eines Sync-Zyklus")
+        self.db_write_duration = Histogram("todoist_db_write_duration_seconds", "Dauer der DB-Schreibphase")
+        self.render_duration = Histogram("todoist_render_duration_seconds", "Dauer der Render-Phase")
+        self.sync_cycles = Counter("todoist_sync_cycles_total", "Anzahl Sync-Zyklen")
+        self.sync_errors = Counter("todoist_sync_errors_total", "Anzahl fehlgeschlagener Sync-Zyklen")
+        self.task_changes = Counter("todoist_task_changes_total", "Task-Änderungen beim Sync")
+        self.bytes_transferred = Counter("todoist_api_bytes_total", "Von der API übertragene Bytes")
+        self.api_requests = Counter("todoist_api_requests_total", "API-Requests nach HTTP-Status")
+        self.api_errors = Counter("todoist_api_errors_total", "Fehlgeschlagene API-Requests")
+        self.api_rate_limited = Counter("todoist_api_rate_limited_total", "Antworten mit HTTP 429")
+
+    def observe_cycle(self, cycle):
+        """
+        Listener für MetricsRecorder: übernimmt einen abgeschlossenen Sync-Zyklus.
+        """
+        self.sync_duration.observe(cycle.total, source=cycle.source)
+        self.db_write_duration.observe(cycle.phases.get('write', 0.0), source=cycle.source)
+        self.render_duration.observe(cycle.phases.get('render', 0.0), source=cycle.source)
+        self.sync_cycles.inc(source=cycle.source)
+        if cycle.error:
+            self.sync_errors.inc(source=cycle.source)
+        for change in ('added', 'renamed', 'deleted'):
+            self.task_changes.inc(cycle.counters.get(f"tasks_{change}", 0), change=change)
+        self.bytes_transferred.inc(cycle.counters.get('bytes_transferred', 0))
+
+    def observe_response(self, response, error):
+        """
+        Hook für todoist_api.api_get: zählt Requests, Fehler und HTTP 429.
+        """
+        if error is not None:
+            self.api_errors.inc(reason=type(error).__name__)
+            return
+        self.api_requests.inc(status=response.status_code)
+        if response.status_code == 429:
+            self.api_rate_limited.inc()
+        elif response.status_code >= 400:
+            self.api_errors.inc(reason=f"http_{response.status_code}")
+
+    def render_age_buckets(self):
+        lines = [
+            "# HELP todoist_inbox_tasks Tasks im Posteingang nach Tagen seit der letzten Änderung",
+            "# TYPE todoist_inbox_tasks gauge",
+        ]
+        if self.age_source is not None:
+            try:
+                for bucket, value in self.age_source().items():
+                    lines.append(f'todoist_inbox_tasks{{age="{bucket}"}} {value}')
+            except Exception as e:
+                print(f"Warnung: Altersverteilung nicht verfügbar: {e}")
+        return lines
+
+    def render(self):
+        """
+        Erzeugt den kompletten Metrik-Text.
+        """
+        lines = []
+        for metric in (self.sync_duration, self.db_write_duration, self.render_duration,
+                       self.sync_cycles, self.sync_errors, self.task_changes,
+                       self.bytes_transferred, self.api_requests, self.api_errors,
+                       self.api_rate_limited):
+            lines.extend(metric.render())
+        lines.extend(self.render_age_buckets())
+        return "\n".join(lines) + "\n"
+
+    def start(self, recorder=None):
+        """
+        Startet den HTTP-Server in einem Daemon-Thread und registriert die Hooks.
+        """
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+
+        if recorder is not None:
+            recorder.listeners.append(self.observe_cycle)
+            self.recorder = recorder
+        todoist_api.RESPONSE_HOOKS.append(self.observe_response)
+
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        print(f"Metriken verfügbar unter http://{self.host}:{self.httpd.server_address[1]}/metrics")
+        return self
+
+    def stop(self):
+        """
+        Entfernt die Hooks und beendet den HTTP-Server.
+        """
+        if self.recorder is not None and self.observe_cycle in self.recorder.listeners:
+            self.recorder.listeners.remove(self.observe_cycle)
+        if self.observe_response in todoist_api.RESPONSE_HOOKS:
+            todoist_api.RESPONSE_HOOKS.remove(self.observe_response)
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
@@ -0,0 +1,485 @@
+import argparse
+import contextlib
+import io
+import json
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qsl
+
+import clock
+import inbox_history
+import todoist_api
+from accounts import offline_token
+from clock import SimulatedClock, use_clock
+from inbox_history import (get_inbox_records, compute_record_diff, classify_disappeared_tasks,
+                           find_stale_tasks, count_tasks_by_age, COMPLETED_PAGE_SIZE)
+from storage import open_store, ENGINES
+from sync_metrics import MetricsRecorder, phase, count, PHASES
+from widget_layout import TaskLayout, TaskRowCache, FontMetrics, format_task_lines
+
+# --------------------------
+# Konfiguration
+# --------------------------
+DEFAULT_INTERVAL = 300  # Sekunden zwischen zwei simulierten Syncs (wie UPDATE_INTERVAL im Widget)
+DEFAULT_DAYS = 90
+DEFAULT_SEED = 42
+VOLATILE_PARAMS = ('since',)  # Hängt vom Datenbankstand ab - beim Zuordnen ignoriert
+RECORDED_HEADERS = ('Content-Type', 'Retry-After')
+CHAR_WIDTH = 7  # Feste Zeichenbreite der Schrift beim Rendern ohne Tk
+TEXT_WIDTH_PX = 480
+MAX_REPORTED_ERRORS = 10  # Höchstens so viele Fehler im Bericht ausgeben
+
+# --------------------------
+# Kassetten
+# --------------------------
+def request_key(method, url, params=None):
+    """
+    Schlüssel, unter dem eine Antwort abgespielt wird: Methode, Pfad der URL und
+    alle Parameter (aus URL und params) außer VOLATILE_PARAMS, sortiert. Der Host
+    zählt nicht - Aufnahmen gegen einen Testserver lassen sich ebenso abspielen.
+    """
+    parts = urlsplit(url)
+    pairs = parse_qsl(parts.query)
+    if params:
+        pairs += [(key, str(value)) for key, value in dict(params).items()]
+    pairs = tuple(sorted((key, value) for key, value in pairs if key not in VOLATILE_PARAMS))
+    return method.upper(), parts.path, pairs
+
+def interaction(at, method, url, params, status, body, headers=None):
+    """
+    Ein Eintrag der Kassette: Zeitpunkt (Unix-Zeit), Request und Antwort als Text.
+    """
+    return {
+        'at': at,
+        'method': method,
+        'url': url,
+        'params': sorted([key, str(value)] for key, value in (params or {}).items()),
+        'status': status,
+        'headers': headers or {'Content-Type': 'application/json'},
+        'body': body,
+    }
+
+def read_cassette(path):
+    """
+    Liest eine Kassette (eine Interaktion als JSON je Zeile) Eintrag für Eintrag.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def write_cassette(path, interactions):
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in interactions:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            written += 1
+    return written
+
+class CassetteRecorder:
+    """
+    Schreibt jede Antwort der Todoist-API (über todoist_api.RESPONSE_HOOKS) in eine Kassette.
+    Request-Header - und damit das Token - werden nicht gespeichert.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.recorded = 0
+
+    def __call__(self, response, error):
+        if response is None:
+            return
+        request = response.request
+        parts = urlsplit(request.url)
+        headers = {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers}
+        # Bei stream=True lädt .content den Body - iter_content liefert danach dieselben Daten
+        entry = interaction(clock.timestamp(), request.method, f"{parts.scheme}://{parts.netloc}{parts.path}",
+                            dict(parse_qsl(parts.query)), response.status_code,
+                            response.content.decode("utf-8", errors="replace"), headers)
+        with self.lock:
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.file.flush()
+            self.recorded += 1
+
+    def install(self):
+        todoist_api.RESPONSE_HOOKS.append(self)
+        return self
+
+    def close(self):
+        if self in todoist_api.RESPONSE_HOOKS:
+            todoist_api.RESPONSE_HOOKS.remove(self)
+        with self.lock:
+            self.file.close()
+
+# --------------------------
+# Abspielen
+# --------------------------
+class ReplayResponse:
+    """
+    Antwort aus der Kassette mit dem Teil der requests.Response, den die Sync-Pfade nutzen.
+    """
+
+    def __init__(self, status_code, body, headers=None, url=""):
+        self.status_code = status_code
+        self.content = body.encode("utf-8")
+        self.headers = headers or {}
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size or len(self.content) or 1):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+class CassetteTransport:
+    """
+    Ersatz für requests.request (todoist_api.TRANSPORT). begin() übergibt die
+    Interaktionen eines Sync-Zyklus; gleiche Requests werden in aufgezeichneter
+    Reihenfolge beantwortet. Fehlt eine Antwort im Zyklus, gilt die letzte aus
+    früheren Zyklen (z.B. /projects), sonst HTTP 404 (gezählt in misses).
+    """
+
+    def __init__(self):
+        self.queues = {}
+        self.last = {}
+        self.calls = 0
+        self.misses = 0
+        self.unused = 0
+
+    def begin(self, interactions):
+        self.unused += sum(len(queue) for queue in self.queues.values())
+        self.queues = {}
+        for entry in interactions:
+            key = request_key(entry['method'], entry['url'], dict(entry.get('params') or ()))
+            self.queues.setdefault(key, deque()).append(entry)
+
+    def __call__(self, method, url, headers=None, params=None, data=None, stream=False):
+        self.calls += 1
+        key = request_key(method, url, params)
+        queue = self.queues.get(key)
+        if queue:
+            entry = self.last[key] = queue.popleft()
+        else:
+            entry = self.last.get(key)
+        if entry is None:
+            self.misses += 1
+            return ReplayResponse(404, '{"error": "nicht in der Kassette"}', url=url)
+        return ReplayResponse(entry['status'], entry['body'], entry.get('headers'), url)
+
+def split_cycles(interactions):
+    """
+    Teilt eine Kassette in Sync-Zyklen. Jeder Zyklus (Widget wie inbox_history)
+    beginnt mit dem Abruf von /projects.
+    """
+    cycle = []
+    for entry in interactions:
+        if cycle and entry['url'].endswith("/projects"):
+            yield cycle
+            cycle = []
+        cycle.append(entry)
+    if cycle:
+        yield cycle
+
+@contextlib.contextmanager
+def replaying(transport, sim_clock):
+    """
+    Leitet alle API-Aufrufe auf transport um, schaltet das Rate-Limit ab und setzt die Uhr.
+    """
+    original = todoist_api.TRANSPORT, todoist_api.RATE_LIMIT
+    todoist_api.TRANSPORT, todoist_api.RATE_LIMIT = transport, False
+    try:
+        # Abgespielt wird ohne echte API - ein Token-Platzhalter genügt
+        with use_clock(sim_clock), offline_token():
+            yield
+    finally:
+        todoist_api.TRANSPORT, todoist_api.RATE_LIMIT = original
+
+class MonospaceFont:
+    """
+    Schrift mit fester Zeichenbreite für FontMetrics, damit ohne Tk gerendert werden kann.
+    """
+
+    def metrics(self, name):
+        return 15
+
+    def measure(self, text):
+        return CHAR_WIDTH * len(text)
+
+def run_cycle(store, row_cache):
+    """
+    Ein Sync-Zyklus wie im Widget: Posteingang laden, abgleichen, verschwundene
+    Tasks klassifizieren, schreiben und die Zeilen rendern.
+    Gibt die Anzeigezeilen zurück oder None, wenn der Posteingang nicht geladen werden konnte.
+    """
+    records = get_inbox_records()
+    if records is None:
+        return None
+    with phase('diff'):
+        new_tasks, renamed_tasks, deleted = compute_record_diff(records, store.load_names())
+    outcomes = classify_disappeared_tasks(deleted, store.disappeared_since(deleted))
+    with phase('write'):
+        store.apply_diff(new_tasks, renamed_tasks, list(deleted), outcomes=outcomes)
+    count('tasks_added', len(new_tasks))
+    count('tasks_renamed', len(renamed_tasks))
+    count('tasks_deleted', len(deleted))
+
+    row_cache.invalidate(task_id for task_id, _ in renamed_tasks)
+    row_cache.invalidate(deleted)
+    with phase('render'):
+        return format_task_lines(records, row_cache, store.load_tasks)
+
+def replay(cycles, store=None, on_cycle=None):
+    """
+    Spielt Sync-Zyklen (Listen von Interaktionen, z.B. aus split_cycles oder
+    synthetic_timeline) mit simulierter Uhr gegen store ab (ohne: In-Memory-Engine).
+    Die Uhr springt je Zyklus auf den Zeitpunkt seiner ersten Interaktion.
+    on_cycle(Uhr, store, Zeilen) wird nach jedem Zyklus aufgerufen.
+    Gibt einen Bericht als Dictionary zurück.
+    """
+    store = store if store is not None else open_store('memory')
+    transport = CassetteTransport()
+    sim_clock = SimulatedClock(0)
+    metrics = MetricsRecorder(None, capacity=1)
+    layout = TaskLayout(FontMetrics(MonospaceFont()), TEXT_WIDTH_PX)
+    row_cache = TaskRowCache(layout)
+
+    totals = dict.fromkeys(PHASES, 0.0)
+    counters = {}
+
+    def accumulate(cycle):
+        for name, seconds in cycle.phases.items():
+            totals[name] = totals.get(name, 0.0) + seconds
+        for name, value in cycle.counters.items():
+            counters[name] = counters.get(name, 0) + value
+
+    metrics.listeners.append(accumulate)
+
+    done = failed = 0
+    errors = []  # (Zyklus, simulierte Zeit, Meldung) der fehlgeschlagenen Zyklen
+    first_at = last_at = None
+    started = time.perf_counter()
+    with replaying(transport, sim_clock):
+        store.init()
+        for interactions in cycles:
+            transport.begin(interactions)
+            sim_clock.set(interactions[0]['at'])
+            first_at = first_at if first_at is not None else interactions[0]['at']
+            last_at = interactions[0]['at']
+
+            cycle = metrics.start("replay")
+            error = None
+            try:
+                lines = run_cycle(store, row_cache)
+                if lines is None:
+                    failed += 1
+                    errors.append((done + 1, sim_clock.now().isoformat(timespec='seconds'),
+                                   "Posteingang konnte nicht geladen werden"))
+                elif on_cycle:
+                    on_cycle(sim_clock, store, lines)
+            except Exception as e:
+                error = e
+                failed += 1
+                errors.append((done + 1, sim_clock.now().isoformat(timespec='seconds'), str(e)))
+            finally:
+                metrics.finish(cycle, error)
+            done += 1
+
+        elapsed = time.perf_counter() - started
+        tasks = store.load_tasks()
+        report = {
+            'cycles': done,
+            'failed': failed,
+            'errors': errors,
+            'elapsed_s': round(elapsed, 3),
+            'cycles_per_s': round(done / elapsed, 1) if elapsed else None,
+            'simulated_from': datetime.fromtimestamp(first_at).isoformat(timespec='seconds') if done else None,
+            'simulated_to': datetime.fromtimestamp(last_at).isoformat(timespec='seconds') if done else None,
+            'requests': transport.calls,
+            'misses': transport.misses,
+            'unused': transport.unused + sum(len(queue) for queue in transport.queues.values()),
+            'tasks': len(tasks),
+            'stale_tasks': len(find_stale_tasks(tasks)),
+            'age_buckets': count_tasks_by_age(tasks),
+            'phase_ms': {name: round(seconds * 1000, 1) for name, seconds in totals.items()},
+            'counters': counters,
+        }
+    return report
+
+# --------------------------
+# Synthetische Zeitleisten
+# --------------------------
+def synthetic_timeline(days=DEFAULT_DAYS, interval=DEFAULT_INTERVAL, start=None, seed=DEFAULT_SEED,
+                       initial_tasks=40, adds_per_day=8.0, completions_per_day=7.0, renames_per_day=1.0):
+    """
+    Erzeugt Sync-Zyklen mit gleichmäßigem Churn, ohne etwas aufzuzeichnen:
+    alle interval Sekunden /projects, den Posteingang und - falls Tasks erledigt
+    wurden - /completed/get_all. Die Zyklen entstehen erst beim Iterieren.
+    Seltene Umbenennungen lassen Tasks altern, damit die 30-Tage-Auswertung etwas findet.
+    """
+    from benchmark import WORDS, INBOX_PROJECT_ID
+
+    rng = random.Random(seed)
+    at = float(start if start is not None else clock.timestamp() - days * 86400)
+    next_id = 20_000_000
+    inbox = {}
+
+    def new_task():
+        nonlocal next_id
+        next_id += 1
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+        inbox[next_id] = {'id': str(next_id), 'content': content, 'project_id': INBOX_PROJECT_ID, 'priority': 1}
+
+    def events(per_day):
+        # Erwartungswert je Zyklus, Nachkommaanteil als Wahrscheinlichkeit
+        expected = per_day * interval / 86400
+        return int(expected) + (rng.random() < expected - int(expected))
+
+    for _ in range(initial_tasks):
+        new_task()
+    projects_body = json.dumps([{'id': INBOX_PROJECT_ID, 'name': "Inbox", 'is_inbox_project': True}])
+    tasks_url = f"{inbox_history.API_BASE_URL}/tasks"
+
+    for _ in range(int(days * 86400 // interval)):
+        completed = []
+        for _ in range(min(events(completions_per_day), len(inbox))):
+            task_id = rng.choice(list(inbox))
+            completed.append({'task_id': str(task_id), 'project_id': INBOX_PROJECT_ID,
+                              'completed_at': datetime.fromtimestamp(at).strftime('%Y-%m-%dT%H:%M:%SZ')})
+            del inbox[task_id]
+        for _ in range(events(adds_per_day)):
+            new_task()
+        for _ in range(min(events(renames_per_day), len(inbox))):
+            task = inbox[rng.choice(list(inbox))]
+            task['content'] = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+
+        cycle = [
+            interaction(at, "GET", f"{inbox_history.API_BASE_URL}/projects", None, 200, projects_body),
+            interaction(at, "GET", tasks_url, {'project_id': INBOX_PROJECT_ID}, 200, json.dumps(list(inbox.values()))),
+        ]
+        if completed:
+            cycle.append(interaction(at, "GET", f"{inbox_history.SYNC_API_URL}/completed/get_all",
+                                     {'limit': COMPLETED_PAGE_SIZE, 'offset': 0}, 200,
+                                     json.dumps({'items': completed})))
+        yield cycle
+        at += interval
+
+# --------------------------
+# Ausgabe
+# --------------------------
+def print_report(report):
+    print("=" * 60)
+    print("REPLAY")
+    print("=" * 60)
+    print(f"Zyklen:          {report['cycles']} ({report['failed']} fehlgeschlagen)")
+    print(f"Simuliert:       {report['simulated_from']} bis {report['simulated_to']}")
+    print(f"Dauer:           {report['elapsed_s']:.2f} s ({report['cycles_per_s']} Zyklen/s)")
+    print(f"Requests:        {report['requests']} ({report['misses']} ohne Antwort, "
+          f"{report['unused']} Antworten nicht abgerufen)")
+    print(f"Tasks am Ende:   {report['tasks']} ({report['stale_tasks']} älter als {inbox_history.STALE_DAYS} Tage)")
+    print(f"Altersgruppen:   {report['age_buckets']}")
+    print(f"Änderungen:      {report['counters']}")
+    print("Phasen gesamt:   " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in report['phase_ms'].items() if ms))
+    for number, at, message in report['errors'][:MAX_REPORTED_ERRORS]:
+        print(f"Fehler in Zyklus {number} ({at}): {message}")
+    if len(report['errors']) > MAX_REPORTED_ERRORS:
+        print(f"... und {len(report['errors']) - MAX_REPORTED_ERRORS} weitere Fehler")
+
+# --------------------------
+# Kommandozeile
+# --------------------------
+def record(path, cycles, interval):
+    """
+    Nimmt echte Syncs gegen die Todoist-API auf. Geschrieben wird in eine leere
+    In-Memory-Engine - die Datenbank bleibt unverändert, und beim Abspielen
+    ergibt sich dieselbe Folge von Requests.
+    """
+    store = open_store('memory')
+    store.init()
+    recorder = CassetteRecorder(path).install()
+    try:
+        for i in range(cycles):
+            if i:
+                time.sleep(interval)
+            with contextlib.redirect_stdout(io.StringIO()):
+                inbox_history.sync_tasks(store)
+            print(f"Zyklus {i + 1}/{cycles} aufgenommen ({recorder.recorded} Antworten)")
+    finally:
+        recorder.close()
+
+def open_replay_store(engine, db_path):
+    if engine == 'sqlite':
+        if not db_path:
+            raise SystemExit("Für --engine sqlite bitte mit --db eine Kopie der Datenbank angeben.")
+        return open_store('sqlite', db_path)
+    # Ohne Backing - beim Abspielen wird nichts zurückgeschrieben
+    return open_store('memory')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync-Zyklen aufnehmen und mit simulierter Uhr abspielen")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Echte API-Antworten in eine Kassette aufnehmen")
+    record_parser.add_argument("cassette", help="Zieldatei (wird ergänzt)")
+    record_parser.add_argument("--cycles", type=int, default=1, help="Anzahl Syncs")
+    record_parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Sekunden zwischen den Syncs")
+
+    play_parser = subparsers.add_parser("play", help="Eine Kassette abspielen")
+    play_parser.add_argument("cassette", help="Kassette aus record, dem Widget oder simulate --save")
+    play_parser.add_argument("--engine", choices=ENGINES, default='memory', help="Speicher-Engine")
+    play_parser.add_argument("--db", help="Datenbank für --engine sqlite (wird verändert - Kopie verwenden)")
+    play_parser.add_argument("--show", action="store_true", help="Anzeige nach dem letzten Zyklus ausgeben")
+
+    simulate_parser = subparsers.add_parser("simulate", help="Synthetische Zeitleiste abspielen")
+    simulate_parser.add_argument("--days", type=float, default=DEFAULT_DAYS, help="Simulierte Tage")
+    simulate_parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Sekunden zwischen Syncs")
+    simulate_parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Seed für reproduzierbare Daten")
+    simulate_parser.add_argument("--tasks", type=int, default=40, help="Tasks im Posteingang zu Beginn")
+    simulate_parser.add_argument("--adds", type=float, default=8.0, help="Neue Tasks pro Tag")
+    simulate_parser.add_argument("--completions", type=float, default=7.0, help="Erledigte Tasks pro Tag")
+    simulate_parser.add_argument("--renames", type=float, default=1.0, help="Umbenennungen pro Tag")
+    simulate_parser.add_argument("--engine", choices=ENGINES, default='memory', help="Speicher-Engine")
+    simulate_parser.add_argument("--db", help="Datenbank für --engine sqlite (wird verändert - Kopie verwenden)")
+    simulate_parser.add_argument("--save", help="Zeitleiste zusätzlich als Kassette speichern statt abzuspielen")
+    simulate_parser.add_argument("--show", action="store_true", help="Anzeige nach dem letzten Zyklus ausgeben")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.cassette, args.cycles, args.interval)
+    else:
+        if args.command == "play":
+            cycles = split_cycles(read_cassette(args.cassette))
+        else:
+            cycles = synthetic_timeline(args.days, args.interval, seed=args.seed, initial_tasks=args.tasks,
+                                        adds_per_day=args.adds, completions_per_day=args.completions,
+                                        renames_per_day=args.renames)
+            if args.save:
+                written = write_cassette(args.save, (entry for cycle in cycles for entry in cycle))
+                print(f"{written} Interaktionen gespeichert: {args.save}")
+                raise SystemExit(0)
+
+        last_lines = []
+
+        def keep_lines(sim_clock, store, lines):
+            last_lines[:] = lines
+
+        store = open_replay_store(args.engine, args.db)
+        # Die Ausgaben der Sync-Funktionen je Zyklus unterdrücken - Fehler stehen im Bericht
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = replay(cycles, store, on_cycle=keep_lines)
+        print_report(report)
+        if args.show:
+            print()
+            print("".join(last_lines), end="")
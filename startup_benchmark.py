@@ -0,0 +1,117 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# --------------------------
+# Konfiguration
+# --------------------------
+# Importzeit-Budget je Einstiegspunkt in Millisekunden (kumulativ laut -X importtime)
+BUDGETS_MS = {
+    'inbox_history': 25,
+    'analytics': 30,
+    'sync_metrics': 20,
+    'inspect_db': 15,
+    'find_changes': 15,
+    'inbox_todos': 20,
+    'desktop_widget': 60,
+}
+
+# Module, die beim reinen Import eines Einstiegspunkts nicht geladen werden dürfen
+FORBIDDEN_IMPORTS = {
+    'inbox_history': ('requests', 'tkinter', 'psutil', 'cProfile'),
+    'analytics': ('requests', 'tkinter', 'psutil', 'cProfile'),
+    'sync_metrics': ('requests', 'cProfile'),
+    'inspect_db': ('requests',),
+    'find_changes': ('requests',),
+    'inbox_todos': ('requests', 'tkinter'),
+    'desktop_widget': ('requests', 'psutil'),
+}
+
+DEFAULT_RUNS = 5
+
+# --------------------------
+# Messung
+# --------------------------
+def measure_import(module):
+    """
+    Importiert ein Modul in einem frischen Interpreter mit -X importtime.
+    Gibt (kumulative Importzeit in ms, Menge aller geladenen Module) zurück.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import von {module} fehlgeschlagen:\n{result.stderr.strip()}")
+
+    cumulative_us = None
+    loaded = set()
+    for line in result.stderr.splitlines():
+        # Format: "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        loaded.add(name)
+        if name == module:
+            cumulative_us = int(parts[1])
+
+    if cumulative_us is None:
+        raise RuntimeError(f"Keine Importzeit für {module} gefunden")
+    return cumulative_us / 1000, loaded
+
+def run_startup_benchmark(modules, runs):
+    """
+    Misst jedes Modul runs-mal und vergleicht den Median mit dem Budget.
+    """
+    results = []
+    for module in modules:
+        timings = []
+        loaded = set()
+        for _ in range(runs):
+            elapsed_ms, loaded = measure_import(module)
+            timings.append(elapsed_ms)
+
+        median_ms = statistics.median(timings)
+        budget_ms = BUDGETS_MS.get(module)
+        forbidden = sorted(name for name in FORBIDDEN_IMPORTS.get(module, ()) if name in loaded)
+        results.append({
+            'module': module,
+            'median_ms': round(median_ms, 2),
+            'min_ms': round(min(timings), 2),
+            'budget_ms': budget_ms,
+            'forbidden_imports': forbidden,
+            'ok': (budget_ms is None or median_ms <= budget_ms) and not forbidden,
+        })
+    return results
+
+# --------------------------
+# Hauptprogramm
+# --------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startzeit-Benchmark der Einstiegspunkte (python -X importtime)")
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS_MS), help="Zu messende Module")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Messungen pro Modul")
+    parser.add_argument("--json", help="Ergebnisse zusätzlich als JSON speichern")
+    args = parser.parse_args()
+
+    results = run_startup_benchmark(args.modules, args.runs)
+
+    print(f"{'Modul':<16} {'Median':>9} {'Budget':>9}  Status")
+    print("-" * 50)
+    for result in results:
+        budget = f"{result['budget_ms']} ms" if result['budget_ms'] is not None else "-"
+        status = "OK" if result['ok'] else "ÜBERSCHRITTEN"
+        if result['forbidden_imports']:
+            status += f" (lädt {', '.join(result['forbidden_imports'])})"
+        print(f"{result['module']:<16} {result['median_ms']:>6.1f} ms {budget:>9}  {status}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    sys.exit(0 if all(result['ok'] for result in results) else 1)
@@ -0,0 +1,372 @@
+import sqlite3
+import threading
+from datetime import date
+
+import clock
+import inbox_history
+from inbox_history import (init_database, get_db_tasks, get_db_names, get_disappeared_since,
+                           apply_sync_diff, count_tasks_by_age, AGE_BUCKETS, SNAPSHOT_PROJECT)
+from inbox_snapshots import count_by_age, write_snapshot_counts, rollup_snapshots, TOTAL_BUCKET
+from duplicates import update_duplicate_index
+from task_snapshot import publish_snapshot, read_data_version
+
+# --------------------------
+# Konfiguration
+# --------------------------
+ENGINES = ('sqlite', 'memory')
+CHECKPOINT_INTERVAL = 300  # Sekunden zwischen zwei Checkpoints der In-Memory-Engine
+
+# --------------------------
+# Schnittstelle
+# --------------------------
+class TaskStore:
+    """
+    Gemeinsame Schnittstelle aller Speicher-Engines.
+    Ein Store liefert den aktuellen Stand der Tasks (Snapshot), übernimmt den Diff
+    eines Syncs und beantwortet Fragen nach der Historie (Ereignisse, Lebensdauern).
+    Tasks:     {task_id: {'name', 'first_seen', 'last_changed'}} wie get_db_tasks (Unix-Zeitstempel)
+    Ereignis:  (task_id, event, event_date, task_name, first_seen)
+    Lebensdauer: (task_id, task_name, outcome, first_seen, ended, lifetime_days, project_id)
+    """
+
+    name = None
+    snapshot_path = None
+    snapshot_generation = None  # zuletzt veröffentlichte Generation, None nach einem Fehler
+
+    def init(self):
+        pass
+
+    def load_tasks(self):
+        raise NotImplementedError
+
+    def load_names(self):
+        return {task_id: data['name'] for task_id, data in self.load_tasks().items()}
+
+    def disappeared_since(self, task_ids):
+        """
+        Frühestes first_seen der angegebenen Tasks (siehe inbox_history.disappeared_since).
+        """
+        tasks = self.load_tasks()
+        return min((tasks[task_id]['first_seen'] for task_id in task_ids if task_id in tasks), default=None)
+
+    def count_by_age(self):
+        """
+        Anzahl Tasks je Altersgruppe (AGE_BUCKETS) wie inbox_history.count_tasks_by_age.
+        """
+        return count_tasks_by_age(self.load_tasks(), AGE_BUCKETS)
+
+    def apply_diff(self, new_tasks, renamed_tasks, deleted_task_ids, outcomes=None):
+        """
+        Übernimmt alle Änderungen eines Syncs auf einmal und hängt einen Snapshot an
+        (Parameter wie inbox_history.apply_sync_diff).
+        """
+        raise NotImplementedError
+
+    def get_events(self, since=None, task_id=None):
+        raise NotImplementedError
+
+    def get_lifetimes(self, outcome=None):
+        raise NotImplementedError
+
+    def data_version(self):
+        """
+        Datenstand der Datenbank hinter der Engine (siehe task_snapshot.read_data_version), 0 ohne Datenbank.
+        """
+        return 0
+
+    def publish_snapshot(self):
+        """
+        Veröffentlicht den aktuellen Stand als gemappten Task-Snapshot für andere
+        Prozesse (siehe task_snapshot), sofern snapshot_path gesetzt ist.
+        Ein Fehler dabei lässt den Sync selbst unberührt.
+        """
+        if not self.snapshot_path:
+            return None
+        # Vor dem Laden gelesen: ändert sich die Datenbank dazwischen, gilt der Snapshot als veraltet
+        data_version = self.data_version()
+        rows = ((task_id, data['name'], data['first_seen'], data['last_changed'])
+                for task_id, data in sorted(self.load_tasks().items()))
+        try:
+            self.snapshot_generation = publish_snapshot(rows, self.snapshot_path, data_version)
+        except OSError as e:
+            print(f"Warnung: Task-Snapshot konnte nicht veröffentlicht werden: {e}")
+            self.snapshot_generation = None
+        return self.snapshot_generation
+
+    def close(self):
+        pass
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+# --------------------------
+# SQLite
+# --------------------------
+class SQLiteStore(TaskStore):
+    """
+    Engine für die SQLite-Datenbank, nutzt die Funktionen aus inbox_history.
+    Ohne db_path gilt inbox_history.DB_PATH zum Zeitpunkt des Aufrufs.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, db_path=None, snapshot_path=None):
+        self.db_path = db_path
+        self.snapshot_path = snapshot_path
+
+    def connect(self):
+        return sqlite3.connect(self.db_path or inbox_history.DB_PATH)
+
+    def init(self):
+        init_database(self.db_path)
+        self.publish_snapshot()
+
+    def load_tasks(self):
+        return get_db_tasks(self.db_path)
+
+    def load_names(self):
+        return get_db_names(self.db_path)
+
+    def disappeared_since(self, task_ids):
+        return get_disappeared_since(task_ids, self.db_path)
+
+    def data_version(self):
+        return read_data_version(self.db_path or inbox_history.DB_PATH) or 0
+
+    def count_by_age(self):
+        # Gezählt wird in SQLite, ohne die Tasks zu laden
+        conn = self.connect()
+        try:
+            return count_by_age(conn.cursor(), AGE_BUCKETS)
+        finally:
+            conn.close()
+
+    def apply_diff(self, new_tasks, renamed_tasks, deleted_task_ids, outcomes=None):
+        apply_sync_diff(new_tasks, renamed_tasks, deleted_task_ids, db_path=self.db_path, outcomes=outcomes)
+        self.publish_snapshot()
+
+    def get_events(self, since=None, task_id=None):
+        query = 'SELECT task_id, event, event_date, task_name, first_seen FROM task_events WHERE 1 = 1'
+        params = []
+        if since:
+            query += ' AND event_date >= ?'
+            params.append(since)
+        if task_id is not None:
+            query += ' AND task_id = ?'
+            params.append(task_id)
+        conn = self.connect()
+        try:
+            return conn.execute(query + ' ORDER BY event_date, id', params).fetchall()
+        finally:
+            conn.close()
+
+    def get_lifetimes(self, outcome=None):
+        query = '''SELECT task_id, task_name, outcome, first_seen, ended, lifetime_days, project_id
+                   FROM task_lifetimes'''
+        params = []
+        if outcome:
+            query += ' WHERE outcome = ?'
+            params.append(outcome)
+        conn = self.connect()
+        try:
+            return conn.execute(query + ' ORDER BY ended, task_id', params).fetchall()
+        finally:
+            conn.close()
+
+    def write_checkpoint(self, upserts, deleted_task_ids, events, lifetimes, snapshots):
+        """
+        Schreibt einen Checkpoint der In-Memory-Engine in einer Transaktion:
+        geänderte Tasks als (task_id, name, first_seen_at, last_changed_at), entfernte IDs,
+        neue Ereignisse und Lebensdauern sowie die gezählten Snapshots [(ts, counts)].
+        """
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT OR REPLACE INTO task_state (task_id, task_name, first_seen_at, last_changed_at)
+                VALUES (?, ?, ?, ?)
+            ''', upserts)
+            cursor.executemany('DELETE FROM task_state WHERE task_id = ?', [(task_id,) for task_id in deleted_task_ids])
+            cursor.executemany('''
+                INSERT INTO task_events (task_id, event, event_date, task_name, first_seen)
+                VALUES (?, ?, ?, ?, ?)
+            ''', events)
+            cursor.executemany('''
+                INSERT OR REPLACE INTO task_lifetimes
+                    (task_id, task_name, outcome, first_seen, ended, lifetime_days, project_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', lifetimes)
+            update_duplicate_index(cursor, [(task_id, name) for task_id, name, _, _ in upserts], deleted_task_ids)
+            for now, counts in snapshots:
+                write_snapshot_counts(cursor, SNAPSHOT_PROJECT, counts, now)
+            if snapshots:
+                rollup_snapshots(cursor, snapshots[-1][0])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def __repr__(self):
+        return f"SQLiteStore({self.db_path or inbox_history.DB_PATH!r})"
+
+# --------------------------
+# In-Memory
+# --------------------------
+class MemoryStore(TaskStore):
+    """
+    Engine, die alles in Dictionaries hält - für Tests, Benchmarks und als
+    Hot Cache des Widgets. Mit backing wird beim init() der Stand aus dieser
+    Engine geladen und per checkpoint() zurückgeschrieben, spätestens alle
+    checkpoint_interval Sekunden (beim nächsten apply_diff) und beim close().
+    Ereignisse und Lebensdauern liegen dann nur bis zum nächsten Checkpoint im Speicher.
+    """
+
+    name = 'memory'
+
+    def __init__(self, backing=None, checkpoint_interval=CHECKPOINT_INTERVAL, snapshot_path=None):
+        self.backing = backing
+        self.checkpoint_interval = checkpoint_interval
+        self.snapshot_path = snapshot_path
+        self.tasks = {}
+        self.events = []
+        self.lifetimes = {}
+        self.snapshots = []
+        self.dirty = set()  # seit dem letzten Checkpoint geänderte Tasks
+        self.removed = set()  # seit dem letzten Checkpoint entfernte Tasks
+        self.last_checkpoint = clock.timestamp()
+        self.lock = threading.RLock()
+
+    def init(self):
+        if self.backing is not None:
+            self.backing.init()
+            tasks = self.backing.load_tasks()
+            with self.lock:
+                self.tasks = tasks
+                self.last_checkpoint = clock.timestamp()
+        self.publish_snapshot()
+
+    def load_tasks(self):
+        # Flache Kopie - Aufrufer dürfen das Dictionary verändern (z.B. WriteBehindQueue.load)
+        with self.lock:
+            return dict(self.tasks)
+
+    def load_names(self):
+        with self.lock:
+            return {task_id: data['name'] for task_id, data in self.tasks.items()}
+
+    def count_by_age(self):
+        # Ohne Kopie von self.tasks wie in load_tasks
+        with self.lock:
+            return count_tasks_by_age(self.tasks, AGE_BUCKETS)
+
+    def apply_diff(self, new_tasks, renamed_tasks, deleted_task_ids, outcomes=None):
+        now = int(clock.timestamp())
+        today = clock.today().isoformat()
+        outcomes = outcomes or {}
+        with self.lock:
+            for task_id, task_name in new_tasks:
+                # Wie in SQLite: ein schon vorhandener Task behält first_seen
+                first_seen = self.tasks[task_id]['first_seen'] if task_id in self.tasks else now
+                self.tasks[task_id] = {'name': task_name, 'first_seen': first_seen, 'last_changed': now}
+                self.events.append((task_id, 'added', today, task_name, None))
+                self.touch(task_id)
+
+            for task_id, task_name in renamed_tasks:
+                # Unbekannte Tasks bekommen kein Ereignis, sonst landet es beim Checkpoint in task_events
+                if task_id not in self.tasks:
+                    continue
+                self.tasks[task_id] = dict(self.tasks[task_id], name=task_name, last_changed=now)
+                self.events.append((task_id, 'renamed', today, task_name, None))
+                self.touch(task_id)
+
+            for task_id in deleted_task_ids:
+                data = self.tasks.pop(task_id, None)
+                if data is None:
+                    continue
+                # Ereignisse und Lebensdauern bleiben tageweise, wie in der SQLite-Engine
+                first_seen = date.fromtimestamp(data['first_seen'])
+                self.events.append((task_id, 'deleted', today, data['name'], first_seen.isoformat()))
+                outcome, project_id, ended = outcomes.get(task_id) or ('unknown', None, None)
+                ended = ended or today
+                lifetime = max(0, (date.fromisoformat(ended) - first_seen).days)
+                self.lifetimes[task_id] = (task_id, data['name'], outcome, first_seen.isoformat(),
+                                           ended, lifetime, project_id)
+                self.dirty.discard(task_id)
+                self.removed.add(task_id)
+
+            counts = count_tasks_by_age(self.tasks, AGE_BUCKETS)
+            counts[TOTAL_BUCKET] = len(self.tasks)
+            self.snapshots.append((int(clock.timestamp()), counts))
+
+            if self.backing is not None and clock.timestamp() - self.last_checkpoint >= self.checkpoint_interval:
+                # Die Änderungen sind im Speicher übernommen - ein Fehler beim Checkpoint
+                # darf sie nicht noch einmal anwenden lassen, der nächste Versuch holt sie nach
+                try:
+                    self.checkpoint()
+                except Exception as e:
+                    print(f"Warnung: Checkpoint fehlgeschlagen: {e}")
+        self.publish_snapshot()
+
+    def data_version(self):
+        # Änderungen im Speicher erhöhen ihn nicht - ein Snapshot bleibt gültig, bis jemand in die Datenbank schreibt
+        return self.backing.data_version() if self.backing is not None else 0
+
+    def touch(self, task_id):
+        self.dirty.add(task_id)
+        self.removed.discard(task_id)
+
+    def get_events(self, since=None, task_id=None):
+        with self.lock:
+            events = [event for event in self.events
+                      if (not since or event[2] >= since) and (task_id is None or event[0] == task_id)]
+            if self.backing is not None:
+                # Bereits geschriebene Ereignisse liegen nur noch in der Backing-Engine
+                events = self.backing.get_events(since, task_id) + events
+        return events
+
+    def get_lifetimes(self, outcome=None):
+        with self.lock:
+            rows = dict((row[0], row) for row in self.backing.get_lifetimes(outcome)) if self.backing else {}
+            rows.update((task_id, row) for task_id, row in self.lifetimes.items()
+                        if not outcome or row[2] == outcome)
+        return sorted(rows.values(), key=lambda row: (row[4], row[0]))
+
+    def checkpoint(self):
+        """
+        Schreibt alle Änderungen seit dem letzten Checkpoint in die Backing-Engine.
+        Schlägt das Schreiben fehl, bleiben sie für den nächsten Versuch erhalten.
+        """
+        if self.backing is None:
+            return
+        with self.lock:
+            upserts = [(task_id, data['name'], data['first_seen'], data['last_changed'])
+                       for task_id, data in ((task_id, self.tasks[task_id]) for task_id in self.dirty)]
+            self.backing.write_checkpoint(upserts, list(self.removed), self.events,
+                                          list(self.lifetimes.values()), self.snapshots)
+            self.events = []
+            self.lifetimes = {}
+            self.snapshots = []
+            self.dirty = set()
+            self.removed = set()
+            self.last_checkpoint = clock.timestamp()
+
+    def close(self):
+        try:
+            self.checkpoint()
+        except Exception as e:
+            print(f"Warnung: Letzter Checkpoint fehlgeschlagen, {len(self.events)} Ereignisse gehen verloren: {e}")
+
+    def __repr__(self):
+        return f"MemoryStore(backing={self.backing!r})"
+
+def open_store(engine='sqlite', db_path=None, checkpoint_interval=CHECKPOINT_INTERVAL, snapshot_path=None):
+    """
+    Erstellt eine Engine: 'sqlite' oder 'memory'. Mit db_path bekommt die
+    In-Memory-Engine die SQLite-Datenbank als Backing (Hot Cache mit Checkpoints).
+    Mit snapshot_path veröffentlicht die Engine nach jedem Sync einen Task-Snapshot.
+    """
+    if engine == 'sqlite':
+        return SQLiteStore(db_path, snapshot_path)
+    if engine == 'memory':
+        backing = SQLiteStore(db_path) if db_path else None
+        return MemoryStore(backing, checkpoint_interval, snapshot_path)
+    raise ValueError(f"Unbekannte Speicher-Engine: {engine} (verfügbar: {', '.join(ENGINES)})")
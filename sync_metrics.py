@@ -0,0 +1,301 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import clock
+
+# --------------------------
+# Konfiguration
+# --------------------------
+DB_PATH = "tasks_history.db"
+RING_BUFFER_SIZE = 200  # Anzahl Sync-Zyklen im Speicher
+PROFILE_ENV_VAR = "TODOIST_PROFILE"  # Wenn gesetzt: jeden Zyklus mit cProfile messen
+PROFILE_TRIGGER_FILE = "sync_profile.trigger"  # Wenn vorhanden: nächsten Zyklus profilieren
+PROFILE_DIR = "profiles"
+
+PHASES = ("fetch", "parse", "diff", "write", "render")
+COUNTERS = ("tasks_added", "tasks_renamed", "tasks_deleted", "bytes_transferred")
+
+_local = threading.local()
+
+# --------------------------
+# Sync-Zyklus
+# --------------------------
+class SyncCycle:
+    """
+    Zeitmessung eines einzelnen Sync-Zyklus.
+    Verschachtelte Phasen werden exklusiv gezählt: Solange eine innere Phase
+    läuft, ist die äußere pausiert.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.started_at = clock.now()
+        self.start_time = time.perf_counter()
+        self.total = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.error = None
+        self.profile_path = None
+        self.stack = []  # [Phasenname, Startzeit]
+
+    @contextmanager
+    def phase(self, name):
+        now = time.perf_counter()
+        if self.stack:
+            outer = self.stack[-1]
+            self.phases[outer[0]] += now - outer[1]
+        self.stack.append([name, now])
+        try:
+            yield
+        finally:
+            name, started = self.stack.pop()
+            now = time.perf_counter()
+            self.phases[name] = self.phases.get(name, 0.0) + now - started
+            if self.stack:
+                self.stack[-1][1] = now
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_row(self):
+        """
+        Gibt die Messwerte als Dictionary (Millisekunden) zurück.
+        """
+        row = {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'source': self.source,
+            'total_ms': round(self.total * 1000, 3),
+            'error': self.error,
+        }
+        for name in PHASES:
+            row[f"{name}_ms"] = round(self.phases.get(name, 0.0) * 1000, 3)
+        for name in COUNTERS:
+            row[name] = self.counters.get(name, 0)
+        return row
+
+def current_cycle():
+    """
+    Gibt den im aktuellen Thread laufenden Sync-Zyklus zurück (oder None).
+    """
+    return getattr(_local, 'cycle', None)
+
+@contextmanager
+def phase(name):
+    """
+    Misst eine Phase im aktuellen Sync-Zyklus. Ohne aktiven Zyklus ein No-Op.
+    """
+    cycle = current_cycle()
+    if cycle is None:
+        yield
+    else:
+        with cycle.phase(name):
+            yield
+
+def count(name, value=1):
+    """
+    Erhöht einen Zähler im aktuellen Sync-Zyklus. Ohne aktiven Zyklus ein No-Op.
+    """
+    cycle = current_cycle()
+    if cycle is not None:
+        cycle.count(name, value)
+
+# --------------------------
+# Recorder
+# --------------------------
+class MetricsRecorder:
+    """
+    Sammelt abgeschlossene Sync-Zyklen in einem Ringpuffer und schreibt sie
+    optional in die Tabelle sync_metrics.
+    """
+
+    def __init__(self, db_path=None, capacity=RING_BUFFER_SIZE, profile_dir=PROFILE_DIR):
+        self.db_path = db_path
+        self.buffer = deque(maxlen=capacity)
+        self.profile_dir = profile_dir
+        self.profiler = None
+        self.lock = threading.Lock()
+        self.listeners = []  # Callbacks für abgeschlossene Zyklen (z.B. Metrik-Exporter)
+        if db_path:
+            init_metrics_table(db_path)
+
+    def profiling_requested(self):
+        """
+        Prüft, ob der nächste Zyklus mit cProfile gemessen werden soll.
+        """
+        if os.environ.get(PROFILE_ENV_VAR):
+            return True
+        if os.path.exists(PROFILE_TRIGGER_FILE):
+            try:
+                os.remove(PROFILE_TRIGGER_FILE)
+            except OSError:
+                pass
+            return True
+        return False
+
+    def start(self, source):
+        """
+        Startet einen neuen Sync-Zyklus für den aktuellen Thread.
+        """
+        cycle = SyncCycle(source)
+        _local.cycle = cycle
+        if self.profiling_requested():
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return cycle
+
+    def finish(self, cycle, error=None):
+        """
+        Schließt einen Sync-Zyklus ab und legt ihn im Ringpuffer ab.
+        """
+        cycle.total = time.perf_counter() - cycle.start_time
+        if error is not None:
+            cycle.error = str(error)
+        if getattr(_local, 'cycle', None) is cycle:
+            _local.cycle = None
+
+        if self.profiler is not None:
+            self.profiler.disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            cycle.profile_path = os.path.join(
+                self.profile_dir, f"sync_{cycle.started_at.strftime('%Y%m%d_%H%M%S')}.prof"
+            )
+            self.profiler.dump_stats(cycle.profile_path)
+            self.profiler = None
+            print(f"Profil gespeichert: {cycle.profile_path}")
+
+        with self.lock:
+            self.buffer.append(cycle)
+
+        for listener in self.listeners:
+            listener(cycle)
+
+        if self.db_path:
+            try:
+                save_cycle(self.db_path, cycle)
+            except sqlite3.Error as e:
+                print(f"Warnung: Sync-Metriken konnten nicht gespeichert werden: {e}")
+        return cycle
+
+    def recent(self, limit=None):
+        """
+        Gibt die letzten Zyklen aus dem Ringpuffer zurück (neueste zuletzt).
+        """
+        with self.lock:
+            cycles = list(self.buffer)
+        return cycles[-limit:] if limit else cycles
+
+# --------------------------
+# Datenbank-Funktionen
+# --------------------------
+def init_metrics_table(db_path=DB_PATH):
+    """
+    Erstellt die Tabelle sync_metrics, falls sie nicht existiert.
+    """
+    phase_columns = "".join(f"{name}_ms REAL NOT NULL DEFAULT 0,\n" for name in PHASES)
+    counter_columns = "".join(f"{name} INTEGER NOT NULL DEFAULT 0,\n" for name in COUNTERS)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS sync_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT NOT NULL,
+            source TEXT NOT NULL,
+            total_ms REAL NOT NULL,
+            {phase_columns}
+            {counter_columns}
+            error TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sync_metrics_started_at ON sync_metrics (started_at)')
+    conn.commit()
+    conn.close()
+
+def save_cycle(db_path, cycle):
+    """
+    Schreibt einen Sync-Zyklus in die Tabelle sync_metrics.
+    """
+    row = cycle.as_row()
+    columns = ", ".join(row)
+    placeholders = ", ".join("?" for _ in row)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute(f'INSERT INTO sync_metrics ({columns}) VALUES ({placeholders})', list(row.values()))
+    conn.commit()
+    conn.close()
+
+# --------------------------
+# CLI
+# --------------------------
+def show_recent(db_path, limit):
+    """
+    Zeigt die letzten Sync-Zyklen aus der Datenbank an.
+    """
+    conn = sqlite3.connect(db_path)
+    phase_columns = ", ".join(f"{name}_ms" for name in PHASES)
+    rows = conn.execute(f'''
+        SELECT started_at, source, total_ms, {phase_columns},
+               tasks_added, tasks_renamed, tasks_deleted, bytes_transferred, error
+        FROM sync_metrics
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (limit,)).fetchall()
+    conn.close()
+
+    header = f"{'Start':<20} {'Quelle':<14} {'Gesamt':>8} " + " ".join(f"{name:>8}" for name in PHASES)
+    print(header + f" {'+':>5} {'~':>5} {'-':>5} {'KB':>8}")
+    print("-" * (len(header) + 27))
+    for row in reversed(rows):
+        started_at, source, total_ms = row[:3]
+        phase_values = row[3:3 + len(PHASES)]
+        added, renamed, deleted, transferred, error = row[3 + len(PHASES):]
+        line = f"{started_at:<20} {source:<14} {total_ms:8.1f} " + " ".join(f"{v:8.1f}" for v in phase_values)
+        line += f" {added:5d} {renamed:5d} {deleted:5d} {transferred / 1024:8.1f}"
+        if error:
+            line += f"  FEHLER: {error}"
+        print(line)
+
+def show_summary(db_path, limit):
+    """
+    Zeigt Durchschnitt und Maximum je Phase über die letzten Zyklen.
+    """
+    conn = sqlite3.connect(db_path)
+    aggregates = ", ".join(f"AVG({name}_ms), MAX({name}_ms)" for name in ("total",) + PHASES)
+    row = conn.execute(f'''
+        SELECT COUNT(*), SUM(error IS NOT NULL), {aggregates}
+        FROM (SELECT * FROM sync_metrics ORDER BY id DESC LIMIT ?)
+    ''', (limit,)).fetchone()
+    conn.close()
+
+    cycles, errors = row[0], row[1] or 0
+    print(f"Zyklen: {cycles}, davon mit Fehler: {errors}")
+    if not cycles:
+        return
+    for i, name in enumerate(("total",) + PHASES):
+        avg_ms, max_ms = row[2 + i * 2], row[3 + i * 2]
+        print(f"  {name:<8} Ø {avg_ms:8.1f} ms   max {max_ms:8.1f} ms")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Zeitmessungen der Sync-Zyklen anzeigen")
+    parser.add_argument("--db", default=DB_PATH, help="Pfad zur Datenbank")
+    parser.add_argument("--last", type=int, default=20, help="Anzahl der angezeigten Zyklen")
+    parser.add_argument("--summary", action="store_true", help="Nur Durchschnitt und Maximum je Phase")
+    parser.add_argument("--profile-next", action="store_true",
+                        help="Nächsten Sync-Zyklus eines laufenden Prozesses mit cProfile messen")
+    args = parser.parse_args()
+
+    if args.profile_next:
+        open(PROFILE_TRIGGER_FILE, "w").close()
+        print(f"Nächster Sync-Zyklus wird profiliert (Ausgabe in '{PROFILE_DIR}').")
+    else:
+        init_metrics_table(args.db)
+        if args.summary:
+            show_summary(args.db, args.last)
+        else:
+            show_recent(args.db, args.last)
@@ -0,0 +1,424 @@
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import time
+from bisect import bisect_right
+from collections.abc import Mapping, MutableMapping
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+
+import clock
+from inbox_snapshots import DAY
+
+# --------------------------
+# Konfiguration
+# --------------------------
+SNAPSHOT_PATH = "tasks_history.snap"
+KEEP_GENERATIONS = 2  # Ältere Dateien werden beim Veröffentlichen gelöscht (sofern nicht mehr gemappt)
+LOCK_TIMEOUT = 10.0  # Sekunden, die ein Schreiber auf einen anderen wartet
+STALE_LOCK_AGE = 60.0  # Ältere Sperrdateien stammen von einem abgebrochenen Prozess
+
+# Dateiformat (Little Endian):
+#   Kopf:      Magic, Formatversion, reserviert, Generation, erstellt (Unix-Zeit), Anzahl Tasks, Größe der Strings,
+#              Datenstand der Datenbank beim Veröffentlichen (task_state_version, 0 ohne Datenbank)
+#   Records:   je Task ID, Offset und Länge des Namens in der String-Tabelle, first_seen, last_changed
+#              (Unix-Zeitstempel wie in task_state), nach ID sortiert
+#   Strings:   alle Namen als UTF-8 hintereinander, in Record-Reihenfolge
+MAGIC = b"TSNP"
+FORMAT_VERSION = 3
+HEADER = struct.Struct("<4sHHQQIIQ")
+RECORD = struct.Struct("<qIIqq")
+
+# --------------------------
+# Schreiben
+# --------------------------
+def data_path(path, generation):
+    return f"{path}.{generation}"
+
+def read_generation(path):
+    """
+    Aktuelle Generation laut Zeigerdatei oder 0, wenn noch nichts veröffentlicht wurde.
+    """
+    try:
+        with open(path, encoding="ascii") as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def latest_generation(path):
+    """
+    Höchste Generation laut Zeigerdatei oder vorhandenen Datendateien.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    prefix = os.path.basename(path) + "."
+    generations = [int(name[len(prefix):]) for name in os.listdir(directory)
+                   if name.startswith(prefix) and name[len(prefix):].isdigit()]
+    return max(generations + [read_generation(path)])
+
+@contextmanager
+def publish_lock(path):
+    """
+    Sperrdatei path.lock, damit sich Schreiber verschiedener Prozesse (Widget,
+    inbox_history per Aufgabenplanung) nicht dieselbe Generation teilen.
+    """
+    lock_path = f"{path}.lock"
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock_path).st_mtime > STALE_LOCK_AGE:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                # Gerade freigegeben
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Task-Snapshot ist gesperrt: {lock_path}")
+            time.sleep(0.01)
+    try:
+        os.write(fd, str(os.getpid()).encode("ascii"))
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+def publish_snapshot(rows, path=SNAPSHOT_PATH, data_version=0):
+    """
+    Veröffentlicht den aktuellen Stand als neue Generation. rows sind
+    (task_id, name, first_seen, last_changed)-Tupel, nach task_id sortiert.
+    data_version ist der Datenstand der Datenbank, zu dem rows gehören (siehe read_data_version);
+    Leser mit db_path verwenden den Snapshot nur, solange sich dieser nicht geändert hat.
+    Die Daten landen in einer eigenen Datei je Generation, danach wird die kleine
+    Zeigerdatei path atomar ersetzt. So muss keine gemappte Datei überschrieben
+    werden (unter Windows nicht möglich), und Leser sehen immer eine vollständige Generation.
+    Gibt die neue Generation zurück.
+    """
+    records = bytearray()
+    strings = bytearray()
+    count = 0
+    for task_id, name, first_seen, last_changed in rows:
+        encoded = name.encode("utf-8")
+        records += RECORD.pack(task_id, len(strings), len(encoded), first_seen, last_changed)
+        strings += encoded
+        count += 1
+
+    with publish_lock(path):
+        # Nie eine vorhandene (womöglich gemappte) Datei überschreiben: neue Nummer, erst
+        # vollständig in eine Temp-Datei schreiben und dann an ihren Platz verschieben
+        generation = latest_generation(path) + 1
+        temp_data = f"{path}.tmp"
+        with open(temp_data, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, generation, int(clock.timestamp()), count, len(strings),
+                                data_version))
+            f.write(records)
+            f.write(strings)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_data, data_path(path, generation))
+
+        temp_pointer = f"{path}.pointer.tmp"
+        with open(temp_pointer, "w", encoding="ascii") as f:
+            f.write(f"{generation}\n")
+        os.replace(temp_pointer, path)
+
+        remove_old_generations(path, generation)
+    return generation
+
+def remove_old_generations(path, generation):
+    directory = os.path.dirname(os.path.abspath(path))
+    prefix = os.path.basename(path) + "."
+    for name in os.listdir(directory):
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and suffix.isdigit() and int(suffix) <= generation - KEEP_GENERATIONS:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                # Unter Windows noch von einem Leser gemappt - beim nächsten Mal
+                pass
+
+# --------------------------
+# Lesen
+# --------------------------
+class TaskSnapshot(Mapping):
+    """
+    Eine gemappte Generation. Als Mapping verhält sie sich wie get_db_tasks
+    ({task_id: {'name', 'first_seen', 'last_changed'}}), liest dabei aber nur den
+    jeweils angefragten Record; Namen werden erst beim Zugriff dekodiert.
+    Für Auswertungen über alle Tasks gibt es Scans, die nur die festen Records lesen.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.generation, self.created, self.count, strings_size,
+         self.data_version) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.map.close()
+            raise ValueError(f"Kein Task-Snapshot (Format {version}): {path}")
+        self.path = path
+        self.records_start = HEADER.size
+        self.strings_start = self.records_start + self.count * RECORD.size
+        if len(self.map) < self.strings_start + strings_size:
+            self.map.close()
+            raise ValueError(f"Task-Snapshot unvollständig: {path}")
+
+    def record(self, index):
+        return RECORD.unpack_from(self.map, self.records_start + index * RECORD.size)
+
+    def records(self):
+        """
+        Alle Records als (task_id, Namens-Offset, Namenslänge, first_seen, last_changed)
+        - ohne Namen zu dekodieren.
+        """
+        return RECORD.iter_unpack(memoryview(self.map)[self.records_start:self.strings_start])
+
+    def name(self, offset, length):
+        start = self.strings_start + offset
+        return self.map[start:start + length].decode("utf-8")
+
+    def index_of(self, task_id):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            current = RECORD.unpack_from(self.map, self.records_start + middle * RECORD.size)[0]
+            if current < task_id:
+                low = middle + 1
+            elif current > task_id:
+                high = middle
+            else:
+                return middle
+        return None
+
+    # --------------------------
+    # Mapping
+    # --------------------------
+    def __getitem__(self, task_id):
+        index = self.index_of(task_id)
+        if index is None:
+            raise KeyError(task_id)
+        _, offset, length, first_seen, last_changed = self.record(index)
+        return {'name': self.name(offset, length), 'first_seen': first_seen, 'last_changed': last_changed}
+
+    def __contains__(self, task_id):
+        return isinstance(task_id, int) and self.index_of(task_id) is not None
+
+    def __iter__(self):
+        return (record[0] for record in self.records())
+
+    def __len__(self):
+        return self.count
+
+    # --------------------------
+    # Scans
+    # --------------------------
+    def stale(self, min_days):
+        """
+        Wie inbox_history.find_stale_tasks: (task_id, name, Tage) der Tasks, die seit mehr
+        als min_days Tagen unverändert sind, die ältesten zuerst.
+        """
+        now = int(clock.timestamp())
+        result = [(task_id, self.name(offset, length), (now - last_changed) // DAY)
+                  for task_id, offset, length, _, last_changed in self.records()
+                  if (now - last_changed) // DAY > min_days]
+        result.sort(key=lambda item: item[2], reverse=True)
+        return result
+
+    def changed(self):
+        """
+        Tasks, die an einem späteren Tag (Ortszeit) als dem Anlegen geändert wurden,
+        als (task_id, name, first_seen, last_changed) - wie die Datumsspalten der Sicht tasks.
+        """
+        return [(task_id, self.name(offset, length), first_seen, last_changed)
+                for task_id, offset, length, first_seen, last_changed in self.records()
+                if date.fromtimestamp(first_seen) != date.fromtimestamp(last_changed)]
+
+    def find(self, text):
+        """
+        Tasks, deren Name text enthält, als (task_id, name). Groß-/Kleinschreibung wird
+        wie bei lower() in SQLite nur für ASCII-Buchstaben ignoriert.
+        Gesucht wird direkt in der String-Tabelle; nur Treffer werden dekodiert.
+        """
+        needle = text.encode("utf-8")
+        if not needle:
+            return []
+        # Ein bytes-Muster ignoriert die Schreibweise nur bei ASCII
+        pattern = re.compile(re.escape(needle), re.IGNORECASE)
+        end = len(self.map)
+        offsets = [record[1] for record in self.records()]
+        result = []
+        match = pattern.search(self.map, self.strings_start, end)
+        while match is not None:
+            position = match.start()
+            # Record, in dessen Namen der Treffer liegt (Offsets sind aufsteigend)
+            index = bisect_right(offsets, position - self.strings_start) - 1
+            task_id, offset, length, _, _ = self.record(index)
+            name_end = self.strings_start + offset + length
+            if match.end() <= name_end:
+                result.append((task_id, self.name(offset, length)))
+            # Weiter hinter diesem Namen, mindestens aber hinter dem Treffer
+            match = pattern.search(self.map, max(position + 1, name_end), end)
+        return result
+
+    def count_by_first_seen(self):
+        """
+        {Tag von first_seen (Ortszeit, ISO): Anzahl Tasks}, nach Datum sortiert.
+        """
+        counts = {}
+        for record in self.records():
+            day = date.fromtimestamp(record[3])
+            counts[day] = counts.get(day, 0) + 1
+        return {day.isoformat(): n for day, n in sorted(counts.items())}
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        created = datetime.fromtimestamp(self.created).strftime('%d.%m.%Y %H:%M:%S')
+        return f"TaskSnapshot(Generation {self.generation}, {self.count} Tasks, {created})"
+
+class TaskMapping(MutableMapping):
+    """
+    Änderbare Sicht auf einen Snapshot, z.B. für WriteBehindQueue.load.
+    Änderungen bleiben in der Sicht, der Snapshot wird nie kopiert.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.changes = {}
+        self.removed = set()
+
+    def __getitem__(self, task_id):
+        if task_id in self.changes:
+            return self.changes[task_id]
+        if task_id in self.removed:
+            raise KeyError(task_id)
+        return self.snapshot[task_id]
+
+    def __contains__(self, task_id):
+        return task_id in self.changes or (task_id not in self.removed and task_id in self.snapshot)
+
+    def __setitem__(self, task_id, value):
+        self.changes[task_id] = value
+        self.removed.discard(task_id)
+
+    def __delitem__(self, task_id):
+        if task_id not in self:
+            raise KeyError(task_id)
+        self.changes.pop(task_id, None)
+        self.removed.add(task_id)
+
+    def __iter__(self):
+        for task_id in self.snapshot:
+            if task_id not in self.removed and task_id not in self.changes:
+                yield task_id
+        yield from self.changes
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+class SnapshotReader:
+    """
+    Hält die jeweils neueste Generation gemappt. current() prüft nur per stat, ob sich
+    die Zeigerdatei geändert hat, und mappt erst dann die neue Generation.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self.stat_key = None
+        self.snapshot = None
+
+    def current(self):
+        """
+        Die aktuelle Generation oder None, wenn (noch) kein Snapshot veröffentlicht wurde.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if key != self.stat_key:
+            generation = read_generation(self.path)
+            if self.snapshot is None or self.snapshot.generation != generation:
+                try:
+                    # Die alte Generation wird nicht geschlossen - laufende Leser behalten sie, bis sie sie freigeben
+                    self.snapshot = TaskSnapshot(data_path(self.path, generation))
+                except (OSError, ValueError) as e:
+                    print(f"Warnung: Task-Snapshot Generation {generation} nicht lesbar: {e}")
+                    return self.snapshot
+            self.stat_key = key
+        return self.snapshot
+
+    def close(self):
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+def open_snapshot(path=SNAPSHOT_PATH, db_path=None):
+    """
+    Mappt die aktuelle Generation oder gibt None zurück, wenn es keine gibt.
+    Mit db_path ebenfalls None, wenn die Datenbank seit dem Veröffentlichen geändert wurde
+    (z.B. von einem Import oder dem Webhook-Empfänger, die keinen Snapshot schreiben) -
+    der Aufrufer liest dann direkt aus SQLite.
+    Der Aufrufer muss den Snapshot schließen (close() oder with).
+    """
+    data_version = None
+    if db_path is not None:
+        data_version = read_data_version(db_path)
+        if data_version is None:
+            return None
+    generation = read_generation(path)
+    if not generation:
+        return None
+    try:
+        snapshot = TaskSnapshot(data_path(path, generation))
+    except (OSError, ValueError) as e:
+        print(f"Warnung: Task-Snapshot Generation {generation} nicht lesbar: {e}")
+        return None
+    if data_version is not None and snapshot.data_version != data_version:
+        snapshot.close()
+        return None
+    return snapshot
+
+def read_data_version(db_path):
+    """
+    Datenstand der Tabelle task_state (wird per Trigger bei jeder Änderung erhöht, siehe
+    inbox_history.init_task_schema) oder None, wenn die Datenbank ihn (noch) nicht führt.
+    """
+    try:
+        conn = sqlite3.connect(Path(os.path.abspath(db_path)).as_uri() + "?mode=ro", uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        row = conn.execute('SELECT version FROM task_state_version WHERE id = 1').fetchone()
+        return row[0] if row else None
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+def local_time(timestamp):
+    """
+    Zeitstempel als 'YYYY-MM-DD HH:MM' in Ortszeit für die Ausgabe.
+    """
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M')
+
+def snapshot_path_for(db_path):
+    """
+    Snapshot-Datei neben einer Datenbank, z.B. tasks_history.db -> tasks_history.snap.
+    """
+    return os.path.splitext(db_path)[0] + ".snap"
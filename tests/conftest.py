@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# Die Module liegen flach im Projektverzeichnis
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """
+    Frische Datenbank im Temp-Verzeichnis, auch als inbox_history.DB_PATH.
+    """
+    import inbox_history
+    path = str(tmp_path / "tasks_history.db")
+    monkeypatch.setattr(inbox_history, "DB_PATH", path)
+    inbox_history.init_database(path)
+    return path
+
+@pytest.fixture(autouse=True)
+def api_token(tmp_path, monkeypatch):
+    """
+    Standardkonto ohne accounts.json, Token aus der Umgebung - kein Test nutzt einen echten Token.
+    """
+    import accounts
+    monkeypatch.setattr(accounts, "ACCOUNTS_FILE", str(tmp_path / "accounts.json"))
+    monkeypatch.setenv(accounts.DEFAULT_TOKEN_ENV, "test-token")
+    return "test-token"
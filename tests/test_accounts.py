@@ -0,0 +1,118 @@
+import json
+import threading
+
+import pytest
+
+import accounts
+from accounts import AccountScheduler, default_account, load_accounts
+
+def write_config(tmp_path, entries, **config):
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps(dict(config, accounts=entries)), encoding="utf-8")
+    return str(path)
+
+def test_without_config_the_default_account_reads_the_environment(tmp_path, monkeypatch):
+    [account], max_workers = load_accounts(str(tmp_path / "missing.json"))
+    assert account.name == "default" and max_workers == 1
+    assert account.headers() == {"Authorization": "Bearer test-token"}
+
+    monkeypatch.delenv(accounts.DEFAULT_TOKEN_ENV)
+    with pytest.raises(ValueError, match="TODOIST_API_TOKEN"):
+        account.token()
+
+def test_accounts_are_read_from_the_config(tmp_path, monkeypatch):
+    token_file = tmp_path / "team_token"
+    token_file.write_text("team-token\n", encoding="utf-8")
+    monkeypatch.setenv("TODOIST_TOKEN_ANNA", "anna-token")
+    path = write_config(tmp_path, [
+        {'name': "anna", 'token_env': "TODOIST_TOKEN_ANNA", 'db_path': str(tmp_path / "anna.db"), 'interval': 60},
+        {'name': "team", 'token_file': str(token_file), 'db_path': str(tmp_path / "team.db")},
+    ], max_workers=2)
+
+    (anna, team), max_workers = load_accounts(path)
+    assert max_workers == 2
+    assert (anna.interval, anna.token()) == (60, "anna-token")
+    assert (team.interval, team.token()) == (accounts.DEFAULT_INTERVAL, "team-token")
+
+    # Der Token wird bei jedem Aufruf neu gelesen
+    token_file.write_text("rotated", encoding="utf-8")
+    assert team.token() == "rotated"
+    # Ohne Konto 'default' arbeitet das Widget mit dem ersten
+    assert default_account(path).name == "anna"
+
+@pytest.mark.parametrize('entries, message', [
+    ([{'name': "anna", 'db_path': "a.db"}, {'name': "anna", 'db_path': "b.db"}], "mehrfach"),
+    ([{'name': "anna", 'db_path': "a.db"}, {'name': "team", 'db_path': "./a.db"}], "eigene Datenbank"),
+    ([{'db_path': "a.db"}], "Namen"),
+    ([], "Keine Konten"),
+])
+def test_invalid_configs_are_refused(tmp_path, entries, message):
+    with pytest.raises(ValueError, match=message):
+        load_accounts(write_config(tmp_path, entries))
+
+class FakeSync:
+    """
+    Ersatz für sync_account: merkt sich die Aufrufe, das Konto 'broken' scheitert.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, account):
+        with self.lock:
+            self.calls.append(account.name)
+        if account.name == "broken":
+            raise RuntimeError("Verbindung abgebrochen")
+        return f"[{account.name}] ok"
+
+def run_due(scheduler, now):
+    scheduler.submit_due(now)
+    # Warten, bis alle gestarteten Jobs fertig sind
+    scheduler.executor.shutdown(wait=True)
+    scheduler.executor = accounts.ThreadPoolExecutor(max_workers=2)
+
+def test_scheduler_starts_only_due_accounts_and_survives_failures(tmp_path, monkeypatch, capsys):
+    fake = FakeSync()
+    monkeypatch.setattr(accounts, 'sync_account', fake)
+    path = write_config(tmp_path, [
+        {'name': "anna", 'token': "a", 'db_path': str(tmp_path / "anna.db"), 'interval': 60},
+        {'name': "broken", 'token': "b", 'db_path': str(tmp_path / "broken.db"), 'interval': 60},
+        {'name': "team", 'token': "t", 'db_path': str(tmp_path / "team.db"), 'interval': 600},
+    ])
+    scheduler = AccountScheduler(load_accounts(path)[0], max_workers=2)
+
+    run_due(scheduler, 1000)
+    assert sorted(fake.calls) == ["anna", "broken", "team"]
+    assert scheduler.running == set()
+
+    # Noch nichts fällig
+    fake.calls.clear()
+    run_due(scheduler, 1030)
+    assert fake.calls == []
+
+    # Das gescheiterte Konto läuft wie die anderen nach seinem Intervall wieder
+    run_due(scheduler, 1060)
+    assert sorted(fake.calls) == ["anna", "broken"]
+    assert "[anna] ok" in capsys.readouterr().out
+
+def test_running_account_is_not_started_twice(tmp_path, monkeypatch):
+    release = threading.Event()
+    fake = FakeSync()
+
+    def slow_sync(account):
+        release.wait(5)
+        return fake(account)
+
+    monkeypatch.setattr(accounts, 'sync_account', slow_sync)
+    path = write_config(tmp_path, [{'name': "anna", 'token': "a", 'db_path': str(tmp_path / "anna.db"),
+                                    'interval': 1}])
+    scheduler = AccountScheduler(load_accounts(path)[0], max_workers=2)
+    try:
+        scheduler.submit_due(1000)
+        scheduler.submit_due(1005)
+        assert scheduler.running == {"anna"}
+    finally:
+        release.set()
+        scheduler.executor.shutdown(wait=True)
+    assert fake.calls == ["anna"]
@@ -0,0 +1,71 @@
+import sqlite3
+from argparse import Namespace
+
+import pytest
+
+from analytics import PERCENTILES, build_parser, open_database, query_lifetimes
+
+def add_lifetimes(db_path, lifetimes, outcome='completed'):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany('''
+            INSERT INTO task_lifetimes (task_id, task_name, outcome, first_seen, ended, lifetime_days)
+            VALUES (?, ?, ?, date('2026-10-19', ?), '2026-10-19', ?)
+        ''', [(task_id, f"Task {task_id}", outcome, f"-{days} days", days)
+              for task_id, days in enumerate(lifetimes, 1)])
+    conn.close()
+
+def test_lifetime_statistics(db_path):
+    lifetimes = [5, 1, 30, 2, 8, 0, 13, 3, 21, 1]
+    add_lifetimes(db_path, lifetimes)
+    conn, error = open_database(db_path)
+    try:
+        args = Namespace(histogram=False, since='0000-00-00', outcome=None)
+        columns, rows = query_lifetimes(conn, args)
+        [row] = list(rows)
+        stats = dict(zip(columns, row))
+
+        args.histogram = True
+        columns, rows = query_lifetimes(conn, args)
+        histogram = {bucket: tasks for bucket, tasks, _ in rows}
+    finally:
+        conn.close()
+
+    ordered = sorted(lifetimes)
+    assert stats['outcome'] == 'completed' and stats['tasks'] == len(lifetimes)
+    assert stats['avg_days'] == pytest.approx(sum(lifetimes) / len(lifetimes))
+    assert stats['max_days'] == max(lifetimes)
+    for percentile in PERCENTILES:
+        offset = min(len(ordered) - 1, len(ordered) * percentile // 100)
+        assert stats[f"p{percentile}_days"] == ordered[offset]
+    assert histogram == {'0-7': 6, '8-30': 4}
+
+def test_completion_is_the_lifetimes_command():
+    args = build_parser().parse_args(["completion", "--histogram"])
+    assert args.query is query_lifetimes and args.histogram
+
+def test_analytics_opens_read_only(db_path):
+    conn, error = open_database(db_path)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO task_state VALUES (1, 'Aldi', 0, 0)")
+    finally:
+        conn.close()
+
+def test_unmigrated_database_is_refused_and_left_alone(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute('CREATE TABLE tasks (task_id INTEGER PRIMARY KEY, task_name TEXT, first_seen DATE, last_changed DATE)')
+        conn.execute("INSERT INTO tasks VALUES (1, 'Aldi', '2026-10-01', '2026-10-01')")
+    conn.close()
+
+    conn, error = open_database(path)
+    assert conn is None and "umgestellt" in error
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0] == 1
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'task_state'").fetchone() is None
+    finally:
+        conn.close()
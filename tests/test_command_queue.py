@@ -0,0 +1,105 @@
+import json
+from datetime import date
+
+import pytest
+
+import command_queue
+import todoist_api
+from command_queue import ITEM_ADD, ITEM_CLOSE, ITEM_UPDATE, CommandQueue
+from replay import ReplayResponse
+
+class FakeSync:
+    """
+    Ersatz für /sync: merkt sich die Befehle jedes Requests und antwortet mit respond(commands).
+    """
+
+    def __init__(self, respond=None):
+        self.requests = []
+        self.respond = respond or (lambda commands: {'sync_status': {c['uuid']: 'ok' for c in commands}})
+
+    def __call__(self, method, url, headers=None, params=None, data=None, stream=False):
+        assert method == "POST" and url.endswith("/sync")
+        commands = json.loads(data['commands'])
+        self.requests.append(commands)
+        result = self.respond(commands)
+        if isinstance(result, int):
+            return ReplayResponse(result, '{}', url=url)
+        return ReplayResponse(200, json.dumps(result), url=url)
+
+@pytest.fixture
+def fake_sync(monkeypatch):
+    monkeypatch.setattr(todoist_api, 'RATE_LIMIT', False)
+    sync = FakeSync()
+    monkeypatch.setattr(todoist_api, 'TRANSPORT', sync)
+    return sync
+
+@pytest.fixture
+def queue(tmp_path):
+    # Ohne start(): die Tests senden selbst mit send_batch
+    return CommandQueue(str(tmp_path / "commands.db"))
+
+def test_updates_of_the_same_task_are_merged(queue, fake_sync):
+    first = queue.rename(1, "Aldi Gutschein")
+    assert queue.reschedule(1, date(2026, 10, 20)) == first
+    queue.complete(1)
+    # Nach einem anderen Befehl wird nicht mehr zusammengefasst
+    queue.rename(1, "Aldi")
+
+    assert queue.send_batch()
+    assert [(c['type'], c['args']) for c in fake_sync.requests[0]] == [
+        (ITEM_UPDATE, {'id': "1", 'content': "Aldi Gutschein", 'due': {'date': "2026-10-20"}}),
+        (ITEM_CLOSE, {'id': "1"}),
+        (ITEM_UPDATE, {'id': "1", 'content': "Aldi"}),
+    ]
+    assert not queue.has_pending()
+
+def test_temp_ids_are_replaced_in_pending_commands(queue, fake_sync, monkeypatch):
+    monkeypatch.setattr(command_queue, 'BATCH_LIMIT', 1)
+    fake_sync.respond = lambda commands: {
+        'sync_status': {c['uuid']: 'ok' for c in commands},
+        'temp_id_mapping': {c['temp_id']: "42" for c in commands if 'temp_id' in c},
+    }
+    temp_id = queue.add("Lidl", project_id=7)
+    queue.rename(temp_id, "Lidl Prospekt")
+
+    assert queue.send_batch()
+    assert fake_sync.requests[0] == [{'type': ITEM_ADD, 'uuid': fake_sync.requests[0][0]['uuid'],
+                                      'args': {'content': "Lidl", 'project_id': "7"}, 'temp_id': temp_id}]
+    # Der ausstehende Befehl und spätere Befehle verwenden die echte ID
+    assert [args for _, _, args, _ in queue.pending()] == [{'id': "42", 'content': "Lidl Prospekt"}]
+    queue.complete(temp_id)
+    assert [args['id'] for _, _, args, _ in queue.pending()] == ["42", "42"]
+
+def test_rejected_commands_are_dropped_and_unanswered_ones_kept(queue, fake_sync, capsys):
+    ok, rejected, unanswered = queue.complete(1), queue.complete(2), queue.complete(3)
+    fake_sync.respond = lambda commands: {'sync_status': {
+        ok: 'ok', rejected: {'error_code': 22, 'error': "Item not found"}}}
+
+    assert queue.send_batch()
+    assert [command_uuid for command_uuid, _, _, _ in queue.pending()] == [unanswered]
+    assert "abgelehnt" in capsys.readouterr().out
+
+def test_failed_request_backs_off_exponentially(queue, fake_sync, monkeypatch):
+    monkeypatch.setattr(command_queue.time, 'time', lambda: 1000.0)
+    fake_sync.respond = lambda commands: 503
+    queue.complete(1)
+
+    delays = []
+    for _ in range(8):
+        ok = queue.send_batch()
+        queue.record_result(ok)
+        delays.append(queue.retry_at - 1000.0)
+    assert not ok
+    assert delays == [10, 20, 40, 80, 160, 320, 640, 900]
+    assert len(queue.pending()) == 1 and queue.failures == 8
+
+    conn = queue.connect()
+    try:
+        assert conn.execute('SELECT attempts, last_error FROM pending_commands').fetchone() == (8, "HTTP 503")
+    finally:
+        conn.close()
+
+    # Der erste erfolgreiche Request setzt die Wartezeit zurück
+    fake_sync.respond = FakeSync().respond
+    queue.record_result(queue.send_batch())
+    assert queue.retry_at == 0.0 and not queue.has_pending()
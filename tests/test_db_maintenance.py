@@ -0,0 +1,53 @@
+import sqlite3
+
+from db_maintenance import ABORTED, MaintenanceScheduler, connect, last_runs
+
+def create_database(path, auto_vacuum):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(f'PRAGMA auto_vacuum = {auto_vacuum}')
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+        conn.executemany('INSERT INTO items (name) VALUES (?)', [("x" * 200,)] * 500)
+        conn.commit()
+    finally:
+        conn.close()
+
+def auto_vacuum_mode(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+    finally:
+        conn.close()
+
+def test_scheduler_never_converts_the_database(tmp_path):
+    path = str(tmp_path / "old.db")
+    create_database(path, 'NONE')
+
+    results = MaintenanceScheduler(path, backup_dir=str(tmp_path)).run_due(['vacuum'])
+
+    assert results['vacuum'].startswith("auto_vacuum nicht aktiv")
+    assert auto_vacuum_mode(path) == 0
+
+def test_interrupted_integrity_check_is_aborted_and_stays_due(tmp_path):
+    path = str(tmp_path / "tasks.db")
+    create_database(path, 'INCREMENTAL')
+    calls = []
+
+    def is_busy():
+        # Beim ersten Schritt der Prüfung wird der Scheduler beendet
+        calls.append(1)
+        if len(calls) == 2:
+            scheduler.closed = True
+            return True
+        return False
+
+    scheduler = MaintenanceScheduler(path, is_busy=is_busy, backup_dir=str(tmp_path))
+    assert scheduler.run_due(['integrity']) == {'integrity': ABORTED}
+
+    scheduler.closed = False
+    conn = connect(path)
+    try:
+        assert last_runs(conn)['integrity'][2] == ABORTED
+        assert 'integrity' in scheduler.due_tasks(conn)
+    finally:
+        conn.close()
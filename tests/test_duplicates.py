@@ -0,0 +1,23 @@
+import sqlite3
+
+from duplicates import backfill_duplicate_index, duplicate_task_ids
+
+def insert_without_index(db_path, tasks):
+    # Wie eine Datenbank aus der Zeit vor dem Duplikat-Index
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany('INSERT INTO task_state (task_id, task_name, first_seen_at, last_changed_at) '
+                         'VALUES (?, ?, 0, 0)', tasks)
+    conn.close()
+
+def test_backfill_indexes_existing_tasks(db_path):
+    tasks = [(1, "Aldi Gutschein einlösen"), (2, "Aldi Gutschein einloesen"), (3, "Steuererklärung"),
+             (4, "Paket abholen"), (5, "Paket abholen!")]
+    insert_without_index(db_path, tasks)
+    task_ids = [task_id for task_id, _ in tasks]
+    assert duplicate_task_ids(db_path, task_ids) == set()
+
+    # Mehrere kleine Transaktionen, bis nichts mehr fehlt
+    assert backfill_duplicate_index(db_path, batch_size=2) == 5
+    assert backfill_duplicate_index(db_path, batch_size=2) == 0
+    assert duplicate_task_ids(db_path, task_ids) == {1, 2, 4, 5}
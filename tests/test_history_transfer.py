@@ -0,0 +1,69 @@
+import json
+import sqlite3
+
+import pytest
+
+from history_transfer import export_history, import_history
+from inbox_history import init_database
+
+def task_state(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('SELECT task_id, task_name, first_seen_at, last_changed_at FROM task_state '
+                            'ORDER BY task_id').fetchall()
+    finally:
+        conn.close()
+
+def insert_tasks(db_path, tasks):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany('INSERT INTO task_state (task_id, task_name, first_seen_at, last_changed_at) '
+                         'VALUES (?, ?, ?, ?)', tasks)
+    conn.close()
+
+@pytest.mark.parametrize('fmt', ['ndjson', 'columnar'])
+def test_round_trip_keeps_timestamps(db_path, tmp_path, fmt):
+    tasks = [(1, 'Aldi', 1792439683, 1792443000), (2, 'Lidl', 1792368001, 1792368001)]
+    insert_tasks(db_path, tasks)
+    path = str(tmp_path / "export")
+    export_history(db_path, path, fmt)
+
+    target = str(tmp_path / "target.db")
+    import_history(target, path)
+    assert task_state(target) == tasks
+
+def test_merge_keeps_earliest_first_seen_and_newest_name(db_path, tmp_path):
+    insert_tasks(db_path, [(1, 'Aldi Gutschein', 1792439683, 1792443000)])
+    path = str(tmp_path / "export.ndjson")
+    export_history(db_path, path, 'ndjson')
+
+    target = str(tmp_path / "target.db")
+    init_database(target)
+    insert_tasks(target, [(1, 'Aldi', 1792439000, 1792440000)])
+    import_history(target, path)
+    assert task_state(target) == [(1, 'Aldi Gutschein', 1792439000, 1792443000)]
+
+def test_version_1_files_are_still_imported(tmp_path):
+    path = tmp_path / "old.ndjson"
+    lines = [{'type': 'header', 'version': 1},
+             {'table': 'tasks', 'task_id': 1, 'task_name': 'Aldi',
+              'first_seen': '2026-10-19', 'last_changed': '2026-10-19'}]
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines), encoding="utf-8")
+
+    target = str(tmp_path / "target.db")
+    import_history(target, str(path))
+    conn = sqlite3.connect(target)
+    try:
+        assert conn.execute('SELECT task_id, task_name, first_seen FROM tasks').fetchall() == [(1, 'Aldi', '2026-10-19')]
+    finally:
+        conn.close()
+
+def test_import_counts_only_merged_rows(db_path, tmp_path):
+    insert_tasks(db_path, [(1, 'Aldi', 1792439683, 1792443000), (2, 'Lidl', 1792368001, 1792368001)])
+    path = str(tmp_path / "export.ndjson")
+    export_history(db_path, path, 'ndjson')
+
+    target = str(tmp_path / "target.db")
+    assert import_history(target, path)['task_state'] == 2
+    # Ein zweiter Import ändert nichts
+    assert import_history(target, path)['task_state'] == 0
@@ -0,0 +1,78 @@
+from idle_policy import (HIDDEN, IDLE, IDLE_MOUSE_INTERVAL, MOUSE_INTERVAL, PAUSED, VISIBLE,
+                         IdlePolicy)
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def make_policy(clock):
+    return IdlePolicy(idle_after=600, pause_after=3600, poll_factor=4, clock=clock, verbose=False)
+
+def transitions(policy):
+    return [detail.split(" (")[0] for _, decision, _, detail in policy.log if decision == 'transition']
+
+def test_states_follow_visibility_and_session():
+    policy = make_policy(FakeClock())
+    assert policy.state == HIDDEN
+
+    assert policy.set_visible(True)
+    assert not policy.observe_session(599)
+    assert policy.observe_session(600)
+    assert policy.state == IDLE
+    assert policy.observe_session(3600)
+    assert policy.state == PAUSED
+    # Eingabe nach der Pause: zurück in den sichtbaren Betrieb
+    assert policy.observe_session(0)
+    assert policy.state == VISIBLE
+    assert policy.observe_session(0, locked=True)
+    assert policy.state == IDLE
+    assert policy.observe_session(0)
+    assert policy.set_visible(False)
+
+    assert transitions(policy) == [
+        "hidden -> visible", "visible -> idle", "idle -> paused", "paused -> visible",
+        "visible -> idle", "idle -> visible", "visible -> hidden",
+    ]
+
+def test_hiding_while_idle_keeps_the_idle_state():
+    policy = make_policy(FakeClock())
+    policy.observe_session(700)
+    assert policy.state == IDLE
+    assert not policy.set_visible(True)
+    assert policy.observe_session(10)
+    assert policy.state == VISIBLE
+
+def test_poll_interval_and_sync_delay():
+    clock = FakeClock(now=1000.0)
+    policy = make_policy(clock)
+    policy.set_visible(True)
+
+    assert policy.next_sync_delay(last_sync=1000.0, base=30) == 30
+    clock.now = 1030.0
+    assert policy.next_sync_delay(last_sync=1000.0, base=30) == 0
+    assert policy.mouse_interval() == MOUSE_INTERVAL
+
+    policy.observe_session(600)
+    assert policy.next_sync_delay(last_sync=1000.0, base=30) == 90  # 4 x 30 s ab dem letzten Sync
+    assert policy.mouse_interval() == IDLE_MOUSE_INTERVAL
+
+    policy.observe_session(3600)
+    assert policy.next_sync_delay(last_sync=1000.0, base=30) is None
+    assert policy.mouse_interval() == IDLE_MOUSE_INTERVAL
+
+def test_render_is_deferred_while_hidden():
+    policy = make_policy(FakeClock())
+    assert not policy.should_render()
+    assert not policy.should_render()
+
+    policy.set_visible(True)
+    assert policy.take_deferred_render()
+    assert not policy.take_deferred_render()
+    assert policy.should_render()
+
+    decisions = [decision for _, decision, _, _ in policy.log]
+    assert decisions.count('render_skipped') == 2
+    assert decisions.count('render_deferred') == 1
@@ -0,0 +1,22 @@
+import sqlite3
+
+import pytest
+
+import inbox_history
+
+def test_failed_sync_diff_releases_the_database(db_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("Snapshot fehlgeschlagen")
+
+    monkeypatch.setattr(inbox_history, 'record_snapshot', fail)
+    with pytest.raises(RuntimeError):
+        inbox_history.apply_sync_diff([(1, 'Aldi')], [], [], db_path=db_path)
+
+    # Zurückgerollt und keine offene Schreibtransaktion - ein anderer Schreiber kommt sofort dran
+    conn = sqlite3.connect(db_path, timeout=0)
+    try:
+        with conn:
+            conn.execute("INSERT INTO task_state VALUES (2, 'Lidl', 0, 0)")
+        assert conn.execute('SELECT task_id FROM task_state').fetchall() == [(2,)]
+    finally:
+        conn.close()
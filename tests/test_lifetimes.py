@@ -0,0 +1,74 @@
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import inbox_history
+from benchmark import FakeTodoistServer
+from inbox_history import apply_sync_diff, classify_disappeared_tasks
+
+@pytest.fixture
+def server(monkeypatch):
+    """
+    Lokaler Fake der Todoist-APIs, auf den inbox_history zeigt.
+    """
+    with FakeTodoistServer() as server:
+        monkeypatch.setattr(inbox_history, 'API_BASE_URL', server.base_url)
+        monkeypatch.setattr(inbox_history, 'SYNC_API_URL', server.sync_url)
+        yield server
+
+def test_classify_completed_moved_and_deleted(db_path, server, monkeypatch):
+    monkeypatch.setattr(inbox_history, 'COMPLETED_PAGE_SIZE', 2)
+    # Task 3 steht erst auf der zweiten Seite der erledigten Tasks
+    server.set_completed([
+        {'task_id': '9', 'completed_at': '2026-10-01T08:00:00Z'},
+        {'task_id': '8', 'completed_at': '2026-10-02T08:00:00Z'},
+        {'task_id': '3', 'completed_at': '2026-10-03T08:00:00Z', 'project_id': 'inbox'},
+    ])
+    server.set_moved([{'id': '4', 'project_id': 'work'}])
+
+    outcomes = classify_disappeared_tasks([3, 4, 5], db_path=db_path)
+
+    assert outcomes == {
+        3: ('completed', 'inbox', '2026-10-03'),
+        4: ('moved', 'work', None),
+        5: ('deleted', None, None),
+    }
+
+class UnavailableHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_error(503)
+
+    def log_message(self, format, *args):
+        pass
+
+def test_api_error_leaves_tasks_unresolved(db_path, monkeypatch):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), UnavailableHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = httpd.server_address
+        monkeypatch.setattr(inbox_history, 'SYNC_API_URL', f"http://{host}:{port}/sync/v9")
+        # Nicht geklärt heißt nicht gelöscht - die Tasks fehlen im Ergebnis und gelten später als 'unknown'
+        assert classify_disappeared_tasks([3, 4], db_path=db_path) == {}
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+def test_lifetimes_are_stored_before_the_delete(db_path):
+    apply_sync_diff([(3, 'Aldi'), (4, 'Lidl')], [], [], db_path=db_path)
+    apply_sync_diff([], [], [3, 4], db_path=db_path, outcomes={3: ('completed', 'inbox', '2999-01-01')})
+
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute('''
+            SELECT task_id, task_name, outcome, ended, lifetime_days >= 0 FROM task_lifetimes ORDER BY task_id
+        ''').fetchall()
+        remaining = conn.execute('SELECT COUNT(*) FROM task_state').fetchone()[0]
+    finally:
+        conn.close()
+
+    today = inbox_history.clock.today().isoformat()
+    assert rows == [(3, 'Aldi', 'completed', '2999-01-01', 1), (4, 'Lidl', 'unknown', today, 1)]
+    assert remaining == 0
@@ -0,0 +1,153 @@
+import contextlib
+import io
+from datetime import datetime
+
+import inbox_history
+import todoist_api
+from benchmark import INBOX_PROJECT_ID, FakeTodoistServer
+from replay import (CassetteRecorder, CassetteTransport, interaction, print_report, read_cassette, replay,
+                    request_key, split_cycles, synthetic_timeline)
+from storage import open_store
+
+DAY = 86400
+START = datetime(2026, 1, 1, 8).timestamp()
+
+def quiet_replay(cycles, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return replay(cycles, **kwargs)
+
+def test_request_key_ignores_host_and_volatile_params():
+    recorded = request_key("get", "https://api.todoist.com/sync/v9/completed/get_all?offset=0",
+                           {'limit': 200, 'since': "2026-10-01T00:00:00"})
+    replayed = request_key("GET", "http://127.0.0.1:5000/sync/v9/completed/get_all",
+                           {'since': "2026-10-19T00:00:00", 'offset': 0, 'limit': "200"})
+    assert recorded == replayed == ("GET", "/sync/v9/completed/get_all", (('limit', '200'), ('offset', '0')))
+
+def test_transport_answers_in_order_and_counts_misses():
+    transport = CassetteTransport()
+    url = "https://api.todoist.com/rest/v2/projects"
+    transport.begin([interaction(0, "GET", url, None, 200, "[1]"), interaction(0, "GET", url, None, 200, "[2]")])
+    assert transport("GET", url).json() == [1]
+    assert transport("GET", url).json() == [2]
+
+    # Im nächsten Zyklus ohne eigene Antwort gilt die letzte
+    transport.begin([])
+    assert transport("GET", url).json() == [2]
+    assert transport("GET", url + "/other").status_code == 404
+    assert transport.misses == 1
+
+def test_recorded_cassette_replays_to_the_same_state(tmp_path, monkeypatch):
+    path = str(tmp_path / "sync.jsonl")
+    with FakeTodoistServer() as server:
+        monkeypatch.setattr(inbox_history, 'API_BASE_URL', server.base_url)
+        monkeypatch.setattr(inbox_history, 'SYNC_API_URL', server.sync_url)
+        monkeypatch.setattr(todoist_api, 'RATE_LIMIT', False)
+        inbox = [{'id': str(task_id), 'content': f"Task {task_id}", 'project_id': INBOX_PROJECT_ID}
+                 for task_id in (1, 2, 3)]
+
+        # Aufnahme wie replay.record: echte Syncs in eine leere In-Memory-Engine
+        store = open_store('memory')
+        store.init()
+        recorder = CassetteRecorder(path).install()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                server.set_tasks(inbox)
+                inbox_history.sync_tasks(store)
+                # Task 1 erledigt, Task 2 umbenannt, Task 4 neu
+                server.set_tasks([dict(inbox[1], content="Task 2 geändert"), inbox[2],
+                                  {'id': "4", 'content': "Task 4", 'project_id': INBOX_PROJECT_ID}])
+                server.set_completed([{'task_id': "1", 'completed_at': "2026-10-19T12:00:00Z"}])
+                inbox_history.sync_tasks(store)
+        finally:
+            recorder.close()
+
+    cycles = list(split_cycles(read_cassette(path)))
+    assert len(cycles) == 2
+
+    snapshots = []
+    report = quiet_replay(cycles, on_cycle=lambda clock, store, lines: snapshots.append(store.load_names()))
+
+    assert report['failed'] == 0 and report['misses'] == 0 and report['unused'] == 0
+    assert snapshots == [
+        {1: "Task 1", 2: "Task 2", 3: "Task 3"},
+        {2: "Task 2 geändert", 3: "Task 3", 4: "Task 4"},
+    ]
+    assert report['counters']['tasks_deleted'] == 1
+
+def test_simulated_clock_drives_the_history():
+    cycles = synthetic_timeline(days=3, interval=3600, start=START, seed=1, initial_tasks=5)
+    times = []
+    report = quiet_replay(cycles, on_cycle=lambda clock, store, lines: times.append(clock.time()))
+
+    assert report['cycles'] == 72 and report['failed'] == 0 and report['misses'] == 0
+    assert times[0] == START and times[-1] == START + 71 * 3600
+    assert report['simulated_from'] == datetime.fromtimestamp(START).isoformat(timespec='seconds')
+
+def test_replay_is_deterministic_and_ages_tasks():
+    def run():
+        store_tasks = {}
+
+        def keep(clock, store, lines):
+            store_tasks.clear()
+            store_tasks.update(store.load_tasks())
+
+        report = quiet_replay(synthetic_timeline(days=40, interval=6 * 3600, start=START, seed=3,
+                                                 initial_tasks=10, adds_per_day=1.0,
+                                                 completions_per_day=0.5, renames_per_day=0.0), on_cycle=keep)
+        return report, store_tasks
+
+    first, tasks = run()
+    second, _ = run()
+    for key in ('cycles', 'tasks', 'stale_tasks', 'age_buckets', 'counters', 'requests'):
+        assert first[key] == second[key]
+
+    # Alle Zeitstempel stammen aus der simulierten Uhr, nicht aus der echten
+    end = START + 40 * DAY
+    assert all(START <= task['first_seen'] <= end for task in tasks.values())
+    assert first['stale_tasks'] > 0
+
+def test_timeline_and_benchmark_data_follow_the_injected_clock(tmp_path, monkeypatch):
+    import random
+    import sqlite3
+
+    import benchmark
+    from clock import SimulatedClock, use_clock
+
+    monkeypatch.setattr(inbox_history, 'DB_PATH', inbox_history.DB_PATH)
+    end = START + 3 * DAY
+
+    def run():
+        with use_clock(SimulatedClock(end)):
+            first_cycle = next(iter(synthetic_timeline(days=3, interval=3600, seed=1, initial_tasks=5)))
+            db_path = str(tmp_path / "bench.db")
+            benchmark.load_database(db_path, benchmark.generate_inbox(20, random.Random(1)), random.Random(1))
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute('SELECT task_id, first_seen_at, last_changed_at FROM task_state ORDER BY task_id').fetchall()
+        finally:
+            conn.close()
+        return first_cycle[0]['at'], rows
+
+    (first_at, rows), second = run(), run()
+    assert first_at == START
+    assert all(last_changed <= end for _, _, last_changed in rows)
+    assert second == (first_at, rows)
+
+def test_cycle_errors_are_collected_in_the_report():
+    cycles = list(synthetic_timeline(days=1, interval=6 * 3600, start=START, seed=1, initial_tasks=3))
+    # Zyklus 2: Posteingang mit HTTP 500
+    cycles[1] = [dict(entry, status=500) if "/tasks" in entry['url'] else entry for entry in cycles[1]]
+
+    def fail_in_third(clock, store, lines):
+        if clock.time() == START + 12 * 3600:
+            raise RuntimeError("Anzeige kaputt")
+
+    report = quiet_replay(cycles, on_cycle=fail_in_third)
+    assert report['failed'] == 2
+    assert [(number, message) for number, _, message in report['errors']] == [
+        (2, "Posteingang konnte nicht geladen werden"), (3, "Anzeige kaputt")]
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        print_report(report)
+    assert "Fehler in Zyklus 3 (2026-01-01T20:00:00): Anzeige kaputt" in output.getvalue()
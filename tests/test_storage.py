@@ -0,0 +1,40 @@
+import pytest
+
+from storage import MemoryStore
+
+def test_rename_of_unknown_task_is_ignored():
+    store = MemoryStore()
+    store.init()
+    store.apply_diff([(1, 'Aldi')], [], [])
+    store.apply_diff([], [(1, 'Aldi Gutschein'), (2, 'Lidl')], [])
+
+    assert store.load_names() == {1: 'Aldi Gutschein'}
+    assert [(task_id, event) for task_id, event, *_ in store.get_events()] == [(1, 'added'), (1, 'renamed')]
+    assert store.dirty == {1}
+
+def test_sqlite_store_counts_ages_without_loading_tasks(db_path, monkeypatch):
+    import sqlite3
+
+    import clock
+    from inbox_history import count_tasks_by_age
+    from storage import SQLiteStore
+
+    now = int(clock.timestamp())
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany('INSERT INTO task_state (task_id, task_name, first_seen_at, last_changed_at) '
+                         'VALUES (?, ?, ?, ?)',
+                         [(task_id, f"Task {task_id}", now - days * 86400, now - days * 86400)
+                          for task_id, days in enumerate((0, 3, 7, 8, 40, 90, 91, 400), 1)])
+    conn.close()
+
+    store = SQLiteStore(db_path)
+    expected = count_tasks_by_age(store.load_tasks())
+    assert expected == {'0-7': 3, '8-30': 1, '31-90': 2, '>90': 2}
+
+    monkeypatch.setattr(store, 'load_tasks', lambda: pytest.fail("load_tasks beim Zählen"))
+    assert store.count_by_age() == expected
+
+    memory = MemoryStore(backing=SQLiteStore(db_path))
+    memory.init()
+    assert memory.count_by_age() == expected
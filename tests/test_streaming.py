@@ -0,0 +1,76 @@
+import json
+import random
+import tracemalloc
+
+import pytest
+
+import inbox_history
+from benchmark import FakeTodoistServer, generate_inbox
+from inbox_history import diff_inbox_stream, iter_json_array
+
+def task_json(i):
+    return json.dumps({'id': str(i), 'content': f"Task {i} " + "x" * 80, 'project_id': "1000", 'labels': []})
+
+def array_chunks(count, chunk_size=64 * 1024):
+    """
+    Erzeugt ein großes JSON-Array blockweise, ohne es als Ganzes aufzubauen.
+    """
+    pending = "["
+    for i in range(count):
+        pending += ("," if i else "") + task_json(i)
+        while len(pending) >= chunk_size:
+            yield pending[:chunk_size]
+            pending = pending[chunk_size:]
+    yield pending + "]"
+
+def traced_peak(func):
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        result = func()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def test_iter_json_array_splits_elements_across_chunks():
+    document = "[" + ",".join(task_json(i) for i in range(20)) + "]"
+    expected = json.loads(document)
+    for size in (1, 7, 64, len(document)):
+        chunks = (document[i:i + size] for i in range(0, len(document), size))
+        assert list(iter_json_array(chunks)) == expected
+
+def test_iter_json_array_rejects_truncated_input():
+    with pytest.raises(ValueError):
+        list(iter_json_array(iter(['[{"id": "1"}, {"id": '])))
+
+def test_iter_json_array_peak_does_not_grow_with_the_document():
+    count = 40_000  # ca. 5 MB JSON
+    total, peak = traced_peak(lambda: sum(1 for _ in iter_json_array(array_chunks(count))))
+
+    assert total == count
+    # Ein Block (64 KB Text) plus Puffer, unabhängig von der Größe des Dokuments
+    assert peak < 1024 * 1024
+
+def test_streamed_diff_peak_is_far_below_the_response(db_path, monkeypatch):
+    tasks = generate_inbox(30_000, random.Random(1))
+    body_size = len(json.dumps(tasks))
+    db_names = {int(task['id']): task['content'] for task in tasks}
+    # Ein Task umbenannt, einer neu - nur die Änderungen bleiben im Speicher
+    db_names[int(tasks[0]['id'])] = "alter Name"
+    del db_names[int(tasks[1]['id'])]
+
+    with FakeTodoistServer() as server:
+        server.set_tasks(tasks)
+        del tasks
+        monkeypatch.setattr(inbox_history, 'API_BASE_URL', server.base_url)
+        monkeypatch.setattr(inbox_history, 'SYNC_API_URL', server.sync_url)
+        import requests  # Import nicht mitmessen
+
+        result, peak = traced_peak(lambda: diff_inbox_stream(db_names, db_path=db_path))
+
+    new_tasks, renamed_tasks, deleted, todoist_count = result
+    assert todoist_count == 30_000
+    assert [task_id for task_id, _ in new_tasks] == [10_000_001]
+    assert [task_id for task_id, _ in renamed_tasks] == [10_000_000]
+    assert deleted == {}
+    assert peak < body_size / 4
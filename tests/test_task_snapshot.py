@@ -0,0 +1,154 @@
+import threading
+
+from task_snapshot import (SnapshotReader, TaskSnapshot, data_path, open_snapshot, publish_snapshot,
+                           read_generation, snapshot_path_for)
+
+def rows(n, prefix="Task"):
+    return [(task_id, f"{prefix} {task_id}", 1_700_000_000 + task_id, 1_700_000_000 + 2 * task_id)
+            for task_id in range(1, n + 1)]
+
+def test_concurrent_publishers_get_distinct_generations(tmp_path):
+    path = str(tmp_path / "tasks.snap")
+    generations = []
+    errors = []
+
+    def publisher():
+        try:
+            for _ in range(10):
+                generations.append(publish_snapshot(rows(50), path))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=publisher) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert sorted(generations) == list(range(1, 41))
+    assert read_generation(path) == 40
+
+def test_mapped_generation_is_never_rewritten(tmp_path):
+    path = str(tmp_path / "tasks.snap")
+    publish_snapshot(rows(3, "Alt"), path)
+    snapshot = TaskSnapshot(data_path(path, 1))
+    try:
+        for _ in range(5):
+            publish_snapshot(rows(100, "Neu"), path)
+        # Die gemappte Generation bleibt lesbar und unverändert
+        assert len(snapshot) == 3
+        assert snapshot[2]['name'] == "Alt 2"
+    finally:
+        snapshot.close()
+
+def test_reader_follows_new_generations(tmp_path):
+    path = str(tmp_path / "tasks.snap")
+    reader = SnapshotReader(path)
+    assert reader.current() is None
+
+    publish_snapshot(rows(2), path)
+    first = reader.current()
+    assert first.generation == 1 and reader.current() is first
+
+    publish_snapshot(rows(3), path)
+    assert reader.current().generation == 2
+    assert dict(reader.current()[3]) == {'name': "Task 3", 'first_seen': 1_700_000_003, 'last_changed': 1_700_000_006}
+    reader.close()
+
+def test_find_matches_within_names_only(tmp_path):
+    path = str(tmp_path / "tasks.snap")
+    publish_snapshot([(1, "Aldi Gutschein", 0, 0), (2, "", 0, 0), (3, "ab", 0, 0),
+                      (4, "cd Aldi Aldi", 0, 0), (5, "", 0, 0)], path)
+    snapshot = TaskSnapshot(data_path(path, 1))
+    try:
+        assert snapshot.find("Aldi") == [(1, "Aldi Gutschein"), (4, "cd Aldi Aldi")]
+        # Treffer über eine Namensgrenze hinweg ("ab" + "cd") zählen nicht
+        assert snapshot.find("bc") == []
+        assert snapshot.find("") == []
+        assert snapshot.find("Lidl") == []
+    finally:
+        snapshot.close()
+
+def test_open_snapshot_is_closable(tmp_path):
+    path = str(tmp_path / "tasks.snap")
+    assert open_snapshot(path) is None
+    publish_snapshot([(1, "Aldi Gutschein", 0, 0)], path)
+    with open_snapshot(path) as snapshot:
+        assert snapshot.generation == 1
+        assert snapshot[1]['name'] == "Aldi Gutschein"
+    assert snapshot.map.closed
+
+def test_snapshot_is_stale_after_a_write_without_publishing(db_path, tmp_path):
+    import inbox_history
+    from storage import SQLiteStore
+    path = str(tmp_path / "tasks.snap")
+    store = SQLiteStore(db_path, snapshot_path=path)
+    store.apply_diff([(1, "Aldi Gutschein")], [], [])
+
+    with open_snapshot(path, db_path) as snapshot:
+        assert snapshot.data_version == store.data_version()
+        assert 1 in snapshot
+
+    # Schreibt direkt in die Datenbank, ohne einen Snapshot zu veröffentlichen
+    inbox_history.insert_new_task(2, "Lidl")
+    assert open_snapshot(path, db_path) is None
+
+    store.publish_snapshot()
+    with open_snapshot(path, db_path) as snapshot:
+        assert 2 in snapshot
+
+def test_snapshot_is_not_used_without_a_data_version(tmp_path):
+    path = str(tmp_path / "tasks.snap")
+    publish_snapshot([(1, "Aldi Gutschein", 0, 0)], path)
+    assert open_snapshot(path, str(tmp_path / "missing.db")) is None
+    assert not (tmp_path / "missing.db").exists()
+
+def test_snapshot_and_sqlite_readers_agree(db_path):
+    import contextlib
+    import io
+    import os
+    import sqlite3
+    from datetime import datetime
+
+    import find_changes
+    import inspect_db
+    from storage import SQLiteStore
+
+    morning = int(datetime(2026, 10, 19, 9).timestamp())
+    evening = int(datetime(2026, 10, 19, 21).timestamp())
+    next_day = int(datetime(2026, 10, 20, 9).timestamp())
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany('INSERT INTO task_state (task_id, task_name, first_seen_at, last_changed_at) '
+                         'VALUES (?, ?, ?, ?)',
+                         [(1, "Aldi Gutschein", morning, evening),  # am selben Tag umbenannt
+                          (2, "ALDI Markt", morning, next_day),
+                          (3, "Lidl", morning, next_day),
+                          (4, "Wochenmarkt aldi", evening, evening),
+                          (5, "Äpfel", morning, morning)])
+    path = snapshot_path_for(db_path)
+    SQLiteStore(db_path, snapshot_path=path).publish_snapshot()
+
+    def run(report):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            report(db_path)
+        return [line for line in output.getvalue().splitlines() if not line.startswith("Quelle:")]
+
+    with open_snapshot(path, db_path) as snapshot:
+        from_snapshot = find_changes.snapshot_changes(snapshot, "aldi")
+    conn = sqlite3.connect(db_path)
+    try:
+        from_sqlite = find_changes.database_changes(conn, "aldi")
+    finally:
+        conn.close()
+    assert [task[0] for task in from_snapshot[0]] == [1, 2, 4]
+    assert [task[0] for task in from_snapshot[1]] == [2, 3]
+    assert from_snapshot == from_sqlite
+
+    reports = [run(find_changes.find_changed_task), run(inspect_db.inspect_database)]
+    # Ohne Zeigerdatei lesen beide Skripte direkt aus SQLite
+    os.remove(path)
+    assert open_snapshot(path, db_path) is None
+    assert [run(find_changes.find_changed_task), run(inspect_db.inspect_database)] == reports
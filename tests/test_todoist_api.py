@@ -0,0 +1,17 @@
+import todoist_api
+from todoist_api import PRIORITY_INTERACTIVE, TokenBucket
+
+def test_block_refills_only_after_the_block(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(todoist_api.time, 'time', lambda: now[0])
+    bucket = TokenBucket(str(tmp_path / "bucket.db"), capacity=10, refill_rate=1.0, background_reserve=0)
+
+    bucket.block_for(30)
+    now[0] += 10
+    assert bucket.try_take(PRIORITY_INTERACTIVE) == 20
+
+    # Direkt nach der Sperre ist das Budget leer, nicht schon während der Sperre aufgefüllt
+    now[0] += 20
+    assert bucket.try_take(PRIORITY_INTERACTIVE) == 1
+    now[0] += 1
+    assert bucket.try_take(PRIORITY_INTERACTIVE) == 0
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from storage import MemoryStore
+from webhook_receiver import (WebhookReceiver, generate_events, send_event, sign, verify_signature,
+                              webhook_diff)
+
+SECRET = "test-secret"
+INBOX = "1000"
+
+@pytest.fixture
+def receiver():
+    events = []
+    receiver = WebhookReceiver(lambda name, data: events.append((name, data)), SECRET, port=0).start()
+    receiver.events = events
+    yield receiver
+    receiver.stop()
+
+def test_signature_is_base64_hmac_sha256():
+    body = b'{"event_name": "item:added"}'
+    # Referenzwert: echo -n '<body>' | openssl dgst -sha256 -hmac test-secret -binary | base64
+    assert sign(SECRET, body) == "m4Fr8glgSwSF6FwhBgtXXwpPwH6c6bssAgXycpF3h/A="
+    assert verify_signature(SECRET, body, sign(SECRET, body))
+    assert not verify_signature(SECRET, body + b" ", sign(SECRET, body))
+    assert not verify_signature("other", body, sign(SECRET, body))
+    assert not verify_signature(SECRET, body, None)
+    assert not verify_signature("", body, sign("", body))
+
+def test_unsigned_or_forged_requests_are_rejected(receiver):
+    data = {'id': "1", 'content': "Aldi", 'project_id': INBOX}
+    assert send_event(receiver.url, "falsches-secret", 'item:added', data) == 401
+
+    body = json.dumps({'event_name': 'item:added', 'event_data': data}).encode()
+    assert receiver.handle(body, None, None) == 401
+    assert receiver.handle(body.replace(b"Aldi", b"Lidl"), sign(SECRET, body), None) == 401
+
+    assert receiver.rejected == 3
+    assert receiver.events == []
+
+def test_redelivered_events_are_applied_once(receiver):
+    data = {'id': "1", 'content': "Aldi", 'project_id': INBOX}
+    assert send_event(receiver.url, SECRET, 'item:added', data, delivery_id="d-1") == 200
+    assert send_event(receiver.url, SECRET, 'item:added', data, delivery_id="d-1") == 200
+    assert receiver.events == [('item:added', data)]
+
+def test_failed_event_can_be_delivered_again():
+    calls = []
+
+    def on_event(name, data):
+        calls.append(name)
+        if len(calls) == 1:
+            raise RuntimeError("Datenbank gesperrt")
+
+    receiver = WebhookReceiver(on_event, SECRET, port=0).start()
+    try:
+        data = {'id': "1", 'content': "Aldi", 'project_id': INBOX}
+        assert send_event(receiver.url, SECRET, 'item:added', data, delivery_id="d-1") == 500
+        assert send_event(receiver.url, SECRET, 'item:added', data, delivery_id="d-1") == 200
+    finally:
+        receiver.stop()
+    assert calls == ['item:added', 'item:added']
+
+def test_generated_events_keep_the_store_in_step():
+    store = MemoryStore()
+    expected = {}
+
+    def apply_event(name, data):
+        task_id = int(data['id'])
+        if name == 'item:added' or (name == 'item:updated' and data['project_id'] == INBOX):
+            expected[task_id] = data['content']
+        else:
+            expected.pop(task_id, None)
+        new_tasks, renamed_tasks, deleted_task_ids, outcomes = webhook_diff(name, data, INBOX, store.load_names())
+        store.apply_diff(new_tasks, renamed_tasks, deleted_task_ids, outcomes=outcomes)
+
+    receiver = WebhookReceiver(apply_event, SECRET, port=0).start()
+    try:
+        statuses = generate_events(receiver.url, SECRET, INBOX, count=150, seed=7)
+    finally:
+        receiver.stop()
+
+    assert statuses == {200: 150}
+    assert receiver.received == 150
+    assert store.load_names() == expected
+    outcomes = {row[2] for row in store.get_lifetimes()}
+    assert outcomes <= {'completed', 'deleted', 'moved'} and outcomes
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import widget_layout
+from widget_layout import TaskLayout, TaskRowCache
+
+class FixedMetrics:
+    """
+    Schriftmaße ohne Tk: jedes Zeichen ist 1 Pixel breit.
+    """
+
+    def text_width(self, text):
+        return len(text)
+
+    def truncate(self, text, max_px):
+        return text[:max_px]
+
+def timestamp(day, hour=12):
+    return int(datetime(2026, 10, day, hour).timestamp())
+
+def test_dates_are_cached_per_day():
+    cache = TaskRowCache(TaskLayout(FixedMetrics(), 200))
+
+    assert cache.format_date(timestamp(19, 8)) == "19.10.2026"
+    assert cache.format_date(timestamp(19, 18)) == "19.10.2026"
+    assert len(cache.dates) == 1
+
+def test_date_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(widget_layout, 'DATE_CACHE_SIZE', 5)
+    cache = TaskRowCache(TaskLayout(FixedMetrics(), 200))
+
+    for day in range(1, 21):
+        cache.format_date(timestamp(day))
+    assert len(cache.dates) == 5
+    assert cache.format_date(timestamp(1)) == "01.10.2026"
+
+def test_new_date_format_replaces_cached_dates():
+    layout = TaskLayout(FixedMetrics(), 200)
+    cache = TaskRowCache(layout)
+    cache.format_date(timestamp(19))
+
+    layout.configure(date_format='%Y-%m-%d')
+    assert cache.format_date(timestamp(19)) == "2026-10-19"
+    assert len(cache.dates) == 1
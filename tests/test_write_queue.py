@@ -0,0 +1,131 @@
+import sqlite3
+import threading
+
+import write_queue
+from storage import SQLiteStore
+from write_queue import WriteBehindQueue
+
+class GatedStore(SQLiteStore):
+    """
+    SQLite-Engine, deren apply_diff wartet, bis der Test sie freigibt.
+    """
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def apply_diff(self, *args, **kwargs):
+        self.entered.set()
+        assert self.release.wait(5)
+        super().apply_diff(*args, **kwargs)
+
+class FailingStore(SQLiteStore):
+    """
+    SQLite-Engine, deren erste failures Schreibvorgänge scheitern.
+    """
+
+    def __init__(self, db_path, failures):
+        super().__init__(db_path)
+        self.failures = failures
+        self.calls = 0
+
+    def apply_diff(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise sqlite3.IntegrityError("UNIQUE constraint failed: task_state.task_id")
+        super().apply_diff(*args, **kwargs)
+
+def task_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('SELECT task_id, task_name FROM task_state').fetchall()
+    finally:
+        conn.close()
+
+def test_in_flight_batch_stays_visible(db_path):
+    store = GatedStore(db_path)
+    queue = WriteBehindQueue(store, window=0).start()
+    try:
+        queue.add(1, 'Aldi')
+        assert store.entered.wait(5)
+
+        # Der Batch wird gerade geschrieben - ein Sync-Diff muss ihn trotzdem sehen
+        assert store.load_tasks() == {}
+        db_tasks = queue.load(store.load_tasks)
+        assert db_tasks[1]['name'] == 'Aldi'
+
+        # Kommt der Task trotzdem noch einmal, darf das Einfügen nicht scheitern
+        queue.add(1, 'Aldi')
+        store.release.set()
+        assert queue.flush(timeout=5)
+
+        # Nach dem Commit kommt derselbe Stand aus der Datenbank
+        assert queue.load(store.load_tasks).keys() == store.load_tasks().keys() == {1}
+    finally:
+        store.release.set()
+        queue.close()
+
+    assert task_rows(db_path) == [(1, 'Aldi')]
+
+def test_insert_is_idempotent(db_path):
+    store = SQLiteStore(db_path)
+    store.apply_diff([(1, 'Aldi')], [], [])
+    first_seen = store.load_tasks()[1]['first_seen']
+    store.apply_diff([(1, 'Aldi Gutschein')], [], [])
+
+    tasks = store.load_tasks()
+    assert tasks[1]['name'] == 'Aldi Gutschein'
+    assert tasks[1]['first_seen'] == first_seen
+
+def test_failed_batch_is_dropped_after_max_retries(db_path, monkeypatch):
+    monkeypatch.setattr(write_queue, 'RETRY_DELAY', 0)
+    monkeypatch.setattr(write_queue, 'MAX_RETRIES', 3)
+    store = FailingStore(db_path, failures=3)
+    queue = WriteBehindQueue(store, window=0).start()
+    try:
+        queue.add(1, 'Aldi')
+        assert queue.flush(timeout=5)
+        assert store.calls == 3 and queue.pending == {}
+
+        # Die Queue bleibt nicht hängen - spätere Änderungen werden geschrieben
+        queue.add(2, 'Lidl')
+        assert queue.flush(timeout=5)
+    finally:
+        queue.close()
+
+    assert task_rows(db_path) == [(2, 'Lidl')]
+
+def test_widget_load_sees_a_batch_committed_while_loading(db_path, tmp_path):
+    from types import SimpleNamespace
+    from desktop_widget import TaskDesktopWidget
+    from task_snapshot import SnapshotReader
+
+    store = GatedStore(db_path)
+    store.snapshot_path = str(tmp_path / "tasks.snap")
+    store.publish_snapshot()
+    queue = WriteBehindQueue(store, window=0).start()
+    widget = SimpleNamespace(snapshots=SnapshotReader(store.snapshot_path), store=store, write_queue=queue)
+
+    def read_then_commit():
+        # Liest noch den alten Snapshot, danach wird der Batch committet und veröffentlicht -
+        # ohne dass in_flight oder pending ihn noch enthalten
+        db_tasks = TaskDesktopWidget.read_db_tasks(widget)
+        store.release.set()
+        assert queue.flush(timeout=5)
+        return db_tasks
+
+    widget.read_db_tasks = read_then_commit
+    try:
+        queue.add(1, 'Aldi')
+        assert store.entered.wait(5)
+        db_tasks = TaskDesktopWidget.load_db_tasks(widget)
+        assert db_tasks[1]['name'] == 'Aldi'
+
+        # Danach kommt der Stand aus dem neuen Snapshot
+        widget.read_db_tasks = lambda: TaskDesktopWidget.read_db_tasks(widget)
+        assert TaskDesktopWidget.load_db_tasks(widget)[1]['name'] == 'Aldi'
+    finally:
+        store.release.set()
+        queue.close()
+        widget.snapshots.close()
@@ -0,0 +1,267 @@
+import sqlite3
+import threading
+import time
+
+# --------------------------
+# Konfiguration
+# --------------------------
+DB_PATH = "tasks_history.db"
+
+# Todoist erlaubt ca. 450 Requests pro 15 Minuten und Token.
+# Das Budget wird über alle Prozesse geteilt, die dieselbe Datenbank nutzen.
+RATE_LIMIT_REQUESTS = 450
+RATE_LIMIT_WINDOW = 900  # Sekunden
+BUCKET_CAPACITY = 50  # Maximaler Burst
+BACKGROUND_RESERVE = 10  # Tokens, die für interaktive Aufrufe frei bleiben
+MAX_RETRIES = 3  # Wiederholungen nach HTTP 429
+DEFAULT_RETRY_AFTER = 60  # Sekunden, falls kein Retry-After-Header gesendet wird
+
+# Callbacks (response, error) nach jedem Request, z.B. für den Metrik-Exporter
+RESPONSE_HOOKS = []
+
+# Ersatz für requests.request mit derselben Signatur, z.B. das Abspielen einer Kassette (replay).
+# Beim Abspielen gibt es kein echtes Budget - RATE_LIMIT = False umgeht den Token-Bucket.
+TRANSPORT = None
+RATE_LIMIT = True
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+
+# Maximale Wartezeit auf ein Token je Priorität (Sekunden)
+MAX_WAIT = {
+    PRIORITY_INTERACTIVE: 15,
+    PRIORITY_BACKGROUND: 0,  # Hintergrund-Polls werden lieber übersprungen
+}
+
+# --------------------------
+# Token-Bucket
+# --------------------------
+class TokenBucket:
+    """
+    Token-Bucket-Ratenbegrenzer, dessen Zustand in der SQLite-Datenbank liegt.
+    Dadurch teilen sich alle Prozesse und Scripts auf einem Rechner dasselbe Budget.
+    Interaktive Aufrufe haben Vorrang: Hintergrund-Aufrufe lassen eine Reserve
+    übrig und warten, solange im selben Prozess ein interaktiver Aufruf wartet.
+    """
+
+    def __init__(self, db_path=DB_PATH, capacity=BUCKET_CAPACITY,
+                 refill_rate=RATE_LIMIT_REQUESTS / RATE_LIMIT_WINDOW,
+                 background_reserve=BACKGROUND_RESERVE):
+        self.db_path = db_path
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.background_reserve = background_reserve
+        self.lock = threading.Lock()
+        self.interactive_waiting = 0
+        self.table_ready = False
+
+    def connect(self):
+        """
+        Öffnet eine Verbindung und legt die Budget-Tabelle bei Bedarf an.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+        if not self.table_ready:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS api_rate_limit (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    blocked_until REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('''
+                INSERT OR IGNORE INTO api_rate_limit (id, tokens, updated_at, blocked_until)
+                VALUES (1, ?, ?, 0)
+            ''', (self.capacity, time.time()))
+            self.table_ready = True
+        return conn
+
+    def try_take(self, priority):
+        """
+        Versucht atomar ein Token zu entnehmen.
+        Gibt 0 zurück wenn erfolgreich, sonst die geschätzte Wartezeit in Sekunden.
+        """
+        needed = 1
+        if priority != PRIORITY_INTERACTIVE:
+            needed += self.background_reserve
+
+        conn = self.connect()
+        try:
+            # BEGIN IMMEDIATE sperrt die Datenbank für andere Schreiber,
+            # damit zwei Prozesse nicht dasselbe Token verbrauchen
+            conn.execute('BEGIN IMMEDIATE')
+            tokens, updated_at, blocked_until = conn.execute(
+                'SELECT tokens, updated_at, blocked_until FROM api_rate_limit WHERE id = 1'
+            ).fetchone()
+
+            now = time.time()
+            tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.refill_rate)
+
+            if now < blocked_until:
+                # Während der Sperre nichts schreiben - aufgefüllt wird erst ab ihrem Ende
+                conn.execute('COMMIT')
+                return blocked_until - now
+            elif tokens >= needed:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (needed - tokens) / self.refill_rate
+
+            conn.execute(
+                'UPDATE api_rate_limit SET tokens = ?, updated_at = ? WHERE id = 1',
+                (tokens, now)
+            )
+            conn.execute('COMMIT')
+            return wait
+        finally:
+            conn.close()
+
+    def acquire(self, priority=PRIORITY_BACKGROUND, max_wait=None):
+        """
+        Wartet bis ein Token verfügbar ist (höchstens max_wait Sekunden).
+        Gibt True zurück wenn ein Request gesendet werden darf.
+        """
+        if max_wait is None:
+            max_wait = MAX_WAIT.get(priority, 0)
+        deadline = time.time() + max_wait
+        interactive = priority == PRIORITY_INTERACTIVE
+
+        if interactive:
+            with self.lock:
+                self.interactive_waiting += 1
+        try:
+            while True:
+                # Hintergrund-Aufrufe lassen wartenden interaktiven Aufrufen den Vortritt
+                if not interactive and self.interactive_waiting:
+                    wait = 0.1
+                else:
+                    try:
+                        with self.lock:
+                            wait = self.try_take(priority)
+                    except sqlite3.Error as e:
+                        # Ohne Datenbank lieber ungebremst weiterarbeiten als gar nicht
+                        print(f"Warnung: Rate-Limit-Budget nicht verfügbar: {e}")
+                        return True
+                    if wait == 0:
+                        return True
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(wait, remaining))
+        finally:
+            if interactive:
+                with self.lock:
+                    self.interactive_waiting -= 1
+
+    def block_for(self, seconds):
+        """
+        Sperrt das Budget für alle Prozesse (z.B. nach HTTP 429 mit Retry-After).
+        """
+        until = time.time() + seconds
+        try:
+            with self.lock:
+                conn = self.connect()
+                try:
+                    # updated_at auf das Ende der Sperre, damit nicht schon während der Sperre aufgefüllt wird
+                    conn.execute('''
+                        UPDATE api_rate_limit
+                        SET blocked_until = MAX(blocked_until, ?), tokens = 0, updated_at = MAX(blocked_until, ?)
+                        WHERE id = 1
+                    ''', (until, until))
+                finally:
+                    conn.close()
+        except sqlite3.Error as e:
+            print(f"Warnung: Rate-Limit-Sperre konnte nicht gespeichert werden: {e}")
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_rate_limiter(db_path=DB_PATH):
+    """
+    Gibt den gemeinsamen Token-Bucket für eine Datenbank zurück.
+    """
+    with _buckets_lock:
+        if db_path not in _buckets:
+            _buckets[db_path] = TokenBucket(db_path)
+        return _buckets[db_path]
+
+def parse_retry_after(value):
+    """
+    Wertet einen Retry-After-Header aus (Sekunden oder HTTP-Datum).
+    """
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from datetime import datetime, timezone
+        from email.utils import parsedate_to_datetime
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+# --------------------------
+# API-Aufrufe
+# --------------------------
+def api_get(url, headers, params=None, priority=PRIORITY_BACKGROUND, db_path=DB_PATH, stream=False):
+    """
+    Führt einen GET-Request gegen die Todoist-API aus und beachtet dabei das
+    gemeinsame Rate-Limit sowie HTTP 429 / Retry-After.
+    Gibt die Response zurück oder None, wenn kein Budget verfügbar war.
+    Mit stream=True wird der Body erst beim Lesen geladen (Response danach schließen).
+    Netzwerkfehler werden wie bei requests.get weitergereicht.
+    """
+    return api_request("GET", url, headers, params=params, priority=priority, db_path=db_path, stream=stream)
+
+def api_post(url, headers, data=None, priority=PRIORITY_BACKGROUND, db_path=DB_PATH):
+    """
+    POST-Request (z.B. Befehle an die Sync-API) mit demselben Rate-Limit wie api_get.
+    """
+    return api_request("POST", url, headers, data=data, priority=priority, db_path=db_path)
+
+def api_request(method, url, headers, params=None, data=None, priority=PRIORITY_BACKGROUND,
+                db_path=DB_PATH, stream=False):
+    """
+    Gemeinsame Umsetzung von api_get und api_post.
+    """
+    send = TRANSPORT
+    if send is None:
+        # requests erst beim ersten Request laden - reine DB-Aufrufe sparen so die Importzeit
+        import requests
+        send = requests.request
+
+    bucket = get_rate_limiter(db_path) if RATE_LIMIT else None
+
+    for attempt in range(MAX_RETRIES + 1):
+        if bucket is not None and not bucket.acquire(priority):
+            print(f"Rate-Limit: Request übersprungen ({priority}): {url}")
+            return None
+
+        try:
+            response = send(method, url, headers=headers, params=params, data=data, stream=stream)
+        except Exception as e:
+            for hook in RESPONSE_HOOKS:
+                hook(None, e)
+            raise
+        for hook in RESPONSE_HOOKS:
+            hook(response, None)
+
+        if response.status_code != 429:
+            return response
+
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        print(f"Rate-Limit erreicht (HTTP 429), Retry-After: {retry_after:.0f}s")
+        if bucket is not None:
+            bucket.block_for(retry_after)
+
+        # Hintergrund-Polls warten nicht, sondern versuchen es beim nächsten Zyklus
+        if priority != PRIORITY_INTERACTIVE or retry_after > MAX_WAIT[PRIORITY_INTERACTIVE]:
+            return response
+        # Verbindung vor dem nächsten Versuch freigeben (wichtig bei stream=True)
+        response.close()
+
+    return response
@@ -0,0 +1,308 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import clock
+
+# --------------------------
+# Konfiguration
+# --------------------------
+WEBHOOK_HOST = "127.0.0.1"  # Todoist erreicht den Empfänger über einen Tunnel/Reverse-Proxy
+WEBHOOK_PORT = int(os.environ.get("TODOIST_WEBHOOK_PORT", "0"))  # 0 = deaktiviert
+WEBHOOK_PATH = "/todoist/webhook"
+# Client-Secret der Todoist-App, mit dem die Webhooks signiert werden
+WEBHOOK_SECRET = os.environ.get("TODOIST_CLIENT_SECRET", "")
+SIGNATURE_HEADER = "X-Todoist-Hmac-SHA256"
+DELIVERY_HEADER = "X-Todoist-Delivery-ID"
+MAX_BODY_BYTES = 1024 * 1024
+SEEN_DELIVERIES = 1000  # Todoist stellt bei Fehlern erneut zu - so viele IDs werden gemerkt
+# Mit Webhooks dient der Poll nur noch als Konsistenzprüfung
+CONSISTENCY_INTERVAL = 3600  # Sekunden
+
+HANDLED_EVENTS = ('item:added', 'item:updated', 'item:completed', 'item:uncompleted', 'item:deleted')
+
+# --------------------------
+# Signatur
+# --------------------------
+def sign(secret, body):
+    """
+    Signatur wie im Header X-Todoist-Hmac-SHA256: Base64 des HMAC-SHA256 über den Body.
+    """
+    digest = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+def verify_signature(secret, body, signature):
+    if not secret or not signature:
+        return False
+    return hmac.compare_digest(sign(secret, body), signature.strip())
+
+# --------------------------
+# Ereignisse -> Diff
+# --------------------------
+def webhook_diff(event_name, event_data, inbox_project_id, db_names, today=None):
+    """
+    Übersetzt ein Webhook-Ereignis in einen Diff wie beim Sync:
+    (neue Tasks, umbenannte Tasks, entfernte Task-IDs, Klassifizierung der entfernten).
+    db_names ist {task_id: name} des aktuellen Stands (siehe TaskStore.load_names).
+    Ereignisse außerhalb des Posteingangs ändern nur etwas, wenn der Task bisher darin lag.
+    """
+    new_tasks, renamed_tasks, deleted_task_ids, outcomes = [], [], [], {}
+    if event_name not in HANDLED_EVENTS or not event_data.get('id'):
+        return new_tasks, renamed_tasks, deleted_task_ids, outcomes
+
+    task_id = int(event_data['id'])
+    name = event_data.get('content', 'Unbekannt')
+    project_id = event_data.get('project_id')
+    in_inbox = str(project_id) == str(inbox_project_id)
+    known = task_id in db_names
+
+    if event_name == 'item:completed':
+        if known:
+            completed_at = event_data.get('completed_at') or ""
+            deleted_task_ids.append(task_id)
+            outcomes[task_id] = ('completed', project_id, completed_at[:10] or None)
+    elif event_name == 'item:deleted':
+        if known:
+            deleted_task_ids.append(task_id)
+            outcomes[task_id] = ('deleted', project_id, None)
+    elif not in_inbox:
+        # item:updated in ein anderes Projekt = verschoben
+        if known and event_name == 'item:updated':
+            deleted_task_ids.append(task_id)
+            outcomes[task_id] = ('moved', project_id, (today or clock.today()).isoformat())
+    elif event_data.get('checked') or event_data.get('is_deleted'):
+        pass
+    elif not known:
+        new_tasks.append((task_id, name))
+    elif db_names[task_id] != name:
+        renamed_tasks.append((task_id, name))
+
+    return new_tasks, renamed_tasks, deleted_task_ids, outcomes
+
+# --------------------------
+# HTTP-Empfänger
+# --------------------------
+class WebhookReceiver:
+    """
+    Kleiner HTTP-Server für Todoist-Webhooks. Prüft die HMAC-Signatur, verwirft
+    doppelt zugestellte Ereignisse und ruft on_event(event_name, event_data) auf -
+    nacheinander, auch wenn mehrere Requests gleichzeitig eintreffen.
+    """
+
+    def __init__(self, on_event, secret=WEBHOOK_SECRET, port=WEBHOOK_PORT, host=WEBHOOK_HOST, path=WEBHOOK_PATH):
+        if not secret:
+            raise ValueError("Webhook-Empfänger braucht das Client-Secret (TODOIST_CLIENT_SECRET)")
+        self.on_event = on_event
+        self.secret = secret
+        self.port = port
+        self.host = host
+        self.path = path
+        self.httpd = None
+        self.lock = threading.Lock()
+        self.seen = OrderedDict()
+        self.received = 0
+        self.rejected = 0
+        self.last_event_time = None
+
+    def handle(self, body, signature, delivery_id):
+        """
+        Verarbeitet einen Request-Body. Gibt den HTTP-Status zurück.
+        """
+        if not verify_signature(self.secret, body, signature):
+            self.rejected += 1
+            return 401
+        try:
+            event = json.loads(body)
+        except ValueError:
+            return 400
+        if not isinstance(event, dict):
+            return 400
+
+        with self.lock:
+            if delivery_id:
+                if delivery_id in self.seen:
+                    return 200
+                self.seen[delivery_id] = True
+                while len(self.seen) > SEEN_DELIVERIES:
+                    self.seen.popitem(last=False)
+            self.received += 1
+            self.last_event_time = time.time()
+            try:
+                self.on_event(event.get('event_name'), event.get('event_data') or {})
+            except Exception as e:
+                print(f"Fehler beim Verarbeiten des Webhooks {event.get('event_name')}: {e}")
+                # Bei 5xx stellt Todoist später erneut zu
+                if delivery_id:
+                    self.seen.pop(delivery_id, None)
+                return 500
+        return 200
+
+    def start(self):
+        """
+        Startet den HTTP-Server in einem Daemon-Thread.
+        """
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.split("?")[0] != receiver.path:
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > MAX_BODY_BYTES:
+                    self.send_error(413)
+                    return
+                body = self.rfile.read(length)
+                status = receiver.handle(body, self.headers.get(SIGNATURE_HEADER),
+                                         self.headers.get(DELIVERY_HEADER))
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        print(f"Webhook-Empfänger aktiv unter http://{self.host}:{self.httpd.server_address[1]}{self.path}")
+        return self
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.httpd.server_address[1]}{self.path}"
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+# --------------------------
+# Ereignis-Generator (lokale Tests)
+# --------------------------
+def send_event(url, secret, event_name, event_data, delivery_id=None):
+    """
+    Sendet ein signiertes Ereignis wie Todoist an einen Empfänger.
+    Gibt den HTTP-Status zurück.
+    """
+    import urllib.error
+    import urllib.request
+
+    body = json.dumps({'event_name': event_name, 'event_data': event_data, 'version': "9"}).encode("utf-8")
+    headers = {"Content-Type": "application/json", SIGNATURE_HEADER: sign(secret, body)}
+    if delivery_id:
+        headers[DELIVERY_HEADER] = delivery_id
+    request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def generate_events(url, secret, project_id, count, seed=42):
+    """
+    Spielt eine zufällige Folge von Ereignissen ab (Anlegen, Umbenennen,
+    Erledigen, Löschen, Verschieben) und gibt die Anzahl je HTTP-Status zurück.
+    """
+    import random
+
+    rng = random.Random(seed)
+    active = {}
+    statuses = {}
+    next_id = 900000000
+    for i in range(count):
+        action = rng.random() if active else 0.0
+        if action < 0.4:
+            next_id += 1
+            task_id = str(next_id)
+            active[task_id] = f"Webhook-Task {next_id}"
+            event = ('item:added', {'id': task_id, 'content': active[task_id], 'project_id': project_id})
+        else:
+            task_id = rng.choice(sorted(active))
+            if action < 0.7:
+                active[task_id] += " (geändert)"
+                event = ('item:updated', {'id': task_id, 'content': active[task_id], 'project_id': project_id})
+            elif action < 0.85:
+                event = ('item:completed', {'id': task_id, 'content': active.pop(task_id), 'project_id': project_id,
+                                            'checked': True, 'completed_at': f"{clock.today().isoformat()}T12:00:00Z"})
+            elif action < 0.95:
+                event = ('item:deleted', {'id': task_id, 'content': active.pop(task_id), 'project_id': project_id,
+                                          'is_deleted': True})
+            else:
+                event = ('item:updated', {'id': task_id, 'content': active.pop(task_id), 'project_id': "other"})
+        status = send_event(url, secret, *event, delivery_id=f"generated-{seed}-{i}")
+        statuses[status] = statuses.get(status, 0) + 1
+    return statuses
+
+# --------------------------
+# Eigenständiger Betrieb
+# --------------------------
+def serve(store, secret, port, consistency_interval=CONSISTENCY_INTERVAL):
+    """
+    Übernimmt Webhooks direkt in die Speicher-Engine und synchronisiert
+    nur alle consistency_interval Sekunden vollständig.
+    """
+    import inbox_history
+    from todoist_api import PRIORITY_INTERACTIVE
+
+    store.init()
+    inbox_project_id = inbox_history.get_inbox_project_id(PRIORITY_INTERACTIVE)
+    if not inbox_project_id:
+        raise RuntimeError("Posteingang konnte nicht ermittelt werden")
+
+    def apply_event(event_name, event_data):
+        new_tasks, renamed_tasks, deleted_task_ids, outcomes = webhook_diff(
+            event_name, event_data, inbox_project_id, store.load_names()
+        )
+        if new_tasks or renamed_tasks or deleted_task_ids:
+            store.apply_diff(new_tasks, renamed_tasks, deleted_task_ids, outcomes=outcomes)
+            print(f"[{event_name}] neu: {len(new_tasks)}, geändert: {len(renamed_tasks)}, "
+                  f"entfernt: {len(deleted_task_ids)}")
+
+    receiver = WebhookReceiver(apply_event, secret, port).start()
+    try:
+        while True:
+            # Konsistenzprüfung gegen die API - unter dem Lock, damit kein Webhook dazwischen schreibt
+            with receiver.lock:
+                inbox_history.sync_tasks(store)
+            time.sleep(consistency_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.stop()
+        store.close()
+
+# --------------------------
+# Hauptprogramm
+# --------------------------
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Todoist-Webhooks empfangen oder zum Testen erzeugen")
+    parser.add_argument("--secret", default=WEBHOOK_SECRET, help="Client-Secret (Standard: TODOIST_CLIENT_SECRET)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Webhooks empfangen und in die Datenbank übernehmen")
+    serve_parser.add_argument("--port", type=int, default=WEBHOOK_PORT or 8765)
+    serve_parser.add_argument("--db", help="Datenbank (Standard: inbox_history.DB_PATH)")
+    serve_parser.add_argument("--consistency-interval", type=int, default=CONSISTENCY_INTERVAL)
+
+    generate_parser = subparsers.add_parser("generate", help="Signierte Test-Ereignisse an einen Empfänger senden")
+    generate_parser.add_argument("--url", default=f"http://{WEBHOOK_HOST}:{WEBHOOK_PORT or 8765}{WEBHOOK_PATH}")
+    generate_parser.add_argument("--project-id", required=True, help="Projekt-ID des Posteingangs")
+    generate_parser.add_argument("--count", type=int, default=20)
+    generate_parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        from storage import SQLiteStore
+        serve(SQLiteStore(args.db), args.secret, args.port, args.consistency_interval)
+    else:
+        statuses = generate_events(args.url, args.secret, args.project_id, args.count, args.seed)
+        print(", ".join(f"HTTP {status}: {n}" for status, n in sorted(statuses.items())))
@@ -0,0 +1,242 @@
+from datetime import date
+
+# --------------------------
+# Konfiguration
+# --------------------------
+# Verfügbare Spalten: date, priority, project, content (content nimmt die Restbreite)
+DEFAULT_COLUMNS = ('date', 'content')
+SEPARATOR = " - "
+NUMBER_SAMPLE = "99. "  # Breiteste Nummer vor jeder Zeile
+PROJECT_SAMPLE = "Projektname12"  # Breite der Projektspalte
+MIN_CONTENT_PX = 60
+DATE_CACHE_SIZE = 400  # Formatierte Tage im Render-Cache (älteste werden zuerst verworfen)
+
+# Zusätzliche Felder aus der Todoist-API je Spalte (id und content werden immer gelesen)
+COLUMN_FIELDS = {
+    'priority': 'priority',
+    'project': 'project_id',
+}
+
+# --------------------------
+# Schriftmaße
+# --------------------------
+class FontMetrics:
+    """
+    Misst eine tkinter.font.Font einmalig und merkt sich die Breite jedes Zeichens.
+    Textbreiten werden danach ohne weitere Tk-Aufrufe aus dem Cache summiert
+    (exakt für Monospace-Schriften, Unterschneidung wird ignoriert).
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.line_height = font.metrics('linespace')
+        self.widths = {}
+
+    def char_width(self, char):
+        width = self.widths.get(char)
+        if width is None:
+            width = self.widths[char] = self.font.measure(char)
+        return width
+
+    def text_width(self, text):
+        return sum(self.char_width(char) for char in text)
+
+    def truncate(self, text, max_px):
+        """
+        Kürzt den Text auf höchstens max_px Pixel.
+        """
+        width = 0
+        for i, char in enumerate(text):
+            width += self.char_width(char)
+            if width > max_px:
+                return text[:i].strip()
+        return text
+
+    def pad(self, text, target_px):
+        """
+        Füllt den Text mit Leerzeichen auf (ungefähr) target_px Pixel auf.
+        """
+        missing = target_px - self.text_width(text)
+        space = self.char_width(" ")
+        if missing <= 0 or not space:
+            return text
+        return text + " " * round(missing / space)
+
+# --------------------------
+# Layout
+# --------------------------
+class TaskLayout:
+    """
+    Berechnet Spaltenbreiten und Fenstergröße aus gemessenen Schriftmaßen.
+    Die Breiten werden nur bei einer Änderung der Konfiguration neu berechnet;
+    version ändert sich dabei, damit gecachte Zeilen neu formatiert werden.
+    """
+
+    def __init__(self, metrics, text_width_px, columns=DEFAULT_COLUMNS, date_format='%d.%m.%Y'):
+        self.metrics = metrics
+        self.text_width_px = text_width_px
+        self.columns = tuple(columns)
+        self.date_format = date_format
+        self.project_names = {}
+        self.chrome_height = None  # Fensterhöhe ohne Task-Zeilen, einmalig gemessen
+        self.version = 0
+        self.compute_widths()
+
+    def configure(self, columns=None, date_format=None, text_width_px=None):
+        if columns is not None:
+            self.columns = tuple(columns)
+        if date_format is not None:
+            self.date_format = date_format
+        if text_width_px is not None:
+            self.text_width_px = text_width_px
+        self.compute_widths()
+
+    def set_project_names(self, project_names):
+        if 'project' in self.columns and project_names != self.project_names:
+            self.project_names = dict(project_names)
+            self.version += 1
+
+    def compute_widths(self):
+        """
+        Feste Spalten bekommen die Breite ihres breitesten Beispielwerts,
+        content den Rest der Textbreite.
+        """
+        samples = {
+            'date': date(2000, 12, 28).strftime(self.date_format),
+            'priority': "P4",
+            'project': PROJECT_SAMPLE,
+        }
+        metrics = self.metrics
+        # Felder, die pro Task aus der API gelesen werden müssen
+        self.fields = ('id', 'content') + tuple(COLUMN_FIELDS[column] for column in self.columns if column in COLUMN_FIELDS)
+        self.widths = {column: metrics.text_width(samples[column]) for column in self.columns if column in samples}
+        used = metrics.text_width(NUMBER_SAMPLE) + sum(self.widths.values())
+        used += metrics.text_width(SEPARATOR) * max(0, len(self.columns) - 1)
+        self.content_px = max(MIN_CONTENT_PX, self.text_width_px - used)
+        self.version += 1
+
+    def format_row(self, display_date, fields):
+        """
+        Baut eine Zeile (ohne Nummer) aus dem Anzeige-Datum und den Task-Feldern
+        (content, gefolgt von den Zusatzfeldern in der Reihenfolge von fields).
+        """
+        extras = dict(zip(self.fields[2:], fields[1:]))
+        metrics = self.metrics
+        parts = []
+        for column in self.columns:
+            if column == 'content':
+                parts.append(metrics.truncate(fields[0], self.content_px))
+                continue
+            if column == 'date':
+                value = display_date
+            elif column == 'priority':
+                # API: 4 = höchste Priorität, in der App als P1 angezeigt
+                value = f"P{5 - int(extras.get('priority') or 1)}"
+            else:
+                project_id = extras.get('project_id')
+                value = self.project_names.get(project_id, str(project_id or ""))
+            value = metrics.truncate(value, self.widths[column])
+            # Die letzte Spalte muss nicht aufgefüllt werden
+            parts.append(metrics.pad(value, self.widths[column]) if column != self.columns[-1] else value)
+        return SEPARATOR.join(parts) + "\n"
+
+    def window_height(self, line_count, min_height, max_height):
+        """
+        Fensterhöhe für line_count Zeilen aus der gemessenen Zeilenhöhe.
+        """
+        if self.chrome_height is None:
+            return min_height
+        height = self.chrome_height + max(1, line_count) * self.metrics.line_height
+        return max(min_height, min(height, max_height))
+
+# --------------------------
+# Render-Cache
+# --------------------------
+class TaskRowCache:
+    """
+    Hält die fertig formatierte Anzeigezeile je Task.
+    Ein Eintrag gilt, solange Hash der Task-Felder und relevantes Datum gleich bleiben;
+    verworfen wird er nur über invalidate() aus dem Sync-Diff.
+    Formatierte Daten werden getrennt je Kalendertag (Ortszeit) gehalten - Zeitstempel
+    desselben Tages teilen sich einen Eintrag, höchstens DATE_CACHE_SIZE Tage. Ändert sich
+    das Layout (Spalten, Breite), werden nur die Zeilen neu gebaut; ein neues Datumsformat leert die Daten.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.rows = {}  # task_id -> [Hash der Felder, relevantes Datum, Zeile, Layout-Version]
+        self.dates = {}  # Tag -> Anzeige-Datum im Format dates_format
+        self.dates_format = layout.date_format
+
+    def invalidate(self, task_ids):
+        for task_id in task_ids:
+            self.rows.pop(task_id, None)
+
+    def get(self, task_id, fields):
+        """
+        Gibt die gecachte Zeile (ohne Nummer) zurück oder None, wenn der Task
+        neu ist bzw. sich eines seiner Felder geändert hat.
+        """
+        row = self.rows.get(task_id)
+        if row is None or row[0] != hash(fields):
+            return None
+        if row[3] != self.layout.version:
+            # Nur die Darstellung hat sich geändert - Datum bleibt gültig
+            row[2] = self.format_line(row[1], fields)
+            row[3] = self.layout.version
+        return row[2]
+
+    def put(self, task_id, fields, relevant_date):
+        line = self.format_line(relevant_date, fields)
+        self.rows[task_id] = [hash(fields), relevant_date, line, self.layout.version]
+        return line
+
+    def format_date(self, relevant_date):
+        if self.dates_format != self.layout.date_format:
+            self.dates = {}
+            self.dates_format = self.layout.date_format
+        try:
+            day = date.fromtimestamp(relevant_date)
+        except (TypeError, ValueError, OverflowError, OSError):
+            return str(relevant_date)
+        display_date = self.dates.get(day)
+        if display_date is None:
+            display_date = day.strftime(self.dates_format)
+            if len(self.dates) >= DATE_CACHE_SIZE:
+                del self.dates[next(iter(self.dates))]
+            self.dates[day] = display_date
+        return display_date
+
+    def format_line(self, relevant_date, fields):
+        return self.layout.format_row(self.format_date(relevant_date), fields)
+
+def format_task_lines(tasks, row_cache, load_db_tasks, marked=(), marker=""):
+    """
+    Formatiert (task_id, content, Zusatzfelder...)-Tupel zu nummerierten Anzeigezeilen.
+    Unveränderte Tasks kommen aus dem Render-Cache; load_db_tasks() liefert die
+    Historie ({task_id: {'first_seen', 'last_changed', ...}}) und wird nur aufgerufen,
+    wenn mindestens ein Task neu formatiert werden muss. Tasks aus marked bekommen marker vorangestellt.
+    """
+    db_tasks = None
+    lines = []
+    
+    for i, task in enumerate(tasks, 1):
+        task_id, fields = task[0], task[1:]
+        if task_id in marked:
+            fields = (marker + fields[0],) + fields[1:]
+        line = row_cache.get(task_id, fields)
+        if line is None:
+            if db_tasks is None:
+                db_tasks = load_db_tasks()
+            
+            if task_id in db_tasks:
+                first_seen = db_tasks[task_id]['first_seen']
+                last_changed = db_tasks[task_id]['last_changed']
+                relevant_date = last_changed if first_seen != last_changed else first_seen
+                line = row_cache.put(task_id, fields, relevant_date)
+            else:
+                # Sollte nach einem Sync nicht vorkommen
+                line = row_cache.format_line("FEHLER", fields)
+        
+        lines.append(f"{i:2d}. {line}")
+    return lines
@@ -0,0 +1,221 @@
+import threading
+import time
+
+import clock
+from storage import SQLiteStore
+
+# --------------------------
+# Konfiguration
+# --------------------------
+COALESCE_WINDOW = 2.0  # Sekunden, in denen Änderungen gesammelt werden
+RETRY_DELAY = 5.0  # Wartezeit nach einem fehlgeschlagenen Schreibvorgang
+MAX_RETRIES = 5  # Danach wird ein Batch verworfen, statt die Queue dauerhaft zu blockieren
+
+ADDED = 'added'
+RENAMED = 'renamed'
+DELETED = 'deleted'
+
+# --------------------------
+# Write-Behind-Queue
+# --------------------------
+class WriteBehindQueue:
+    """
+    Schreibt Task-Änderungen in einem eigenen Thread in eine Speicher-Engine (storage).
+    Änderungen am selben Task innerhalb von COALESCE_WINDOW werden zusammengefasst
+    (z.B. mehrere Umbenennungen zu einer) und gemeinsam über store.apply_diff
+    geschrieben. Es gibt genau einen schreibenden Thread.
+    """
+
+    def __init__(self, store=None, window=COALESCE_WINDOW):
+        self.store = store if store is not None else SQLiteStore()
+        self.window = window
+        self.pending = {}  # task_id -> (Operation, Name bzw. Klassifizierung beim Löschen)
+        self.in_flight = {}  # Batch, der gerade geschrieben wird (bleibt bis zum Commit sichtbar)
+        self.failures = 0  # Fehlversuche des aktuellen Batches
+        self.snapshot_requested = False
+        self.writing = False
+        self.flush_requested = False
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="db-writer", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    # --------------------------
+    # Einreihen
+    # --------------------------
+    def add(self, task_id, task_name):
+        self.enqueue(ADDED, task_id, task_name)
+
+    def rename(self, task_id, task_name):
+        self.enqueue(RENAMED, task_id, task_name)
+
+    def delete(self, task_id, outcome=None):
+        # Beim Löschen steht statt des Namens die Klassifizierung (siehe classify_disappeared_tasks)
+        self.enqueue(DELETED, task_id, outcome)
+
+    def request_snapshot(self):
+        """
+        Sorgt dafür, dass der nächste Schreibvorgang auch ohne Änderungen
+        einen Snapshot der Posteingangsgröße anhängt.
+        """
+        with self.condition:
+            self.snapshot_requested = True
+            self.condition.notify()
+
+    def enqueue(self, operation, task_id, task_name=None):
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Write-Behind-Queue ist bereits geschlossen")
+            self.merge(task_id, operation, task_name)
+            self.condition.notify()
+
+    def merge(self, task_id, operation, task_name):
+        """
+        Fasst eine neue Operation mit einer noch nicht geschriebenen zusammen.
+        """
+        previous = self.pending.get(task_id)
+        if previous is None:
+            self.pending[task_id] = (operation, task_name)
+        elif operation == RENAMED and previous[0] == ADDED:
+            # Neuer Task, der vor dem Schreiben umbenannt wurde
+            self.pending[task_id] = (ADDED, task_name)
+        elif operation == DELETED and previous[0] == ADDED:
+            # Nie geschrieben - muss auch nicht gelöscht werden
+            del self.pending[task_id]
+        elif operation == ADDED and previous[0] == DELETED:
+            # Wieder aufgetaucht, bevor das Löschen geschrieben wurde
+            self.pending[task_id] = (RENAMED, task_name)
+        else:
+            self.pending[task_id] = (operation, task_name)
+
+    # --------------------------
+    # Sicht auf noch nicht geschriebene Änderungen
+    # --------------------------
+    def changes(self):
+        """
+        Alle noch nicht bestätigten Änderungen: der gerade geschriebene Batch,
+        darauf die danach eingereihten.
+        """
+        with self.condition:
+            return list(self.in_flight.items()) + list(self.pending.items())
+
+    def load(self, load_tasks):
+        """
+        Lädt über load_tasks() und wendet die Änderungen an. Die Änderungen werden vor
+        dem Laden übernommen - endet ein Schreibvorgang dazwischen, stehen sie zusätzlich
+        schon in den geladenen Daten, gehen aber nie verloren.
+        """
+        changes = self.changes()
+        return self.apply_changes(load_tasks(), changes)
+
+    def apply_changes(self, db_tasks, changes):
+        now = int(clock.timestamp())
+        for task_id, (operation, task_name) in changes:
+            if operation == DELETED:
+                db_tasks.pop(task_id, None)
+            elif task_id in db_tasks:
+                db_tasks[task_id] = dict(db_tasks[task_id], name=task_name, last_changed=now)
+            else:
+                db_tasks[task_id] = {'name': task_name, 'first_seen': now, 'last_changed': now}
+        return db_tasks
+
+    # --------------------------
+    # Schreiben
+    # --------------------------
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.snapshot_requested and not self.closed:
+                    self.condition.wait()
+                if self.closed and not self.pending and not self.snapshot_requested:
+                    return
+                closing = self.closed
+
+            if not closing:
+                # Weitere Änderungen innerhalb des Fensters sammeln
+                with self.condition:
+                    self.condition.wait_for(lambda: self.closed or self.flush_requested, timeout=self.window)
+
+            if not self.write_batch():
+                if closing:
+                    print(f"Warnung: {len(self.pending)} Änderungen konnten nicht geschrieben werden")
+                    return
+                time.sleep(RETRY_DELAY)
+
+    def write_batch(self):
+        """
+        Übernimmt alle ausstehenden Änderungen und schreibt sie in einer Transaktion.
+        Bis zum Commit bleiben sie über load sichtbar. Schlägt das Schreiben fehl,
+        werden sie wieder eingereiht - neuere Änderungen gewinnen -, nach MAX_RETRIES
+        Fehlversuchen wird der Batch verworfen.
+        """
+        with self.condition:
+            batch = self.pending
+            snapshot = self.snapshot_requested
+            self.in_flight = batch
+            self.pending = {}
+            self.snapshot_requested = False
+            self.flush_requested = False
+            self.writing = True
+
+        new_tasks = [(task_id, name) for task_id, (operation, name) in batch.items() if operation == ADDED]
+        renamed_tasks = [(task_id, name) for task_id, (operation, name) in batch.items() if operation == RENAMED]
+        deleted_task_ids = [task_id for task_id, (operation, _) in batch.items() if operation == DELETED]
+        outcomes = {task_id: outcome for task_id, (operation, outcome) in batch.items()
+                    if operation == DELETED and outcome}
+
+        try:
+            if batch or snapshot:
+                self.store.apply_diff(new_tasks, renamed_tasks, deleted_task_ids, outcomes=outcomes)
+            self.failures = 0
+            return True
+        except Exception as e:
+            self.failures += 1
+            if self.failures >= MAX_RETRIES:
+                print(f"Fehler: {len(batch)} Änderungen nach {self.failures} Versuchen verworfen: {e}")
+                self.failures = 0
+                return True
+            print(f"Fehler beim Schreiben in die Datenbank (Versuch {self.failures}/{MAX_RETRIES}): {e}")
+            with self.condition:
+                newer = self.pending
+                self.pending = batch
+                for task_id, (operation, name) in newer.items():
+                    self.merge(task_id, operation, name)
+                self.snapshot_requested = self.snapshot_requested or snapshot
+            return False
+        finally:
+            with self.condition:
+                self.in_flight = {}
+                self.writing = False
+                self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Wartet, bis alle bisher eingereihten Änderungen geschrieben sind.
+        Gibt False zurück, wenn das Timeout abgelaufen ist.
+        """
+        with self.condition:
+            self.flush_requested = True
+            self.condition.notify_all()
+            return self.condition.wait_for(
+                lambda: not self.pending and not self.snapshot_requested and not self.writing,
+                timeout=timeout
+            )
+
+    def close(self, timeout=10.0):
+        """
+        Schreibt alle ausstehenden Änderungen sofort und beendet den Schreib-Thread.
+        Für das Beenden der Anwendung gedacht.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+        elif self.pending or self.snapshot_requested:
+            # Thread wurde nie gestartet - direkt schreiben
+            self.write_batch()
+        return not self.pending